@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from shinya.bd import ClipInformationFile, IndexTableFile, MovieObjectFile, MoviePlaylistFile
+from shinya.bd.clpi import CLPIHeader
+from shinya.bd.indx import INDXHeader
+from shinya.bd.mobj import MOBJHeader
+from shinya.bd.mpls import MPLSHeader
+from shinya.tools.synthetic import build_clpi, build_index, build_movie_object, build_mpls
+
+# case name: header class, file class, function building the file, file name
+CASES = {
+    "mpls": (MPLSHeader, MoviePlaylistFile, lambda: build_mpls(play_items=300), "00000.mpls"),
+    "clpi": (CLPIHeader, ClipInformationFile, lambda: build_clpi(ep_map_entries=100000, duration=7200), "00000.clpi"),
+    "index": (INDXHeader, IndexTableFile, lambda: build_index(titles=200), "index.bdmv"),
+    "movie_object": (MOBJHeader, MovieObjectFile, lambda: build_movie_object(movie_objects=200), "MovieObject.bdmv"),
+}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# startup measurement: command line run in a fresh interpreter
+STARTUP = {
+    "interpreter": [sys.executable, "-c", "pass"],
+    "import": [sys.executable, "-c", "from shinya.bd import MoviePlaylistFile"],
+    "mpls_clear_uomask": [sys.executable, os.path.join(ROOT, "scripts", "mpls_clear_uomask.py"), "-h"],
+}
+
+
+def measure(function, repeat):
+    """ Best time of one call of function, in seconds
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(header_class, file_class, data, filename, directory, repeat):
+    source = os.path.join(directory, filename)
+    destination = os.path.join(directory, "out", filename)
+    with open(source, "wb") as f:
+        f.write(data)
+    # trees parsed without strict checks keep no original bytes, serializing them encodes every node
+    unchecked_header = header_class.from_bytes(data, strict=False)
+    unchecked_file = file_class(source, strict=False)
+
+    def round_trip():
+        file_class(source).save(destination, overwrite=True)
+
+    timings = {
+        "from_bytes": measure(lambda: header_class.from_bytes(data), repeat),
+        "to_bytes": measure(unchecked_header.to_bytes, repeat),
+        "save": measure(lambda: unchecked_file.save(destination, overwrite=True), repeat),
+        "round_trip": measure(round_trip, repeat),
+    }
+    return {
+        "size": len(data),
+        "seconds": timings,
+        "bytes_per_second": {name: len(data) / seconds for name, seconds in timings.items()},
+        "peak_memory": {
+            "from_bytes": peak_memory(lambda: header_class.from_bytes(data)),
+            "round_trip": peak_memory(round_trip),
+        },
+    }
+
+
+def measure_startup(command, repeat):
+    """ Best wall time of command, in seconds, with the package of this repository importable
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    env.pop("SHINYA_PROFILE", None)
+    timings = []
+    for _ in range(max(repeat, 5)):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    print(f"{'case':<14}{'operation':<14}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for case, result in results["cases"].items():
+        if case not in baseline["cases"]:
+            continue
+        for name, seconds in result["seconds"].items():
+            baseline_seconds = baseline["cases"][case]["seconds"].get(name)
+            if baseline_seconds:
+                print(f"{case:<14}{name:<14}{baseline_seconds * 1000:>10.3f}ms{seconds * 1000:>10.3f}ms"
+                      f"{seconds / baseline_seconds:>8.2f}")
+    for name, seconds in results.get("startup", {}).items():
+        baseline_seconds = baseline.get("startup", {}).get(name)
+        if baseline_seconds:
+            print(f"{'startup':<14}{name[:13]:<14}{baseline_seconds * 1000:>10.3f}ms{seconds * 1000:>10.3f}ms"
+                  f"{seconds / baseline_seconds:>8.2f}")
+
+
+def main(cases, repeat, output, baseline):
+    results = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "repeat": repeat,
+        "cases": {},
+    }
+    if "startup" in cases:
+        results["startup"] = {name: measure_startup(command, repeat) for name, command in STARTUP.items()}
+        print("startup: " + ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in results["startup"].items()))
+    with tempfile.TemporaryDirectory() as directory:
+        for case in cases:
+            if case == "startup":
+                continue
+            header_class, file_class, build, filename = CASES[case]
+            result = run_case(header_class, file_class, build(), filename, directory, repeat)
+            results["cases"][case] = result
+            timings = ", ".join(f"{name} {seconds * 1000:.3f}ms" for name, seconds in result["seconds"].items())
+            peak = result["peak_memory"]["from_bytes"] / 2 ** 20
+            print(f"{case} ({result['size']} bytes): {timings}, peak memory {peak:.1f}MiB")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("measures parsing and serialization throughput on synthetic BDMV files")
+    parser.add_argument("cases", type=str, nargs="*",
+                        help=f"file types to benchmark, among {', '.join(CASES)}, or startup for the time to "
+                             f"start a script, all by default")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of timings to keep the best of")
+    parser.add_argument("-o", "--output", type=str, default=None, help="json file to save the results")
+    parser.add_argument("-c", "--compare", type=str, default=None, help="json results of a previous run to compare")
+    args = parser.parse_args()
+    for case in args.cases:
+        if case not in CASES and case != "startup":
+            parser.error(f"unknown file type {case}")
+    main(args.cases or ["startup", *CASES], args.repeat, args.output, args.compare)
@@ -0,0 +1,25 @@
+import argparse
+
+from shinya.tools.synthetic import write_corpus
+
+
+def main(root, playlists, clips, seed, max_play_items, max_angles, max_sub_paths, ep_map_entries, stream_pids):
+    bdmv = write_corpus(root, playlists, clips, seed, max_play_items, max_angles, max_sub_paths, ep_map_entries,
+                        stream_pids)
+    print(f"wrote {playlists} playlists and {clips} clips to {bdmv}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("writes a reproducible BDMV directory of synthetic files, for load tests")
+    parser.add_argument("root", type=str, help="directory to write the BDMV directory in")
+    parser.add_argument("-p", "--playlists", type=int, default=10, help="number of playlists")
+    parser.add_argument("-c", "--clips", type=int, default=20, help="number of clip information files")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--max-play-items", type=int, default=50, help="maximum number of play items per playlist")
+    parser.add_argument("--max-angles", type=int, default=1, help="maximum number of angles per play item")
+    parser.add_argument("--max-sub-paths", type=int, default=0, help="maximum number of sub paths per playlist")
+    parser.add_argument("--ep-map-entries", type=int, default=2000, help="number of entry points per stream")
+    parser.add_argument("--stream-pids", type=int, default=1, help="number of streams with an entry point map")
+    args = parser.parse_args()
+    main(args.root, args.playlists, args.clips, args.seed, args.max_play_items, args.max_angles, args.max_sub_paths,
+         args.ep_map_entries, args.stream_pids)
@@ -0,0 +1,102 @@
+import argparse
+import csv
+import glob
+import importlib
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+# script name: whether its destination is a folder rather than a file
+SCRIPTS = {
+    "mpls_identity": False,
+    "mpls_clear_uomask": False,
+    "mpls_skip_firstplayback": False,
+    "mpls_fix_extension_data_address": False,
+    "mpls_to_chapter": True,
+}
+
+# the script module, imported once per worker along with shinya and lxml
+worker_script = None
+
+
+def init_worker(script_name):
+    global worker_script
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    worker_script = importlib.import_module(script_name)
+
+
+def run(job):
+    source, destination, extra_args = job
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output):
+            worker_script.main(source, destination, *extra_args)
+        status = "OK"
+    except Exception as e:
+        status = "FAILED"
+        print(f"{type(e).__name__}: {e}", file=output)
+    return source, destination, status, output.getvalue().strip()
+
+
+def find_sources(patterns):
+    sources = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for directory, _, filenames in os.walk(pattern):
+                sources.extend(os.path.join(directory, filename) for filename in filenames
+                               if filename.lower().endswith(".mpls"))
+        else:
+            sources.extend(glob.glob(pattern, recursive=True))
+    return sorted(set(os.path.abspath(source) for source in sources))
+
+
+def main(script_name, patterns, destination, processes, report, extra_args):
+    sources = find_sources(patterns)
+    if not sources:
+        print("No mpls file found.")
+        return
+    # destinations mirror the layout of the sources below their common folder
+    base = os.path.commonpath([os.path.dirname(source) for source in sources])
+    jobs = []
+    for source in sources:
+        relative_path = os.path.relpath(source, base)
+        if SCRIPTS[script_name]:
+            jobs.append((source, os.path.join(destination, os.path.dirname(relative_path)), extra_args))
+        else:
+            jobs.append((source, os.path.join(destination, relative_path), extra_args))
+
+    # import errors are raised here, a failing pool initializer would be retried forever
+    init_worker(script_name)
+    chunk_size = max(1, len(jobs) // (4 * (processes or os.cpu_count())))
+    with Pool(processes, initializer=init_worker, initargs=(script_name,)) as pool:
+        results = list(pool.imap_unordered(run, jobs, chunksize=chunk_size))
+    results.sort()
+
+    failed = sum(status != "OK" for _, _, status, _ in results)
+    if report:
+        with open(report, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["source", "destination", "status", "message"])
+            writer.writerows(results)
+    else:
+        for source, _, status, message in results:
+            print(f"[{status}] {source}" + (f": {message}" if message else ""))
+    print(f"{len(results) - failed} of {len(results)} files processed, {failed} failed.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("runs one of the mpls scripts on many files with a pool of worker processes")
+    parser.add_argument("script", type=str, choices=SCRIPTS, help="script to run")
+    parser.add_argument("sources", type=str, nargs="+", help="mpls files, glob patterns or folders to search")
+    parser.add_argument("destination", type=str, help="folder to save the outputs, following the source layout")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="number of workers, cpu count by default")
+    parser.add_argument("-r", "--report", type=str, default=None, help="csv file to write the per-file results")
+    parser.add_argument("-s", "--single", action="store_true", default=False,
+                        help="mpls_to_chapter: whether to join all play items into one chapter file")
+    parser.add_argument("-q", "--qpfile", action="store_true", default=False,
+                        help="mpls_to_chapter: export a qpfile along with the chapter file")
+    args = parser.parse_args()
+    extra = (args.single, args.qpfile) if args.script == "mpls_to_chapter" else ()
+    main(args.script, args.sources, args.destination, args.processes, args.report, extra)
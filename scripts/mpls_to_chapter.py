@@ -8,7 +8,7 @@ def main(source, destination, single_file, qpfile):
     chapters = Chapter.from_mpls(source)
     filename, _ = os.path.splitext(os.path.basename(source))
     if single_file:
-        chapters = sum(i[1] for i in chapters)
+        chapters = Chapter.join(i[1] for i in chapters)
         chapters.export(os.path.join(destination, f"{filename}.xml"))
     else:
         for clip_name, chapter, attr in chapters:
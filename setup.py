@@ -9,5 +9,5 @@ setup(
     license='MIT',
     packages=find_packages(),
     install_requires=['lxml>=4.6'],
-    python_requires=">=3.6"
+    python_requires=">=3.7"
 )
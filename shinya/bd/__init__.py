@@ -1,4 +1,34 @@
-from .clpi import ClipInformationFile
-from .indx import IndexTableFile
-from .mobj import MovieObjectFile
-from .mpls import MoviePlaylistFile
+import os
+from importlib import import_module
+
+# public name: submodule defining it, imported on first access (PEP 562) so that scripts only load what they use
+_submodules = {
+    "ClipInformationFile": "clpi",
+    "BDMVDisc": "disc",
+    "IndexTableFile": "indx",
+    "MovieObjectFile": "mobj",
+    "MoviePlaylistFile": "mpls",
+}
+
+__all__ = list(_submodules)
+
+
+def __getattr__(name):
+    if name not in _submodules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f"{__name__}.{_submodules[name]}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if os.environ.get("SHINYA_PROFILE"):
+    from shinya.common.profiling import profile_from_environment
+
+    # the profiler wraps the node classes defined when it starts, i.e. all of them once every submodule is loaded
+    for _name in __all__:
+        __getattr__(_name)
+    profile_from_environment()
@@ -1,25 +1,37 @@
-import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from collections.abc import MutableMapping, MutableSequence
+from itertools import islice
 
 from shinya.bd.extension_data import ExtensionData
-from shinya.common.info_dict import InfoDict
-from shinya.common.io import unpack_bytes, pack_bytes
+from shinya.common.aio import run_in_executor
+from shinya.common.info_dict import (
+    InfoDict, LazyInfoDict, LazySection, Record, TrackedValue, cached_display_size, untracked_decoding,
+)
+from shinya.common.io import unpack_bytes, unpack_words, pack_words, WORD_TYPECODE, read_file, write_file, Layout
+
+
+class CLPIHeader(LazyInfoDict):
+    layout = Layout(
+        ("TypeIndicator", 4, str),
+        ("VersionNumber", 4, str),
+        ("SequenceInfoStartAddress", 4),
+        ("ProgramInfoStartAddress", 4),
+        ("CPIStartAddress", 4),
+        ("ClipMarkStartAddress", 4),
+        ("ExtensionDataStartAddress", 4),
+        ("reserved1", 12, bytes),
+    )
 
-
-class CLPIHeader(InfoDict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, strict=True, **kwargs):
+    @untracked_decoding
+    def from_bytes(cls, data, strict=True, lazy=False, **kwargs):
         self = cls()
-        self["TypeIndicator"] = data[0:4].decode("utf-8")
-        self["VersionNumber"] = data[4:8].decode("utf-8")
-        self["SequenceInfoStartAddress"] = unpack_bytes(data, 8, 4)
-        self["ProgramInfoStartAddress"] = unpack_bytes(data, 12, 4)
-        self["CPIStartAddress"] = unpack_bytes(data, 16, 4)
-        self["ClipMarkStartAddress"] = unpack_bytes(data, 20, 4)
-        self["ExtensionDataStartAddress"] = unpack_bytes(data, 24, 4)
-        self["reserved1"] = data[28:40]
+        cls.layout.read(self, data)
 
         clip_info_display_size = unpack_bytes(data, 40, 4)
         sequence_info_display_size = unpack_bytes(data, self["SequenceInfoStartAddress"], 4)
@@ -43,28 +55,36 @@ class CLPIHeader(InfoDict):
             else:
                 assert self["ClipMarkStartAddress"] + clip_mark_display_size + 4 == len(data)
 
-        self["ClipInfo"] = ClipInfo.from_bytes(data[40: 40 + clip_info_display_size + 4])
-        self["SequenceInfo"] = SequenceInfo.from_bytes(
-            data[self["SequenceInfoStartAddress"]: self["SequenceInfoStartAddress"] + sequence_info_display_size + 4])
-        self["ProgramInfo"] = ProgramInfo.from_bytes(
-            data[self["ProgramInfoStartAddress"]: self["ProgramInfoStartAddress"] + program_info_display_size + 4])
-        self["CPI"] = CPI.from_bytes(data[self["CPIStartAddress"]: self["CPIStartAddress"] + cpi_display_size + 4])
-        self["ClipMark"] = ClipMark.from_bytes(
-            data[self["ClipMarkStartAddress"]:self["ClipMarkStartAddress"] + clip_mark_display_size + 4])
+        sections = [
+            ("ClipInfo", ClipInfo, 40, clip_info_display_size),
+            ("SequenceInfo", SequenceInfo, self["SequenceInfoStartAddress"], sequence_info_display_size),
+            ("ProgramInfo", ProgramInfo, self["ProgramInfoStartAddress"], program_info_display_size),
+            ("CPI", CPI, self["CPIStartAddress"], cpi_display_size),
+            ("ClipMark", ClipMark, self["ClipMarkStartAddress"], clip_mark_display_size),
+        ]
         if self["ExtensionDataStartAddress"]:
-            self["ExtensionData"] = ExtensionData.from_bytes(
-                data[self["ExtensionDataStartAddress"]: self["ExtensionDataStartAddress"] + extension_display_size + 4])
+            sections.append(
+                ("ExtensionData", ExtensionData, self["ExtensionDataStartAddress"], extension_display_size))
 
-        if strict:
-            assert data == self.to_bytes()
+        for key, section_class, start_address, display_size in sections:
+            if lazy:
+                section_data = memoryview(data)[start_address: start_address + display_size + 4]
+                self[key] = LazySection(section_class, section_data, strict=strict)
+            else:
+                self[key] = section_class.from_bytes(data, offset=start_address, strict=strict)
+
+        if strict and not lazy:
+            # every section checked its own constraints and rejected the bytes it would not write back, which leaves
+            # the addresses checked here for an exact round-trip
+            self.check_constraints()
         return self
 
     def update_addresses(self, offset=0):
-        clip_info_display_size = self["ClipInfo"].calculate_display_size()
-        sequence_info_display_size = self["SequenceInfo"].calculate_display_size()
-        program_info_display_size = self["ProgramInfo"].calculate_display_size()
-        cpi_display_size = self["CPI"].calculate_display_size()
-        clip_mark_display_size = self["ClipMark"].calculate_display_size()
+        clip_info_display_size = self.section("ClipInfo").calculate_display_size()
+        sequence_info_display_size = self.section("SequenceInfo").calculate_display_size()
+        program_info_display_size = self.section("ProgramInfo").calculate_display_size()
+        cpi_display_size = self.section("CPI").calculate_display_size()
+        clip_mark_display_size = self.section("ClipMark").calculate_display_size()
         self["SequenceInfoStartAddress"] = 40 + clip_info_display_size + 4
         self["ProgramInfoStartAddress"] = self["SequenceInfoStartAddress"] + sequence_info_display_size + 4
         self["CPIStartAddress"] = self["ProgramInfoStartAddress"] + program_info_display_size + 4
@@ -74,11 +94,11 @@ class CLPIHeader(InfoDict):
         pass
 
     def check_constraints(self):
-        clip_info_display_size = self["ClipInfo"].calculate_display_size()
-        sequence_info_display_size = self["SequenceInfo"].calculate_display_size()
-        program_info_display_size = self["ProgramInfo"].calculate_display_size()
-        cpi_display_size = self["CPI"].calculate_display_size()
-        clip_mark_display_size = self["ClipMark"].calculate_display_size()
+        clip_info_display_size = self.section("ClipInfo").calculate_display_size()
+        sequence_info_display_size = self.section("SequenceInfo").calculate_display_size()
+        program_info_display_size = self.section("ProgramInfo").calculate_display_size()
+        cpi_display_size = self.section("CPI").calculate_display_size()
+        clip_mark_display_size = self.section("ClipMark").calculate_display_size()
         assert 40 + clip_info_display_size + 4 == self["SequenceInfoStartAddress"]
         assert self["SequenceInfoStartAddress"] + sequence_info_display_size + 4 == self["ProgramInfoStartAddress"]
         assert self["ProgramInfoStartAddress"] + program_info_display_size + 4 == self["CPIStartAddress"]
@@ -86,135 +106,131 @@ class CLPIHeader(InfoDict):
         if self["ExtensionDataStartAddress"]:
             assert self["ClipMarkStartAddress"] + clip_mark_display_size + 4 == self["ExtensionDataStartAddress"]
 
-    def to_bytes(self):
+    def calculate_file_size(self):
+        if self["ExtensionDataStartAddress"]:
+            return self["ExtensionDataStartAddress"] + self.section("ExtensionData").calculate_display_size() + 4
+        else:
+            return self["ClipMarkStartAddress"] + self.section("ClipMark").calculate_display_size() + 4
+
+    def to_bytes(self, **kwargs):
+        return super().to_bytes(size=self.calculate_file_size())
+
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += self["TypeIndicator"].encode("utf-8")
-        data += self["VersionNumber"].encode("utf-8")
-        data += pack_bytes(self["SequenceInfoStartAddress"], 4)
-        data += pack_bytes(self["ProgramInfoStartAddress"], 4)
-        data += pack_bytes(self["CPIStartAddress"], 4)
-        data += pack_bytes(self["ClipMarkStartAddress"], 4)
-        data += pack_bytes(self["ExtensionDataStartAddress"], 4)
-        data += self["reserved1"]
-
-        data += self["ClipInfo"].to_bytes()
-        data += self["SequenceInfo"].to_bytes()
-        data += self["ProgramInfo"].to_bytes()
-        data += self["CPI"].to_bytes()
-        data += self["ClipMark"].to_bytes()
+        self.layout.write(writer, self)
+
+        self.section("ClipInfo").write(writer)
+        self.section("SequenceInfo").write(writer)
+        self.section("ProgramInfo").write(writer)
+        self.section("CPI").write(writer)
+        self.section("ClipMark").write(writer)
         if self["ExtensionDataStartAddress"]:
-            data += self["ExtensionData"].to_bytes()
-        return data
+            self.section("ExtensionData").write(writer)
 
 
-class ClipInfo(InfoDict):
+class TSTypeInfoBlock(InfoDict):
+    """ Specs from tsMuxer
+    """
+    layout = Layout(
+        ("Length", 2),
+        ("ValidityFlags", 1),
+        ("FormatIdentifier", 4, str),
+        ("NetworkInformation", 9, bytes),
+        ("StreamFormatName", 16, bytes),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["reserved1"] = unpack_bytes(data, 4, 2)
-        self["ClipStreamType"] = unpack_bytes(data, 6, 1)
-        self["ApplicationType"] = unpack_bytes(data, 7, 1)
-        flags = unpack_bytes(data, 8, 4)
-        self["reserved2"], self["IsCC5"] = divmod(flags, 2)
-        self["TSRecordingRate"] = unpack_bytes(data, 12, 4)
-        self["NumberOfSourcePackets"] = unpack_bytes(data, 16, 4)
-        self["reserved3"] = data[20:148]
-        self["TSTypeInfoBlock"] = TSTypeInfoBlock.from_bytes(data[148:180])
-        if self["IsCC5"]:
-            self["reserved4"] = unpack_bytes(data, 180, 1)
-            self["FollowingClipStreamType"] = unpack_bytes(data, 181, 1)
-            self["reserved5"] = unpack_bytes(data, 182, 4)
-            self["FollowingClipInformationFileName"] = data[186:191].decode("utf-8")
-            self["FollowingClipCodecIdentifier"] = data[191:195].decode("utf-8")
-            self["reserved6"] = unpack_bytes(data, 195, 1)
+        cls.layout.read(self, data, offset)
         return self
 
     def calculate_display_size(self):
-        if self["IsCC5"]:
-            return 196 - 4
-        else:
-            return 180 - 4
+        return 32 - 2
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["reserved1"], 2)
-        data += pack_bytes(self["ClipStreamType"], 1)
-        data += pack_bytes(self["ApplicationType"], 1)
-        data += pack_bytes(self["reserved2"] * 2 + self["IsCC5"], 4)
-        data += pack_bytes(self["TSRecordingRate"], 4)
-        data += pack_bytes(self["NumberOfSourcePackets"], 4)
-        data += self["reserved3"]
-        data += self["TSTypeInfoBlock"].to_bytes()
-        if self["IsCC5"]:
-            data += pack_bytes(self["reserved4"], 1)
-            data += pack_bytes(self["FollowingClipStreamType"], 1)
-            data += pack_bytes(self["reserved5"], 4)
-            data += self["FollowingClipInformationFileName"].encode("utf-8")
-            data += self["FollowingClipCodecIdentifier"].encode("utf-8")
-            data += pack_bytes(self["reserved6"], 1)
-        return data
+        self.layout.write(writer, self)
 
 
-class TSTypeInfoBlock(InfoDict):
-    """ Specs from tsMuxer
-    """
+class ClipInfo(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("reserved1", 2),
+        ("ClipStreamType", 1),
+        ("ApplicationType", 1),
+        ((("reserved2", 31), ("IsCC5", 1)), 4),
+        ("TSRecordingRate", 4),
+        ("NumberOfSourcePackets", 4),
+        ("reserved3", 128, bytes),
+        ("TSTypeInfoBlock", TSTypeInfoBlock),
+    )
+    cc5_layout = Layout(
+        ("reserved4", 1),
+        ("FollowingClipStreamType", 1),
+        ("reserved5", 4),
+        ("FollowingClipInformationFileName", 5, str),
+        ("FollowingClipCodecIdentifier", 4, str),
+        ("reserved6", 1),
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 2)
-        self["ValidityFlags"] = unpack_bytes(data, 2, 1)
-        self["FormatIdentifier"] = data[3:7].decode("utf-8")
-        self["NetworkInformation"] = data[7:16]
-        self["StreamFormatName"] = data[16:32]
+        read_index = cls.layout.read(self, data, offset)
+        if self["IsCC5"]:
+            cls.cc5_layout.read(self, data, read_index)
+        if strict:
+            self.check_constraints()
+            self["TSTypeInfoBlock"].check_constraints()
         return self
 
     def calculate_display_size(self):
-        return 32 - 2
+        if self["IsCC5"]:
+            return 196 - 4
+        else:
+            return 180 - 4
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 2)
-        data += pack_bytes(self["ValidityFlags"], 1)
-        data += self["FormatIdentifier"].encode("utf-8")
-        data += self["NetworkInformation"]
-        data += self["StreamFormatName"]
-
-        return data
+        self.layout.write(writer, self)
+        if self["IsCC5"]:
+            self.cc5_layout.write(writer, self)
 
 
 class SequenceInfo(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("reserved1", 1),
+        ("NumberOfATCSequences", 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["reserved1"] = unpack_bytes(data, 4, 1)
-        self["NumberOfATCSequences"] = unpack_bytes(data, 5, 1)
-        read_index = 6
+        read_index = cls.layout.read(self, data, offset)
         self["ATCSequences"] = []
         for i in range(self["NumberOfATCSequences"]):
             num_stc_seq = unpack_bytes(data, read_index + 4, 1)
             act_real_length = 6 + num_stc_seq * 14
-            self["ATCSequences"].append(ATCSequence.from_bytes(data[read_index:read_index + act_real_length]))
+            self["ATCSequences"].append(ATCSequence.from_bytes(data, offset=read_index, strict=strict))
             read_index += act_real_length
 
+        if strict:
+            self.check_constraints()
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         real_length = 6
         for i in self["ATCSequences"]:
@@ -228,34 +244,35 @@ class SequenceInfo(InfoDict):
         super().check_constraints()
         assert self["NumberOfATCSequences"] == len(self["ATCSequences"])
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["reserved1"], 1)
-        data += pack_bytes(self["NumberOfATCSequences"], 1)
+        self.layout.write(writer, self)
         for i in self["ATCSequences"]:
-            data += i.to_bytes()
-        return data
+            i.write(writer)
 
 
 class ATCSequence(InfoDict):
+    layout = Layout(
+        ("SPNATCStart", 4),
+        ("NumberOfSTCSequences", 1),
+        ("OffsetSTCID", 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
 
         self = cls()
-        self["SPNATCStart"] = unpack_bytes(data, 0, 4)
-        self["NumberOfSTCSequences"] = unpack_bytes(data, 4, 1)
-        self["OffsetSTCID"] = unpack_bytes(data, 5, 1)
+        read_index = cls.layout.read(self, data, offset)
         self["STCSequences"] = []
         for i in range(self["NumberOfSTCSequences"]):
-            self["STCSequences"].append(STCSequence.from_bytes(data[6 + 14 * i:6 + 14 * (i + 1)]))
+            self["STCSequences"].append(STCSequence.from_bytes(data, offset=read_index + 14 * i))
 
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         return 6 + 14 * len(self["STCSequences"])
 
@@ -266,53 +283,52 @@ class ATCSequence(InfoDict):
         super().check_constraints()
         assert self["NumberOfSTCSequences"] == len(self["STCSequences"])
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["SPNATCStart"], 4)
-        data += pack_bytes(self["NumberOfSTCSequences"], 1)
-        data += pack_bytes(self["OffsetSTCID"], 1)
+        self.layout.write(writer, self)
         for i in self["STCSequences"]:
-            data += i.to_bytes()
-        return data
+            i.write(writer)
+
+
+class STCSequence(Record):
+    layout = Layout(
+        ("PCRPID", 2),
+        ("SPNSTCStart", 4),
+        ("PresentationStartTime", 4),
+        ("PresentationEndTime", 4),
+    )
 
+    __slots__ = layout.keys
 
-class STCSequence(InfoDict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
         self = cls()
-        self["PCRPID"] = unpack_bytes(data, 0, 2)
-        self["SPNSTCStart"] = unpack_bytes(data, 2, 4)
-        self["PresentationStartTime"] = unpack_bytes(data, 6, 4)
-        self["PresentationEndTime"] = unpack_bytes(data, 10, 4)
-
+        cls.layout.read(self, data, offset)
         return self
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["PCRPID"], 2)
-        data += pack_bytes(self["SPNSTCStart"], 4)
-        data += pack_bytes(self["PresentationStartTime"], 4)
-        data += pack_bytes(self["PresentationEndTime"], 4)
-        return data
+        self.layout.write(writer, self)
 
 
 class ProgramInfo(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("reserved1", 1),
+        ("NumberOfPrograms", 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["reserved1"] = unpack_bytes(data, 4, 1)
-        self["NumberOfPrograms"] = unpack_bytes(data, 5, 1)
-        read_index = 6
+        read_index = cls.layout.read(self, data, offset)
         self["Programs"] = []
         for i in range(self["NumberOfPrograms"]):
             num_stream_ps = unpack_bytes(data, read_index + 6, 1)
@@ -320,11 +336,14 @@ class ProgramInfo(InfoDict):
             for j in range(num_stream_ps):
                 program_offset += 2
                 program_offset += unpack_bytes(data, read_index + program_offset, 1) + 1
-            self["Programs"].append(Program.from_bytes(data[read_index:read_index + program_offset]))
+            self["Programs"].append(Program.from_bytes(data, offset=read_index, strict=strict))
             read_index += program_offset
 
+        if strict:
+            self.check_constraints()
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         real_length = 6
         for i in self["Programs"]:
@@ -338,43 +357,44 @@ class ProgramInfo(InfoDict):
         super().check_constraints()
         assert self["NumberOfPrograms"] == len(self["Programs"])
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["reserved1"], 1)
-        data += pack_bytes(self["NumberOfPrograms"], 1)
+        self.layout.write(writer, self)
         for i in self["Programs"]:
-            data += i.to_bytes()
-        return data
+            i.write(writer)
 
 
 class Program(InfoDict):
+    layout = Layout(
+        ("SPNProgramSequenceStart", 4),
+        ("ProgramMapPID", 2),
+        ("NumberOfStreamsInPS", 1),
+        ("NumberOfGroups", 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["SPNProgramSequenceStart"] = unpack_bytes(data, 0, 4)
-        self["ProgramMapPID"] = unpack_bytes(data, 4, 2)
-        self["NumberOfStreamsInPS"] = unpack_bytes(data, 6, 1)
-        self["NumberOfGroups"] = unpack_bytes(data, 7, 1)
-        read_index = 8
+        read_index = cls.layout.read(self, data, offset)
         self["StreamsInPS"] = []
         for i in range(self["NumberOfStreamsInPS"]):
             streams_in_ps = InfoDict()
             streams_in_ps["StreamPID"] = unpack_bytes(data, read_index, 2)
             read_index += 2
             scinfo_display_size = unpack_bytes(data, read_index, 1)
-            streams_in_ps["StreamCodingInfo"] = StreamCodingInfo.from_bytes(
-                data[read_index:read_index + scinfo_display_size + 1])
+            streams_in_ps["StreamCodingInfo"] = StreamCodingInfo.from_bytes(data, offset=read_index, strict=strict)
             self["StreamsInPS"].append(streams_in_ps)
             read_index += scinfo_display_size + 1
 
+        if strict:
+            self.check_constraints()
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         real_length = 8
         for i in self["StreamsInPS"]:
@@ -389,112 +409,95 @@ class Program(InfoDict):
         super().check_constraints()
         assert self["NumberOfStreamsInPS"] == len(self["StreamsInPS"])
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["SPNProgramSequenceStart"], 4)
-        data += pack_bytes(self["ProgramMapPID"], 2)
-        data += pack_bytes(self["NumberOfStreamsInPS"], 1)
-        data += pack_bytes(self["NumberOfGroups"], 1)
+        self.layout.write(writer, self)
         for i in self["StreamsInPS"]:
-            data += pack_bytes(i["StreamPID"], 2)
-            data += i["StreamCodingInfo"].to_bytes()
-        return data
+            writer.write_int(i["StreamPID"], 2)
+            i["StreamCodingInfo"].write(writer)
 
 
 class StreamCodingInfo(InfoDict):
+    video_layout = Layout(
+        ((("VideoFormat", 4), ("FrameRate", 4)), 1),
+        ((("VideoAspect", 4), ("reserved1", 2), ("OCFlag", 1), ("reserved2", 1)), 1),
+        ("reserved3", 2),
+    )
+    hdr_video_layout = Layout(
+        ((("VideoFormat", 4), ("FrameRate", 4)), 1),
+        ((("VideoAspect", 4), ("reserved4", 2), ("OCFlag", 1), ("CRFlag", 1)), 1),
+        ((("DynamicRangeType", 4), ("ColorSpace", 4)), 1),
+        ((("HDRPlusFlag", 1), ("reserved5", 7)), 1),
+    )
+    audio_layout = Layout(((("AudioFormat", 4), ("SampleRate", 4)), 1), ("Language", 3, str))
+    graphics_layout = Layout(("Language", 3, str))
+    text_layout = Layout(("CharCode", 1), ("Language", 3, str))
+    # layouts of the fields following StreamCodingType, by StreamCodingType, the rest of the entry is padding
+    layouts = {
+        **dict.fromkeys([0x01, 0x02, 0x1B, 0xEA], video_layout),
+        0x24: hdr_video_layout,
+        **dict.fromkeys([0x03, 0x04, 0x80, 0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0xA1, 0xA2], audio_layout),
+        **dict.fromkeys([0x90, 0x91], graphics_layout),
+        0x92: text_layout,
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 1)
-        self["StreamCodingType"] = unpack_bytes(data, 1, 1)
-        if self["StreamCodingType"] in [0x01, 0x02, 0x1B, 0xEA]:
-            self["VideoFormat"], self["FrameRate"] = divmod(unpack_bytes(data, 2, 1), 2 ** 4)
-            flags = unpack_bytes(data, 3, 1)
-            self["VideoAspect"], flags = divmod(flags, 2 ** 4)
-            self["reserved1"], flags = divmod(flags, 2 ** 2)
-            self["OCFlag"], self["reserved2"] = divmod(flags, 2)
-            self["reserved3"] = unpack_bytes(data, 4, 2)
-            self["padding"] = data[6:]
-        elif self["StreamCodingType"] in [0x24]:
-            self["VideoFormat"], self["FrameRate"] = divmod(unpack_bytes(data, 2, 1), 2 ** 4)
-            flags = unpack_bytes(data, 3, 1)
-            self["VideoAspect"], flags = divmod(flags, 2 ** 4)
-            self["reserved4"], flags = divmod(flags, 2 ** 2)
-            self["OCFlag"], self["CRFlag"] = divmod(flags, 2)
-            self["DynamicRangeType"], self["ColorSpace"] = divmod(unpack_bytes(data, 4, 1), 2 ** 4)
-            self["HDRPlusFlag"], self["reserved5"] = divmod(unpack_bytes(data, 5, 1), 2 ** 7)
-            self["padding"] = data[6:]
-        elif self["StreamCodingType"] in [0x03, 0x04, 0x80, 0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0xA1, 0xA2]:
-            self["AudioFormat"], self["SampleRate"] = divmod(unpack_bytes(data, 2, 1), 2 ** 4)
-            self["Language"] = data[3:6].decode("utf-8")
-            self["padding"] = data[6:]
-        elif self["StreamCodingType"] in [0x90, 0x91]:
-            self["Language"] = data[2:5].decode("utf-8")
-            self["padding"] = data[5:]
-        elif self["StreamCodingType"] in [0x92]:
-            self["CharCode"] = unpack_bytes(data, 2, 1)
-            self["Language"] = data[3:6].decode("utf-8")
-            self["padding"] = data[6:]
+        self["Length"] = unpack_bytes(data, offset, 1)
+        self["StreamCodingType"] = unpack_bytes(data, offset + 1, 1)
+        if self["StreamCodingType"] in cls.layouts:
+            read_index = cls.layouts[self["StreamCodingType"]].read(self, data, offset + 2)
+            self["padding"] = bytes(data[read_index: offset + self["Length"] + 1])
 
+        if strict:
+            self.check_constraints()
         return self
 
     def calculate_display_size(self):
         return self["Length"]
 
-    def to_bytes(self):
+    def check_constraints(self):
+        if self["StreamCodingType"] in self.layouts:
+            assert self["Length"] == 1 + self.layouts[self["StreamCodingType"]].size + len(self["padding"])
+        else:
+            assert self["Length"] == 1
+
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 1)
-        data += pack_bytes(self["StreamCodingType"], 1)
-
-        if self["StreamCodingType"] in [0x01, 0x02, 0x1B, 0xEA]:
-            data += pack_bytes((self["VideoFormat"] << 4) + self["FrameRate"], 1)
-            data += pack_bytes(
-                (self["VideoAspect"] << 4) + (self["reserved1"] << 2) + (self["OCFlag"] << 1) + self["reserved2"], 1)
-            data += pack_bytes(self["reserved3"], 2)
-            data += self["padding"]
-        elif self["StreamCodingType"] in [0x24]:
-            data += pack_bytes((self["VideoFormat"] << 4) + self["FrameRate"], 1)
-            data += pack_bytes(
-                (self["VideoAspect"] << 4) + (self["reserved4"] << 2) + (self["OCFlag"] << 1) + self["CRFlag"], 1)
-            data += pack_bytes((self["DynamicRangeType"] << 4) + self["ColorSpace"], 1)
-            data += pack_bytes((self["HDRPlusFlag"] << 7) + self["reserved5"], 1)
-            data += self["padding"]
-        elif self["StreamCodingType"] in [0x03, 0x04, 0x80, 0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0xA1, 0xA2]:
-            data += pack_bytes((self["AudioFormat"] << 4) + self["SampleRate"], 1)
-            data += self["Language"].encode("utf-8")
-            data += self["padding"]
-        elif self["StreamCodingType"] in [0x90, 0x91]:
-            data += self["Language"].encode("utf-8")
-            data += self["padding"]
-        elif self["StreamCodingType"] in [0x92]:
-            data += pack_bytes(self["CharCode"], 1)
-            data += self["Language"].encode("utf-8")
-            data += self["padding"]
-
-        assert len(data) == self["Length"] + 1
-        return data
+        writer.write_int(self["Length"], 1)
+        writer.write_int(self["StreamCodingType"], 1)
+        if self["StreamCodingType"] in self.layouts:
+            self.layouts[self["StreamCodingType"]].write(writer, self)
+            writer.write(self["padding"])
 
 
 class CPI(InfoDict):
+    # fields following a non-zero Length, EPMap starts at relative real position 6, display position 2
+    layout = Layout(
+        ((("reserved1", 12), ("CPIType", 4)), 2),
+        ("reserved2", 1),
+        ("NumberOfStreamPIDEntries", 1),
+    )
+    stream_pid_entry_layout = Layout(
+        ((("StreamPID", 16), ("reserved3", 10), ("EPStreamType", 4), ("NumberOfEPCoarseEntries", 16),
+          ("NumberOfEPFineEntries", 18)), 8),
+        ("EPMapForOneStreamPIDStartAddress", 4),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
+        self["Length"] = unpack_bytes(data, offset, 4)
         if self["Length"]:
-            flags = unpack_bytes(data, 4, 2)
-            self["reserved1"], self["CPIType"] = divmod(flags, 2 ** 4)
-            # EPMap starts here, at relative real position 6, display position 2
-            self["reserved2"] = unpack_bytes(data, 6, 1)
-            self["NumberOfStreamPIDEntries"] = unpack_bytes(data, 7, 1)
+            cls.layout.read(self, data, offset + 4)
             # Do not create a new class for StreamPIDEntries, since its data is not continuous, conversation should
             # be handled here instead of calling subclass methods
             self["StreamPIDEntries"] = []
@@ -502,13 +505,7 @@ class CPI(InfoDict):
             for i in range(self["NumberOfStreamPIDEntries"]):
                 spid_entry = InfoDict()
                 # read_offset is static
-                read_offset = 8 + 12 * i
-                tmp = unpack_bytes(data, read_offset, 8)
-                spid_entry["StreamPID"], tmp = divmod(tmp, 2 ** 48)
-                spid_entry["reserved3"], tmp = divmod(tmp, 2 ** 38)
-                spid_entry["EPStreamType"], tmp = divmod(tmp, 2 ** 34)
-                spid_entry["NumberOfEPCoarseEntries"], spid_entry["NumberOfEPFineEntries"] = divmod(tmp, 2 ** 18)
-                spid_entry["EPMapForOneStreamPIDStartAddress"] = unpack_bytes(data, read_offset + 8, 4)
+                cls.stream_pid_entry_layout.read(spid_entry, data, offset + 8 + 12 * i)
                 self["StreamPIDEntries"].append(spid_entry)
 
             # block_start_address is dynamic
@@ -517,27 +514,24 @@ class CPI(InfoDict):
                 # Each block is of size 4 + 8 * NumberOfEPCoarseEntries + 4 * NumberOfEPFineEntries
                 # address formula 1
                 assert spid_entry["EPMapForOneStreamPIDStartAddress"] == current_address - 6
-                spid_entry["EPFineTableStartAddress"] = unpack_bytes(data, current_address, 4)
+                spid_entry["EPFineTableStartAddress"] = unpack_bytes(data, offset + current_address, 4)
                 current_address += 4
-                spid_entry["EPCoarseEntries"] = []
-                for j in range(spid_entry["NumberOfEPCoarseEntries"]):
-                    spid_entry["EPCoarseEntries"].append(EPCoarseEntry.from_bytes(
-                        data[current_address:current_address + 8]
-                    ))
-                    current_address += 8
+                spid_entry["EPCoarseEntries"] = EPCoarseTable.from_bytes(
+                    data, offset=offset + current_address, count=spid_entry["NumberOfEPCoarseEntries"])
+                current_address += 8 * spid_entry["NumberOfEPCoarseEntries"]
 
                 # address formula 2
                 assert spid_entry["EPFineTableStartAddress"] + \
                        spid_entry["EPMapForOneStreamPIDStartAddress"] == current_address - 6
-                spid_entry["EPFineEntries"] = []
-                for j in range(spid_entry["NumberOfEPFineEntries"]):
-                    spid_entry["EPFineEntries"].append(EPFineEntry.from_bytes(
-                        data[current_address:current_address + 4]
-                    ))
-                    current_address += 4
+                spid_entry["EPFineEntries"] = EPFineTable.from_bytes(
+                    data, offset=offset + current_address, count=spid_entry["NumberOfEPFineEntries"])
+                current_address += 4 * spid_entry["NumberOfEPFineEntries"]
 
+        if strict:
+            self.check_constraints()
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         if self["Length"]:
             real_length = 8 + 12 * len(self["StreamPIDEntries"])
@@ -547,6 +541,22 @@ class CPI(InfoDict):
         else:
             return 0
 
+    def ep_map_index(self, pid=None):
+        """ EPMapIndex of the stream pid, the first stream of the EP map by default
+
+        Indexes are built on first use and kept until the EP map is modified.
+        """
+        if self._derived is None:
+            self._derived = {}
+        if pid not in self._derived:
+            for spid_entry in self["StreamPIDEntries"]:
+                if pid is None or spid_entry["StreamPID"] == pid:
+                    break
+            else:
+                raise KeyError(f"No EP map for stream PID {pid}.")
+            self._derived[pid] = EPMapIndex(spid_entry["EPCoarseEntries"], spid_entry["EPFineEntries"])
+        return self._derived[pid]
+
     def update_counts(self):
         self["NumberOfStreamPIDEntries"] = len(self["StreamPIDEntries"])
         for spid_entry in self["StreamPIDEntries"]:
@@ -573,70 +583,353 @@ class CPI(InfoDict):
                 "EPMapForOneStreamPIDStartAddress"]
             current_address += 4 * len(spid_entry["EPFineEntries"])
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
+        writer.write_int(self["Length"], 4)
         if self["Length"]:
-            data += pack_bytes((self["reserved1"] << 4) + self["CPIType"], 2)
-            data += pack_bytes(self["reserved2"], 1)
-            data += pack_bytes(self["NumberOfStreamPIDEntries"], 1)
+            self.layout.write(writer, self)
             for spid_entry in self["StreamPIDEntries"]:
-                data += pack_bytes((spid_entry["StreamPID"] << 48)
-                                   + (spid_entry["reserved3"] << 38)
-                                   + (spid_entry["EPStreamType"] << 34)
-                                   + (spid_entry["NumberOfEPCoarseEntries"] << 18)
-                                   + spid_entry["NumberOfEPFineEntries"], 8)
-                data += pack_bytes(spid_entry["EPMapForOneStreamPIDStartAddress"], 4)
+                self.stream_pid_entry_layout.write(writer, spid_entry)
             for spid_entry in self["StreamPIDEntries"]:
-                data += pack_bytes(spid_entry["EPFineTableStartAddress"], 4)
-                for i in spid_entry["EPCoarseEntries"]:
-                    data += i.to_bytes()
-                for i in spid_entry["EPFineEntries"]:
-                    data += i.to_bytes()
-        return data
+                writer.write_int(spid_entry["EPFineTableStartAddress"], 4)
+                spid_entry["EPCoarseEntries"].write(writer)
+                spid_entry["EPFineEntries"].write(writer)
+
 
+class EPCoarseEntry(Record):
+    layout = Layout(
+        ((("RefToEPFineID", 18), ("PTSEPCoarse", 14)), 4),
+        ("SPNEPCoarse", 4),
+    )
+
+    __slots__ = layout.keys
 
-class EPCoarseEntry(InfoDict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
         self = cls()
-        flags = unpack_bytes(data, 0, 4)
-        self["RefToEPFineID"], self["PTSEPCoarse"] = divmod(flags, 2 ** 14)
-        self["SPNEPCoarse"] = unpack_bytes(data, 4, 4)
+        cls.layout.read(self, data, offset)
         return self
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes((self["RefToEPFineID"] << 14) + self["PTSEPCoarse"], 4)
-        data += pack_bytes(self["SPNEPCoarse"], 4)
-        return data
+        self.layout.write(writer, self)
+
+
+class EPFineEntry(Record):
+    layout = Layout(
+        ((("IsAngleChangePoint", 1), ("IEndPositionOffset", 3), ("PTSEPFine", 11), ("SPNEPFine", 17)), 4),
+    )
 
+    __slots__ = layout.keys
 
-class EPFineEntry(InfoDict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
         self = cls()
-        flags = unpack_bytes(data, 0, 4)
-        self["IsAngleChangePoint"], flags = divmod(flags, 2 ** 31)
-        self["IEndPositionOffset"], flags = divmod(flags, 2 ** 28)
-        self["PTSEPFine"], self["SPNEPFine"] = divmod(flags, 2 ** 17)
+        cls.layout.read(self, data, offset)
         return self
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(
-            (self["IsAngleChangePoint"] << 31) + (self["IEndPositionOffset"] << 28) + (self["PTSEPFine"] << 17) +
-            self["SPNEPFine"], 4)
-        return data
+        self.layout.write(writer, self)
+
+
+class EPMapEntryView(MutableMapping):
+    """ Dict-like view of a single row of an EP map table, reads and writes go to the table columns
+
+    The view raises RuntimeError once rows of the table are inserted, removed or reordered, rather than reaching the
+    row that took the place of its own. detach() returns a copy of the row that outlives such changes.
+    """
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+        self._row_moves = table.row_moves
+
+    def _check(self):
+        if self._table.row_moves != self._row_moves:
+            raise RuntimeError("EP map rows moved since the entry view was taken.")
+
+    def __getitem__(self, key):
+        self._check()
+        return self._table.columns[key][self._index]
+
+    def __setitem__(self, key, value):
+        self._check()
+        self._table.columns[key][self._index] = value
+        self._table.modified()
+
+    def __delitem__(self, key):
+        raise TypeError("Fields of an EP map entry cannot be deleted.")
+
+    def __iter__(self):
+        return iter(self._table.columns)
+
+    def __len__(self):
+        return len(self._table.columns)
+
+    def detach(self):
+        self._check()
+        return self._table.entry([column[self._index] for column in self._table.columns.values()])
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self)})"
+
+
+class EPMapTable(TrackedValue, MutableSequence):
+    """ Columnar storage of EP map entries, decoded and encoded in bulk
+
+    Each entry is made of 32-bit words, ``word_layout`` lists the bit fields of every word from the most significant
+    bit on. Every field is kept in its own array. Indexing or iterating the table returns EPMapEntryView rows, which
+    read and write the columns and stop working once rows are inserted, removed or reordered, popping it returns a
+    detached entry of ``entry_class``.
+    """
+    word_layout = ()
+    entry_class = None
+
+    def __init__(self, entries=()):
+        # incremented when rows move, views taken before refuse to read or write another row
+        self.row_moves = 0
+        self.columns = OrderedDict(
+            (name, array(WORD_TYPECODE)) for word in self.word_layout for name, _ in word)
+        self.extend(entries)
+
+    @classmethod
+    def from_bytes(cls, data, offset=0, count=None, **kwargs):
+        words_per_entry = len(cls.word_layout)
+        if count is None:
+            count = (len(data) - offset) // (4 * words_per_entry)
+        words = unpack_words(data, offset, count * words_per_entry)
+        self = cls()
+        for word_index, word in enumerate(cls.word_layout):
+            column_words = words[word_index::words_per_entry]
+            shift = 32
+            for name, bits in word:
+                shift -= bits
+                if bits == 32:
+                    self.columns[name] = column_words
+                else:
+                    mask = 2 ** bits - 1
+                    self.columns[name] = array(WORD_TYPECODE, [w >> shift & mask for w in column_words])
+        return self
+
+    def to_bytes(self):
+        words_per_entry = len(self.word_layout)
+        words = array(WORD_TYPECODE, bytes(4 * words_per_entry * len(self)))
+        for word_index, word in enumerate(self.word_layout):
+            if len(word) == 1:
+                column_words = self.columns[word[0][0]]
+            else:
+                column_words = [0] * len(self)
+                shift = 32
+                for name, bits in word:
+                    shift -= bits
+                    column_words = [w + (v << shift) for w, v in zip(column_words, self.columns[name])]
+            words[word_index::words_per_entry] = array(WORD_TYPECODE, column_words)
+        return pack_words(words)
+
+    def write(self, writer):
+        writer.write(self.to_bytes())
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def entry(self, row):
+        """ Returns an entry_class holding the values of row, a sequence of one value per column
+        """
+        entry = self.entry_class()
+        for name, value in zip(self.columns, row):
+            entry.set_decoded(name, value)
+        return entry
+
+    def _row(self, value):
+        return [value[name] for name in self.columns]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            result = self.__class__()
+            for name, column in self.columns.items():
+                result.columns[name] = column[index]
+            return result
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("EP map entry index out of range")
+        return EPMapEntryView(self, index)
+
+    def __iter__(self):
+        # the length is read at each step, the table may be modified while iterating
+        i = 0
+        while i < len(self):
+            yield EPMapEntryView(self, i)
+            i += 1
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            for name, column in self.columns.items():
+                column[index] = array(WORD_TYPECODE, [v[name] for v in value])
+            self.row_moves += 1
+        else:
+            for column, v in zip(self.columns.values(), self._row(value)):
+                column[index] = v
+        self.modified()
+
+    def __delitem__(self, index):
+        for column in self.columns.values():
+            del column[index]
+        self.row_moves += 1
+        self.modified()
+
+    def insert(self, index, value):
+        row = self._row(value)
+        # appending leaves the other rows in place
+        if index < len(self):
+            self.row_moves += 1
+        for column, v in zip(self.columns.values(), row):
+            column.insert(index, v)
+        self.modified()
+
+    def pop(self, index=-1):
+        if not len(self):
+            raise IndexError("pop from empty EP map table")
+        entry = self.entry([column.pop(index) for column in self.columns.values()])
+        self.row_moves += 1
+        self.modified()
+        return entry
+
+    def reverse(self):
+        for column in self.columns.values():
+            column.reverse()
+        self.row_moves += 1
+        self.modified()
+
+    def index(self, value, start=0, stop=None):
+        if start < 0:
+            start = max(len(self) + start, 0)
+        if stop is not None and stop < 0:
+            stop = max(len(self) + stop, 0)
+        row = tuple(self._row(value))
+        for i, other in enumerate(islice(zip(*self.columns.values()), start, stop), start):
+            if other == row:
+                return i
+        raise ValueError("EP map entry not in table")
+
+    def remove(self, value):
+        del self[self.index(value)]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self)})"
+
+
+class EPCoarseTable(EPMapTable):
+    word_layout = (
+        (("RefToEPFineID", 18), ("PTSEPCoarse", 14)),
+        (("SPNEPCoarse", 32),),
+    )
+    entry_class = EPCoarseEntry
+
+
+class EPFineTable(EPMapTable):
+    word_layout = (
+        (("IsAngleChangePoint", 1), ("IEndPositionOffset", 3), ("PTSEPFine", 11), ("SPNEPFine", 17)),
+    )
+    entry_class = EPFineEntry
+
+
+class EPMapIndex:
+    """ Entry points of one stream, sorted for binary search by presentation time and by source packet number
+
+    PTS are 33-bit values in 90 kHz ticks, twice the 45 kHz times of playlists. SPN are source packet numbers, the
+    source packet SPN starting at byte 192 * SPN of the m2ts file. Lookups return the last entry point at or before the
+    requested value, where a player would start decoding.
+    """
+
+    def __init__(self, coarse_entries, fine_entries):
+        self.pts = array("Q")
+        self.spn = array("Q")
+        ref_to_fine_ids = list(coarse_entries.columns["RefToEPFineID"]) + [len(fine_entries)]
+        coarse_pts = coarse_entries.columns["PTSEPCoarse"]
+        coarse_spn = coarse_entries.columns["SPNEPCoarse"]
+        fine_pts = fine_entries.columns["PTSEPFine"]
+        fine_spn = fine_entries.columns["SPNEPFine"]
+        for i in range(len(coarse_entries)):
+            # coarse entries hold bits 32 to 19 of the PTS, bit 19 being also the upper bit of the fine PTS, and the
+            # SPN but its lower 17 bits, which are those of the fine entries
+            pts_base = (coarse_pts[i] & ~0x01) << 19
+            spn_base = coarse_spn[i] & ~0x1FFFF
+            fine_ids = range(ref_to_fine_ids[i], ref_to_fine_ids[i + 1])
+            self.pts.extend(pts_base + (fine_pts[j] << 9) for j in fine_ids)
+            self.spn.extend(spn_base + fine_spn[j] for j in fine_ids)
+        # both increase in conforming clips, sorting only keeps the searches correct on the others
+        if any(a > b for a, b in zip(self.pts, self.pts[1:])):
+            order = sorted(range(len(self.pts)), key=self.pts.__getitem__)
+            self.pts = array("Q", [self.pts[i] for i in order])
+            self.spn = array("Q", [self.spn[i] for i in order])
+        self.spn_order = sorted(range(len(self.spn)), key=self.spn.__getitem__)
+        self.sorted_spn = array("Q", [self.spn[i] for i in self.spn_order])
+
+    def __len__(self):
+        return len(self.pts)
+
+    def __getitem__(self, index):
+        return self.pts[index], self.spn[index]
+
+    def index_of_pts(self, pts):
+        """ Index of the last entry point at or before pts, -1 if pts precedes all of them
+        """
+        return bisect_right(self.pts, pts) - 1
+
+    def index_of_spn(self, spn):
+        """ Index of the last entry point at or before the source packet spn, -1 if spn precedes all of them
+        """
+        i = bisect_right(self.sorted_spn, spn) - 1
+        return self.spn_order[i] if i >= 0 else -1
+
+    def spn_range(self, in_pts, out_pts, start_spn=0, end_spn=None, start_pts=0):
+        """ SPN of the last entry point at or before in_pts and of the first one after out_pts, among the entry points
+        from the source packet start_spn on and before end_spn, e.g. those of one STC sequence
+
+        PTS are compared as their distance from start_pts modulo 2 ** 33, so that the PTS of a sequence wrapping around
+        stay in order. Returns start_spn when no entry point precedes in_pts and end_spn when none follows out_pts.
+        """
+        low = bisect_left(self.sorted_spn, start_spn)
+        high = len(self.sorted_spn) if end_spn is None else bisect_left(self.sorted_spn, end_spn)
+        indices = self.spn_order[low:high]
+        keys = [(self.pts[i] - start_pts) % 2 ** 33 for i in indices]
+        start_index = bisect_right(keys, (in_pts - start_pts) % 2 ** 33) - 1
+        end_index = bisect_right(keys, (out_pts - start_pts) % 2 ** 33)
+        return (self.spn[indices[start_index]] if start_index >= 0 else start_spn,
+                self.spn[indices[end_index]] if end_index < len(indices) else end_spn)
+
+    def spn_at(self, pts):
+        """ SPN of the last entry point at or before pts, None if pts precedes all of them
+        """
+        i = self.index_of_pts(pts)
+        return self.spn[i] if i >= 0 else None
+
+    def pts_at(self, spn):
+        """ PTS of the last entry point at or before the source packet spn, None if spn precedes all of them
+        """
+        i = self.index_of_spn(spn)
+        return self.pts[i] if i >= 0 else None
+
+    def spns_at(self, pts_values):
+        """ spn_at() of each value of pts_values, in order
+        """
+        pts, spn = self.pts, self.spn
+        return [spn[i] if i >= 0 else None for i in (bisect_right(pts, value) - 1 for value in pts_values)]
+
+    def pts_values_at(self, spn_values):
+        """ pts_at() of each value of spn_values, in order
+        """
+        pts = self.pts
+        return [pts[i] if i >= 0 else None for i in map(self.index_of_spn, spn_values)]
 
 
 class ClipMark(InfoDict):
@@ -647,47 +940,123 @@ class ClipMark(InfoDict):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
+        self["Length"] = unpack_bytes(data, offset, 4)
         if self["Length"] != 0:
-            self["Data"] = data[4:]
+            self["Data"] = bytes(data[offset + 4: offset + 4 + self["Length"]])
+        if strict:
+            self.check_constraints()
         return self
 
     def calculate_display_size(self):
         if self["Length"] != 0:
-            return len(self["data"])
+            return len(self["Data"])
         else:
             return 0
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
+        writer.write_int(self["Length"], 4)
         if self["Length"] != 0:
-            data += self["Data"]
+            writer.write(self["Data"])
+
 
-        return data
+# summary of a clip returned by ClipInformationFile.probe(), the duration is in 45 kHz ticks
+ClipSummary = namedtuple("ClipSummary", ["type_indicator", "version_number", "clip_stream_type", "application_type",
+                                         "ts_recording_rate", "number_of_source_packets", "duration"])
 
 
 class ClipInformationFile:
-    def __init__(self, filename=None, strict=True):
+    def __init__(self, filename=None, strict=True, lazy=False, cache=None, use_mmap=False):
         self.strict = strict
+        self.lazy = lazy
+        self.cache = cache
+        self.use_mmap = use_mmap
         if not filename:
             self.data = CLPIHeader()
         else:
-            self.load(filename, self.strict)
-
-    def load(self, filename, strict):
+            self.load(filename, self.strict, self.lazy, self.cache, self.use_mmap)
+
+    def load(self, filename, strict, lazy=False, cache=None, use_mmap=False):
+        # lazy sections are views of the file contents, they are not worth caching
+        if cache is not None and not lazy:
+            self.data = cache.load(filename, CLPIHeader, strict=strict)
+            return
+        self.data = CLPIHeader.from_bytes(read_file(filename, use_mmap), strict=strict, lazy=lazy)
+
+    @staticmethod
+    def probe(filename):
+        """ Returns a ClipSummary, reading only the header, the clip info and the sequence info sections, which is much
+        faster than loading the clip
+        """
         with open(filename, "rb") as f:
-            data = f.read()
-        self.data = CLPIHeader.from_bytes(data, strict=strict)
+            data = f.read(40)
+            # ProgramInfo follows SequenceInfo
+            data += f.read(unpack_bytes(data, 12, 4) - 40)
+        duration = 0
+        read_index = unpack_bytes(data, 8, 4) + 6
+        for _ in range(unpack_bytes(data, read_index - 1, 1)):
+            number_of_stc_sequences = unpack_bytes(data, read_index + 4, 1)
+            read_index += 6
+            for _ in range(number_of_stc_sequences):
+                duration += unpack_bytes(data, read_index + 10, 4) - unpack_bytes(data, read_index + 6, 4)
+                read_index += 14
+        return ClipSummary(
+            data[0:4].decode("utf-8"),
+            data[4:8].decode("utf-8"),
+            unpack_bytes(data, 46, 1),
+            unpack_bytes(data, 47, 1),
+            unpack_bytes(data, 52, 4),
+            unpack_bytes(data, 56, 4),
+            duration,
+        )
 
-    def save(self, destination, overwrite=False):
+    @classmethod
+    async def aload(cls, filename, strict=True, lazy=False, cache=None, use_mmap=False, executor=None):
+        """ Reads and parses the file in executor, the default one of shinya.common.aio if None
+        """
+        return await run_in_executor(executor, cls, filename, strict, lazy, cache, use_mmap)
+
+    def ep_map_index(self, pid=None):
+        return self.data["CPI"].ep_map_index(pid)
+
+    def stc_sequence(self, stc_id):
+        """ Returns the STCSequence stc_id, numbered from the OffsetSTCID of its ATC sequence, and the SPN it ends
+        before, None for the end of the clip
+        """
+        atc_sequences = self.data["SequenceInfo"]["ATCSequences"]
+        for i, atc_sequence in enumerate(atc_sequences):
+            stc_sequences = atc_sequence["STCSequences"]
+            index = stc_id - atc_sequence["OffsetSTCID"]
+            if 0 <= index < len(stc_sequences):
+                if index + 1 < len(stc_sequences):
+                    end_spn = stc_sequences[index + 1]["SPNSTCStart"]
+                elif i + 1 < len(atc_sequences):
+                    end_spn = atc_sequences[i + 1]["SPNATCStart"]
+                else:
+                    end_spn = None
+                return stc_sequences[index], end_spn
+        raise KeyError(f"No STC sequence {stc_id}.")
+
+    def spn_at(self, pts, pid=None):
+        """ Source packet number of the last entry point at or before pts, in 90 kHz ticks, None if there is none
+        """
+        return self.ep_map_index(pid).spn_at(pts)
+
+    def pts_at(self, spn, pid=None):
+        """ PTS in 90 kHz ticks of the last entry point at or before the source packet spn, None if there is none
+        """
+        return self.ep_map_index(pid).pts_at(spn)
+
+    def save(self, destination, overwrite=False, fsync=False, batch=None):
+        """ Writes the file atomically, as part of batch, a WriteBatch, if given
+        """
         self.data.update_constants()
         self.data.update_addresses()
-        if os.path.exists(destination) and not overwrite:
-            raise FileExistsError()
-        os.makedirs(os.path.dirname(destination), exist_ok=True)
-        with open(destination, "wb") as f:
-            f.write(self.data.to_bytes())
+        write_file(destination, self.data.to_bytes(), overwrite, fsync, batch)
+
+    async def asave(self, destination, overwrite=False, fsync=False, batch=None, executor=None):
+        """ Serializes and writes the file in executor, the default one of shinya.common.aio if None
+        """
+        await run_in_executor(executor, self.save, destination, overwrite, fsync, batch)
@@ -0,0 +1,213 @@
+import os
+from collections import namedtuple
+
+from shinya.bd.clpi import ClipInformationFile
+from shinya.bd.indx import IndexTableFile
+from shinya.bd.mobj import MovieObjectFile
+from shinya.bd.mpls import MoviePlaylistFile
+from shinya.common.aio import run_in_executor
+
+
+# byte range [start, end) of an m2ts file, covering whole source packets of 192 bytes
+StreamRange = namedtuple("StreamRange", ["filename", "start", "end"])
+SOURCE_PACKET_SIZE = 192
+
+
+def _load_file(file_class, filename, kwargs):
+    return file_class(filename, **kwargs)
+
+
+class BDMVDisc:
+    """ The components of a BDMV directory, each one parsed the first time it is requested
+
+    load() parses several components at once in a process pool, since parsing is CPU-bound. Playlists and clips are
+    keyed by their file name without extension, e.g. "00000". root may be the BDMV directory or the directory holding
+    it. With use_mmap, files are memory-mapped instead of read, see read_file().
+    """
+    PLAYLIST = "PLAYLIST"
+    CLIPINF = "CLIPINF"
+    STREAM = "STREAM"
+    INDEX = "index.bdmv"
+    MOVIE_OBJECT = "MovieObject.bdmv"
+
+    def __init__(self, root, strict=True, lazy=False, max_workers=None, use_mmap=False):
+        if not os.path.isfile(os.path.join(root, self.INDEX)) and os.path.isdir(os.path.join(root, "BDMV")):
+            root = os.path.join(root, "BDMV")
+        self.root = root
+        self.strict = strict
+        self.lazy = lazy
+        self.max_workers = max_workers
+        self.use_mmap = use_mmap
+        self.playlists = {}
+        self.clips = {}
+        self._index = None
+        self._movie_object = None
+        self._playlist_names = self._list_names(self.PLAYLIST, ".mpls")
+        self._clip_names = self._list_names(self.CLIPINF, ".clpi")
+        self._stream_names = self._list_names(self.STREAM, ".m2ts")
+
+    def _list_names(self, directory, extension):
+        path = os.path.join(self.root, directory)
+        if not os.path.isdir(path):
+            return {}
+        names = {}
+        for filename in os.listdir(path):
+            name, ext = os.path.splitext(filename)
+            if ext.lower() == extension:
+                names[name] = os.path.join(path, filename)
+        return dict(sorted(names.items()))
+
+    def playlist_names(self):
+        return list(self._playlist_names)
+
+    def clip_names(self):
+        return list(self._clip_names)
+
+    def get_playlist(self, name):
+        if name not in self.playlists:
+            self.load(playlists=[name])
+        return self.playlists[name]
+
+    def get_clip(self, name):
+        if name not in self.clips:
+            self.load(clips=[name])
+        return self.clips[name]
+
+    @property
+    def index(self):
+        if self._index is None:
+            self.load(index=True)
+        return self._index
+
+    @property
+    def movie_object(self):
+        if self._movie_object is None:
+            self.load(movie_object=True)
+        return self._movie_object
+
+    def _jobs(self, playlists, clips, index, movie_object):
+        if playlists is True:
+            playlists = self._playlist_names
+        if clips is True:
+            clips = self._clip_names
+
+        file_kwargs = {"strict": self.strict, "lazy": self.lazy, "use_mmap": self.use_mmap}
+        jobs = []
+        for name in playlists:
+            if name not in self.playlists:
+                jobs.append((self.playlists, name, MoviePlaylistFile, self._playlist_names[name], file_kwargs))
+        for name in clips:
+            if name not in self.clips:
+                jobs.append((self.clips, name, ClipInformationFile, self._clip_names[name], file_kwargs))
+        if index and self._index is None:
+            jobs.append((None, "_index", IndexTableFile, os.path.join(self.root, self.INDEX),
+                         {"strict": self.strict, "use_mmap": self.use_mmap}))
+        if movie_object and self._movie_object is None:
+            jobs.append((None, "_movie_object", MovieObjectFile, os.path.join(self.root, self.MOVIE_OBJECT),
+                         {"strict": self.strict, "use_mmap": self.use_mmap}))
+        return jobs
+
+    def _store(self, jobs, results):
+        for (target, key, _, _, _), result in zip(jobs, results):
+            if target is None:
+                setattr(self, key, result)
+            else:
+                target[key] = result
+
+    def load(self, playlists=(), clips=(), index=False, movie_object=False):
+        """ Parses the requested components that are not loaded yet, concurrently when there is more than one
+
+        playlists and clips are iterables of names, or True for all of them.
+        """
+        jobs = self._jobs(playlists, clips, index, movie_object)
+        # lazy sections keep views of the file contents, which cannot be sent back from a worker process
+        if len(jobs) < 2 or self.lazy or self.max_workers == 1:
+            results = [_load_file(file_class, filename, kwargs) for _, _, file_class, filename, kwargs in jobs]
+        else:
+            # imported here, like asyncio below, to keep the package quick to import
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(_load_file, *list(zip(*jobs))[2:]))
+        self._store(jobs, results)
+
+    async def aload(self, playlists=(), clips=(), index=False, movie_object=False, executor=None):
+        """ load() for event loops, the files are read and parsed concurrently in executor, the default one of
+        shinya.common.aio if None
+        """
+        import asyncio
+
+        jobs = self._jobs(playlists, clips, index, movie_object)
+        results = await asyncio.gather(*(run_in_executor(executor, _load_file, file_class, filename, kwargs)
+                                         for _, _, file_class, filename, kwargs in jobs))
+        self._store(jobs, results)
+
+    def load_all(self):
+        self.load(playlists=True, clips=True, index=True, movie_object=True)
+
+    async def aload_all(self, executor=None):
+        await self.aload(playlists=True, clips=True, index=True, movie_object=True, executor=executor)
+
+    def clips_of_playlist(self, name):
+        """ Names of the clips referenced by the play items, angles and sub play items of a playlist, in order
+        """
+        playlist = self.get_playlist(name).data["PlayList"]
+        clips = []
+        for play_item in playlist["PlayItems"]:
+            clips.append(play_item["ClipInformationFileName"])
+            for angle in play_item.get("Angles", []):
+                clips.append(angle["ClipInformationFileName"])
+        for sub_path in playlist["SubPaths"]:
+            for sub_play_item in sub_path["SubPlayItems"]:
+                clips.append(sub_play_item["ClipInformationFileName"])
+                for entry in sub_play_item.get("MultiClipEntries", []):
+                    clips.append(entry["ClipInformationFileName"])
+        return list(dict.fromkeys(clips))
+
+    def playlists_of_clip(self, name):
+        """ Names of the playlists referencing a clip, all playlists are loaded to find them
+        """
+        self.load(playlists=True)
+        return [playlist_name for playlist_name in self._playlist_names
+                if name in self.clips_of_playlist(playlist_name)]
+
+    def stream_filename(self, name):
+        """ Path of the m2ts file of a clip, whether it exists or not
+        """
+        if name in self._stream_names:
+            return self._stream_names[name]
+        return os.path.join(self.root, self.STREAM, name + ".m2ts")
+
+    def stream_ranges(self, playlist):
+        """ Byte ranges of the m2ts files holding the play items of a playlist, in playback order
+
+        playlist is a name or a MoviePlaylistFile. The INTime and OUTTime of each play item are looked up in the EP map
+        of its clip, among the entry points of the STC sequence RefToSTCID of the play item, where PTS may wrap around:
+        a range starts at the last entry point at or before INTime and ends at the first entry point after OUTTime, or
+        at the end of the STC sequence, so that it can be decoded on its own. Consecutive ranges of the same file that
+        overlap or touch are merged. Only the default angle of multi-angle play items is covered.
+        """
+        if isinstance(playlist, str):
+            playlist = self.get_playlist(playlist)
+        play_items = playlist.data["PlayList"]["PlayItems"]
+        self.load(clips=[play_item["ClipInformationFileName"] for play_item in play_items])
+
+        ranges = []
+        for play_item in play_items:
+            clip_name = play_item["ClipInformationFileName"]
+            clip = self.get_clip(clip_name)
+            stc_sequence, stc_end_spn = clip.stc_sequence(play_item["RefToSTCID"])
+            # playlist and sequence times are in 45 kHz ticks, EP map PTS in 90 kHz ticks
+            start_spn, end_spn = clip.ep_map_index().spn_range(
+                2 * play_item["INTime"], 2 * play_item["OUTTime"], stc_sequence["SPNSTCStart"], stc_end_spn,
+                2 * stc_sequence["PresentationStartTime"])
+            if end_spn is None:
+                end_spn = clip.data["ClipInfo"]["NumberOfSourcePackets"]
+            stream_range = StreamRange(
+                self.stream_filename(clip_name), SOURCE_PACKET_SIZE * start_spn, SOURCE_PACKET_SIZE * end_spn)
+            if ranges and ranges[-1].filename == stream_range.filename and \
+                    ranges[-1].start <= stream_range.start <= ranges[-1].end:
+                ranges[-1] = ranges[-1]._replace(end=max(ranges[-1].end, stream_range.end))
+            else:
+                ranges.append(stream_range)
+        return ranges
@@ -1,36 +1,56 @@
-from shinya.common.info_dict import InfoDict
-from shinya.common.io import unpack_bytes, pack_bytes
+from shinya.common.info_dict import InfoDict, cached_display_size
+from shinya.common.io import unpack_bytes, Layout
 
 
 class ExtensionData(InfoDict):
+    # fields following a non-zero Length
+    layout = Layout(
+        ("DataBlockStartAddress", 4),
+        ("reserved1", 2),
+        ("reserved2", 1),
+        ("NumberOfExtDataEntries", 1),
+    )
+    entry_info_layout = Layout(
+        ("ExtDataType", 2),
+        ("ExtDataVersion", 2),
+        ("ExtDataStartAddress", 4),
+        ("ExtDataLength", 4),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
+        self["Length"] = unpack_bytes(data, offset, 4)
         if self["Length"]:
             # libbluray ignores this address and use the ones below
-            self["DataBlockStartAddress"] = unpack_bytes(data, 4, 4)
-            self["reserved1"] = unpack_bytes(data, 8, 2)
-            self["reserved2"] = unpack_bytes(data, 10, 1)
-            self["NumberOfExtDataEntries"] = unpack_bytes(data, 11, 1)
+            cls.layout.read(self, data, offset + 4)
             self["ExtDataEntryInfo"] = []
             self["ExtDataEntry"] = []
             # starts at offset 12, each info block contains 12 bytes
             for i in range(self["NumberOfExtDataEntries"]):
                 extdata_entry_info = InfoDict()
-                extdata_entry_info["ExtDataType"] = unpack_bytes(data, 12 + 12 * i, 2)
-                extdata_entry_info["ExtDataVersion"] = unpack_bytes(data, 12 + 12 * i + 2, 2)
-                extdata_entry_info["ExtDataStartAddress"] = unpack_bytes(data, 12 + 12 * i + 4, 4)
-                extdata_entry_info["ExtDataLength"] = unpack_bytes(data, 12 + 12 * i + 8, 4)
+                cls.entry_info_layout.read(extdata_entry_info, data, offset + 12 + 12 * i)
                 self["ExtDataEntryInfo"].append(extdata_entry_info)
-                self["ExtDataEntry"].append(ExtDataEntry.from_bytes(data[extdata_entry_info["ExtDataStartAddress"]:
-                                                                         extdata_entry_info["ExtDataStartAddress"] +
-                                                                         extdata_entry_info["ExtDataLength"]]))
+                self["ExtDataEntry"].append(ExtDataEntry.from_bytes(
+                    data, offset=offset + extdata_entry_info["ExtDataStartAddress"],
+                    length=extdata_entry_info["ExtDataLength"]))
+            if strict:
+                # entries are written back to back right after the info blocks
+                current_address = 12 + 12 * self["NumberOfExtDataEntries"]
+                for extdata_entry_info in self["ExtDataEntryInfo"]:
+                    assert extdata_entry_info["ExtDataStartAddress"] == current_address
+                    current_address += extdata_entry_info["ExtDataLength"]
+                assert self["Length"] == current_address - 4
+        if strict:
+            # the source bytes are written back as is, the constraints write() would check are checked here
+            self.check_constraints()
+            self.set_source(data, offset, self["Length"] + 4)
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         if self["Length"]:
             real_length = 12 + 12 * len(self["ExtDataEntryInfo"])
@@ -49,23 +69,17 @@ class ExtensionData(InfoDict):
             if len(self["ExtDataEntryInfo"]):
                 assert self["ExtDataEntryInfo"][0]["ExtDataStartAddress"] == self["DataBlockStartAddress"]
 
-    def to_bytes(self):
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
+        writer.write_int(self["Length"], 4)
         if self["Length"]:
-            data += pack_bytes(self["DataBlockStartAddress"], 4)
-            data += pack_bytes(self["reserved1"], 2)
-            data += pack_bytes(self["reserved2"], 1)
-            data += pack_bytes(self["NumberOfExtDataEntries"], 1)
+            self.layout.write(writer, self)
             for ext_data_info in self["ExtDataEntryInfo"]:
-                data += pack_bytes(ext_data_info["ExtDataType"], 2)
-                data += pack_bytes(ext_data_info["ExtDataVersion"], 2)
-                data += pack_bytes(ext_data_info["ExtDataStartAddress"], 4)
-                data += pack_bytes(ext_data_info["ExtDataLength"], 4)
+                self.entry_info_layout.write(writer, ext_data_info)
             for ext_data in self["ExtDataEntry"]:
-                data += ext_data.to_bytes()
-        return data
+                ext_data.write(writer)
 
 
 class ExtDataEntry(InfoDict):
@@ -76,13 +90,15 @@ class ExtDataEntry(InfoDict):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, length=None, **kwargs):
         self = cls()
-        self["data"] = data
+        if length is None:
+            length = len(data) - offset
+        self["data"] = bytes(data[offset: offset + length])
         return self
 
     def calculate_display_size(self):
         return len(self["data"])
 
-    def to_bytes(self, **kwargs):
-        return self["data"]
+    def write(self, writer):
+        writer.write(self["data"])
@@ -1,22 +1,26 @@
-import os
-
 from shinya.bd.extension_data import ExtensionData
-from shinya.common.info_dict import InfoDict
-from shinya.common.io import unpack_bytes, pack_bytes
+from shinya.common.aio import run_in_executor
+from shinya.common.info_dict import InfoDict, cached_display_size, untracked_decoding
+from shinya.common.io import unpack_bytes, read_file, write_file, Layout
 
 
 class INDXHeader(InfoDict):
+    layout = Layout(
+        ("TypeIndicator", 4, str),
+        ("VersionNumber", 4, str),
+        ("IndexesStartAddress", 4),
+        ("ExtensionDataStartAddress", 4),
+        ("reserved1", 24, bytes),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
+    @untracked_decoding
     def from_bytes(cls, data, strict=True, **kwargs):
         self = cls()
-        self["TypeIndicator"] = data[0:4].decode("utf-8")
-        self["VersionNumber"] = data[4:8].decode("utf-8")
-        self["IndexesStartAddress"] = unpack_bytes(data, 8, 4)
-        self["ExtensionDataStartAddress"] = unpack_bytes(data, 12, 4)
-        self["reserved1"] = data[16:40]
+        cls.layout.read(self, data)
 
         appinfo_display_size = unpack_bytes(data, 40, 4)
         indexes_display_size = unpack_bytes(data, self["IndexesStartAddress"], 4)
@@ -34,14 +38,13 @@ class INDXHeader(InfoDict):
             else:
                 assert self["IndexesStartAddress"] + indexes_display_size + 4 == len(data)
 
-        self["AppInfoBDMV"] = AppInfoBDMV.from_bytes(data[40: 40 + appinfo_display_size + 4])
-        self["Indexes"] = Indexes.from_bytes(
-            data[self["IndexesStartAddress"]: self["IndexesStartAddress"] + indexes_display_size + 4])
+        self["AppInfoBDMV"] = AppInfoBDMV.from_bytes(data, offset=40)
+        self["Indexes"] = Indexes.from_bytes(data, offset=self["IndexesStartAddress"])
         if self["ExtensionDataStartAddress"]:
-            self["ExtensionData"] = ExtensionData.from_bytes(
-                data[self["ExtensionDataStartAddress"]: self["ExtensionDataStartAddress"] + extension_display_size + 4])
+            self["ExtensionData"] = ExtensionData.from_bytes(data, offset=self["ExtensionDataStartAddress"])
         if strict:
-            assert data == self.to_bytes()
+            # data may be a MappedFile, which never compares equal to bytes
+            assert memoryview(data) == self.to_bytes()
         return self
 
     def update_addresses(self, offset=0):
@@ -55,64 +58,52 @@ class INDXHeader(InfoDict):
             indexes_display_size = self["Indexes"].calculate_display_size()
             assert (self["IndexesStartAddress"] + indexes_display_size + 4 == self["ExtensionDataStartAddress"])
 
-    def to_bytes(self):
+    def calculate_file_size(self):
+        if self["ExtensionDataStartAddress"]:
+            return self["ExtensionDataStartAddress"] + self["ExtensionData"].calculate_display_size() + 4
+        else:
+            return self["IndexesStartAddress"] + self["Indexes"].calculate_display_size() + 4
+
+    def to_bytes(self, **kwargs):
+        return super().to_bytes(size=self.calculate_file_size())
+
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += self["TypeIndicator"].encode("utf-8")
-        data += self["VersionNumber"].encode("utf-8")
-        data += pack_bytes(self["IndexesStartAddress"], 4)
-        data += pack_bytes(self["ExtensionDataStartAddress"], 4)
-        data += self["reserved1"]
-
-        data += self["AppInfoBDMV"].to_bytes()
-        data += self["Indexes"].to_bytes()
+        self.layout.write(writer, self)
+
+        self["AppInfoBDMV"].write(writer)
+        self["Indexes"].write(writer)
         if self["ExtensionDataStartAddress"]:
-            data += self["ExtensionData"].to_bytes()
-        return data
+            self["ExtensionData"].write(writer)
 
 
 class AppInfoBDMV(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ((("reserved1", 1), ("InitialOutputModePreference", 1), ("SSContentExistFlag", 1), ("reserved2", 1),
+          ("InitialDynamicRangeType", 4)), 1),
+        ((("VideoFormat", 4), ("FrameRate", 4)), 1),
+        ("UserData", 32, bytes),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
-        assert len(data) == 38
+    def from_bytes(cls, data, offset=0, **kwargs):
+        assert len(data) >= offset + 38
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        flags = unpack_bytes(data, 4, 1)
-        self["reserved1"] = flags >> 7 & 1
-        self["InitialOutputModePreference"] = flags >> 6 & 1
-        self["SSContentExistFlag"] = flags >> 5 & 1
-        self["reserved2"] = flags >> 4 & 1
-        self["InitialDynamicRangeType"] = flags % 2 ** 4
-        flags = unpack_bytes(data, 5, 1)
-        self["VideoFormat"], self["FrameRate"] = divmod(flags, 2 ** 4)
-        self["UserData"] = data[6:]
+        cls.layout.read(self, data, offset)
 
         return self
 
     def calculate_display_size(self):
         return 34
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        flags = (
-                (self["reserved1"] << 7)
-                + (self["InitialOutputModePreference"] << 6)
-                + (self["SSContentExistFlag"] << 5)
-                + (self["reserved2"] << 4)
-                + self["InitialDynamicRangeType"]
-        )
-        data += pack_bytes(flags, 1)
-        data += pack_bytes((self["VideoFormat"] << 4) + self["FrameRate"], 1)
-        data += self["UserData"]
-
-        return data
+        self.layout.write(writer, self)
 
 
 class Indexes(InfoDict):
@@ -120,18 +111,19 @@ class Indexes(InfoDict):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["FirstPlaybackTitle"] = Title.from_bytes(data[4:16])
-        self["TopMenuTitle"] = Title.from_bytes(data[16:28])
-        self["NumberOfTitles"] = unpack_bytes(data, 28, 2)
+        self["Length"] = unpack_bytes(data, offset, 4)
+        self["FirstPlaybackTitle"] = Title.from_bytes(data, offset=offset + 4)
+        self["TopMenuTitle"] = Title.from_bytes(data, offset=offset + 16)
+        self["NumberOfTitles"] = unpack_bytes(data, offset + 28, 2)
         self["Titles"] = []
         for i in range(self["NumberOfTitles"]):
-            self["Titles"].append(Title.from_bytes(data[30 + i * 12:30 + (i + 1) * 12]))
+            self["Titles"].append(Title.from_bytes(data, offset=offset + 30 + i * 12))
 
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         return 30 + 12 * len(self["Titles"]) - 4
 
@@ -142,79 +134,78 @@ class Indexes(InfoDict):
         super().check_constraints()
         assert self["NumberOfTitles"] == len(self["Titles"])
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
 
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += self["FirstPlaybackTitle"].to_bytes()
-        data += self["TopMenuTitle"].to_bytes()
-        data += pack_bytes(self["NumberOfTitles"], 2)
+        writer.write_int(self["Length"], 4)
+        self["FirstPlaybackTitle"].write(writer)
+        self["TopMenuTitle"].write(writer)
+        writer.write_int(self["NumberOfTitles"], 2)
         for i in self["Titles"]:
-            data += i.to_bytes()
-
-        return data
+            i.write(writer)
 
 
 class Title(InfoDict):
+    movie_object_layout = Layout(
+        ((("ObjectType", 2), ("AccessType", 2), ("reserved1", 28)), 4),
+        ((("PlaybackType", 2), ("reserved2", 14)), 2),
+        ("RefToMovieObjectID", 2),
+        ("reserved3", 4),
+    )
+    bdj_object_layout = Layout(
+        *movie_object_layout.fields[:2],
+        ("RefToBDJObjectID", 5, str),
+        ("reserved4", 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
-        assert len(data) == 12
+    def from_bytes(cls, data, offset=0, **kwargs):
+        assert len(data) >= offset + 12
 
         self = cls()
-        flags = unpack_bytes(data, 0, 4)
-        self["ObjectType"], flags = divmod(flags, 2 ** 30)
-        self["AccessType"], self["reserved1"] = divmod(flags, 2 ** 28)
-        flags = unpack_bytes(data, 4, 2)
-        self["PlaybackType"], self["reserved2"] = divmod(flags, 2 ** 14)
-
-        if self["ObjectType"] == 1:
-            self["RefToMovieObjectID"] = unpack_bytes(data, 6, 2)
-            self["reserved3"] = unpack_bytes(data, 8, 4)
+        if unpack_bytes(data, offset, 1) >> 6 == 1:
+            cls.movie_object_layout.read(self, data, offset)
         else:
-            self["RefToBDJObjectID"] = data[6:11].decode("utf-8")
-            self["reserved4"] = unpack_bytes(data, 11, 1)
-
+            cls.bdj_object_layout.read(self, data, offset)
         return self
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-
-        data = b""
-        data += pack_bytes((self["ObjectType"] << 30) + (self["AccessType"] << 28) + self["reserved1"], 4)
-        data += pack_bytes((self["PlaybackType"] << 14) + self["reserved2"], 2)
-
         if self["ObjectType"] == 1:
-            data += pack_bytes(self["RefToMovieObjectID"], 2)
-            data += pack_bytes(self["reserved3"], 4)
+            self.movie_object_layout.write(writer, self)
         else:
-            data += self["RefToBDJObjectID"].encode("utf-8")
-            data += pack_bytes(self["reserved4"], 1)
-
-        return data
+            self.bdj_object_layout.write(writer, self)
 
 
 class IndexTableFile:
-    def __init__(self, filename=None, strict=True):
+    def __init__(self, filename=None, strict=True, use_mmap=False):
         self.strict = strict
+        self.use_mmap = use_mmap
         if not filename:
             self.data = INDXHeader()
         else:
-            self.load(filename, self.strict)
+            self.load(filename, self.strict, self.use_mmap)
 
-    def load(self, filename, strict):
-        with open(filename, "rb") as f:
-            data = f.read()
-        self.data = INDXHeader.from_bytes(data, strict=strict)
+    def load(self, filename, strict, use_mmap=False):
+        self.data = INDXHeader.from_bytes(read_file(filename, use_mmap), strict=strict)
 
-    def save(self, destination, overwrite=False):
+    @classmethod
+    async def aload(cls, filename, strict=True, use_mmap=False, executor=None):
+        """ Reads and parses the file in executor, the default one of shinya.common.aio if None
+        """
+        return await run_in_executor(executor, cls, filename, strict, use_mmap)
+
+    def save(self, destination, overwrite=False, fsync=False, batch=None):
+        """ Writes the file atomically, as part of batch, a WriteBatch, if given
+        """
         self.data.update_constants()
         self.data.update_addresses()
-        if os.path.exists(destination) and not overwrite:
-            raise FileExistsError()
-        os.makedirs(os.path.dirname(destination), exist_ok=True)
-        with open(destination, "wb") as f:
-            f.write(self.data.to_bytes())
+        write_file(destination, self.data.to_bytes(), overwrite, fsync, batch)
+
+    async def asave(self, destination, overwrite=False, fsync=False, batch=None, executor=None):
+        """ Serializes and writes the file in executor, the default one of shinya.common.aio if None
+        """
+        await run_in_executor(executor, self.save, destination, overwrite, fsync, batch)
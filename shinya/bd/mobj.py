@@ -1,31 +1,35 @@
-import os
 from enum import IntEnum
 
 from shinya.bd.extension_data import ExtensionData
-from shinya.common.info_dict import InfoDict
-from shinya.common.io import unpack_bytes, pack_bytes
+from shinya.common.aio import run_in_executor
+from shinya.common.info_dict import InfoDict, Record, cached_display_size, untracked_decoding
+from shinya.common.io import unpack_bytes, read_file, write_file, Layout
 
 
 class MOBJHeader(InfoDict):
+    layout = Layout(
+        ("TypeIndicator", 4, str),
+        ("VersionNumber", 4, str),
+        ("ExtensionDataStartAddress", 4),
+        ("reserved1", 28, bytes),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
+    @untracked_decoding
     def from_bytes(cls, data, strict=True, **kwargs):
         self = cls()
-        self["TypeIndicator"] = data[0:4].decode("utf-8")
-        self["VersionNumber"] = data[4:8].decode("utf-8")
-        self["ExtensionDataStartAddress"] = unpack_bytes(data, 8, 4)
-        self["reserved1"] = data[12:40]
+        cls.layout.read(self, data)
 
         movie_object_length = unpack_bytes(data, 40, 4)
-        self['MovieObjects'] = MovieObjects.from_bytes(data[40: 40 + movie_object_length + 4])
+        self['MovieObjects'] = MovieObjects.from_bytes(data, offset=40)
 
         extension_display_size = 0
         if self["ExtensionDataStartAddress"]:
             extension_display_size = unpack_bytes(data, self["ExtensionDataStartAddress"], 4)
-            self["ExtensionData"] = ExtensionData.from_bytes(
-                data[self["ExtensionDataStartAddress"]: self["ExtensionDataStartAddress"] + extension_display_size + 4])
+            self["ExtensionData"] = ExtensionData.from_bytes(data, offset=self["ExtensionDataStartAddress"])
 
         if strict:
             if self["ExtensionDataStartAddress"]:
@@ -35,7 +39,8 @@ class MOBJHeader(InfoDict):
             else:
                 assert 40 + movie_object_length + 4 == len(data)
 
-            assert data == self.to_bytes()
+            # data may be a MappedFile, which never compares equal to bytes
+            assert memoryview(data) == self.to_bytes()
 
         return self
 
@@ -48,40 +53,48 @@ class MOBJHeader(InfoDict):
             movie_object_length = self["MovieObjects"].calculate_display_size()
             assert (self["PlayListMarkStartAddress"] + movie_object_length + 4 == self["ExtensionDataStartAddress"])
 
-    def to_bytes(self):
+    def calculate_file_size(self):
+        if self["ExtensionDataStartAddress"]:
+            return self["ExtensionDataStartAddress"] + self["ExtensionData"].calculate_display_size() + 4
+        else:
+            return 40 + self["MovieObjects"].calculate_display_size() + 4
+
+    def to_bytes(self, **kwargs):
+        return super().to_bytes(size=self.calculate_file_size())
+
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += self["TypeIndicator"].encode("utf-8")
-        data += self["VersionNumber"].encode("utf-8")
-        data += pack_bytes(self["ExtensionDataStartAddress"], 4)
-        data += self["reserved1"]
+        self.layout.write(writer, self)
 
-        data += self["MovieObjects"].to_bytes()
+        self["MovieObjects"].write(writer)
         if self["ExtensionDataStartAddress"]:
-            data += self["ExtensionData"].to_bytes()
-        return data
+            self["ExtensionData"].write(writer)
 
 
 class MovieObjects(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("reserved1", 4),
+        ("NumberOfMobjs", 2),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["reserved1"] = unpack_bytes(data, 4, 4)
-        self["NumberOfMobjs"] = unpack_bytes(data, 8, 2)
+        read_index = cls.layout.read(self, data, offset)
 
         self["Mobjs"] = []
-        read_index = 10
         for i in range(self["NumberOfMobjs"]):
             n_navi_cmds = unpack_bytes(data, read_index + 2, 2)
             mobj_length = 4 + n_navi_cmds * 12
-            self["Mobjs"].append(Mobj.from_bytes(data[read_index:read_index + mobj_length]))
+            self["Mobjs"].append(Mobj.from_bytes(data, offset=read_index))
             read_index += mobj_length
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         real_length = 10
         for i in self["Mobjs"]:
@@ -95,37 +108,33 @@ class MovieObjects(InfoDict):
         super().check_constraints()
         assert self["NumberOfMobjs"] == len(self["Mobjs"])
 
-    def to_bytes(self, **kwargs):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["reserved1"], 4)
-        data += pack_bytes(self["NumberOfMobjs"], 2)
+        self.layout.write(writer, self)
         for i in self["Mobjs"]:
-            data += i.to_bytes()
-
-        return data
+            i.write(writer)
 
 
 class Mobj(InfoDict):
+    layout = Layout(
+        ((("ResumeIntentionFlag", 1), ("MenuCallMask", 1), ("TitleSearchMask", 1), ("reserved1", 13)), 2),
+        ("NumberOfNavigationCommands", 2),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, **kwargs):
         self = cls()
-        flags = unpack_bytes(data, 0, 2)
-        self["ResumeIntentionFlag"] = flags >> 15 & 1
-        self["MenuCallMask"] = flags >> 14 & 1
-        self["TitleSearchMask"] = flags >> 13 & 1
-        self["reserved1"] = flags % 2 ** 13
-        self["NumberOfNavigationCommands"] = unpack_bytes(data, 2, 2)
+        read_index = cls.layout.read(self, data, offset)
 
         self["NavigationCommands"] = []
         for i in range(self["NumberOfNavigationCommands"]):
-            self["NavigationCommands"].append(NavigationCommand.from_bytes(data[4 + i * 12:4 + (i + 1) * 12]))
+            self["NavigationCommands"].append(NavigationCommand.from_bytes(data, offset=read_index + i * 12))
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         return 4 + 12 * len(self["NavigationCommands"])
 
@@ -136,17 +145,11 @@ class Mobj(InfoDict):
         super().check_constraints()
         assert self["NumberOfNavigationCommands"] == len(self["NavigationCommands"])
 
-    def to_bytes(self, **kwargs):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(
-            self["ResumeIntentionFlag"] * 2 ** 15 + self["MenuCallMask"] * 2 ** 14 + self["TitleSearchMask"] * 2 ** 13 +
-            self["reserved1"], 2)
-        data += pack_bytes(self["NumberOfNavigationCommands"], 2)
+        self.layout.write(writer, self)
         for i in self["NavigationCommands"]:
-            data += i.to_bytes()
-
-        return data
+            i.write(writer)
 
 
 class CommandGroup(IntEnum):
@@ -166,39 +169,31 @@ class SetCommandSubGroup(IntEnum):
     SETSYSTEM = 1
 
 
-class NavigationCommand(InfoDict):
+class NavigationCommand(Record):
+    layout = Layout(
+        ((("OperandCount", 3), ("CommandGroup", 2), ("CommandSubGroup", 3)), 1),
+        ((("DestinationImmediateValueFlag", 1), ("SourceImmediateValueFlag", 1), ("reserved1", 2),
+          ("BranchOption", 4)), 1),
+        ((("reserved2", 4), ("CompareOption", 4)), 1),
+        ((("reserved3", 3), ("SetOption", 5)), 1),
+        ("Destination", 4),
+        ("Source", 4),
+    )
+
+    __slots__ = layout.keys
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
-        assert len(data) == 12
+    def from_bytes(cls, data, offset=0, **kwargs):
+        assert len(data) >= offset + 12
         self = cls()
-        flags = unpack_bytes(data, 0, 1)
-        self["OperandCount"], flags = divmod(flags, 2 ** 5)
-        self["CommandGroup"], self["CommandSubGroup"] = divmod(flags, 2 ** 3)
-        flags = unpack_bytes(data, 1, 1)
-        self["DestinationImmediateValueFlag"] = flags >> 7 & 1
-        self["SourceImmediateValueFlag"] = flags >> 6 & 1
-        self["reserved1"], self["BranchOption"] = divmod(flags % 2 ** 6, 2 ** 4)
-        flags = unpack_bytes(data, 2, 1)
-        self["reserved2"], self["CompareOption"] = divmod(flags, 2 ** 4)
-        flags = unpack_bytes(data, 3, 1)
-        self["reserved3"], self["SetOption"] = divmod(flags, 2 ** 5)
-        self["Destination"] = unpack_bytes(data, 4, 4)
-        self["Source"] = unpack_bytes(data, 8, 4)
+        cls.layout.read(self, data, offset)
         return self
 
-    def to_bytes(self, **kwargs):
-        data = b""
-        data += pack_bytes((self["OperandCount"] << 5) + (self["CommandGroup"] << 3) + self["CommandSubGroup"], 1)
-        data += pack_bytes((self["DestinationImmediateValueFlag"] << 7) + (self["SourceImmediateValueFlag"] << 6)
-                           + (self["reserved1"] << 4) + self["BranchOption"], 1)
-        data += pack_bytes((self["reserved2"] << 4) + self["CompareOption"], 1)
-        data += pack_bytes((self["reserved3"] << 5) + self["SetOption"], 1)
-        data += pack_bytes(self["Destination"], 4)
-        data += pack_bytes(self["Source"], 4)
-        return data
+    def write(self, writer):
+        self.layout.write(writer, self)
 
     def get_command(self):
         if self["CommandGroup"] == CommandGroup.BRANCH:
@@ -320,23 +315,31 @@ class NavigationCommand(InfoDict):
 
 
 class MovieObjectFile:
-    def __init__(self, filename=None, strict=True):
+    def __init__(self, filename=None, strict=True, use_mmap=False):
         self.strict = strict
+        self.use_mmap = use_mmap
         if not filename:
             self.data = MOBJHeader()
         else:
-            self.load(filename, self.strict)
+            self.load(filename, self.strict, self.use_mmap)
 
-    def load(self, filename, strict):
-        with open(filename, "rb") as f:
-            data = f.read()
-        self.data = MOBJHeader.from_bytes(data, strict=strict)
+    def load(self, filename, strict, use_mmap=False):
+        self.data = MOBJHeader.from_bytes(read_file(filename, use_mmap), strict=strict)
 
-    def save(self, destination, overwrite=False):
+    @classmethod
+    async def aload(cls, filename, strict=True, use_mmap=False, executor=None):
+        """ Reads and parses the file in executor, the default one of shinya.common.aio if None
+        """
+        return await run_in_executor(executor, cls, filename, strict, use_mmap)
+
+    def save(self, destination, overwrite=False, fsync=False, batch=None):
+        """ Writes the file atomically, as part of batch, a WriteBatch, if given
+        """
         self.data.update_constants()
         self.data.update_addresses()
-        if os.path.exists(destination) and not overwrite:
-            raise FileExistsError()
-        os.makedirs(os.path.dirname(destination), exist_ok=True)
-        with open(destination, "wb") as f:
-            f.write(self.data.to_bytes())
+        write_file(destination, self.data.to_bytes(), overwrite, fsync, batch)
+
+    async def asave(self, destination, overwrite=False, fsync=False, batch=None, executor=None):
+        """ Serializes and writes the file in executor, the default one of shinya.common.aio if None
+        """
+        await run_in_executor(executor, self.save, destination, overwrite, fsync, batch)
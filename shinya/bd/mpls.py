@@ -1,23 +1,29 @@
-import os
+from collections import namedtuple
 
 from shinya.bd.extension_data import ExtensionData
-from shinya.common.info_dict import InfoDict
-from shinya.common.io import unpack_bytes, pack_bytes
+from shinya.common.aio import run_in_executor
+from shinya.common.info_dict import InfoDict, LazyInfoDict, LazySection, Record, cached_display_size, untracked_decoding
+from shinya.common.io import unpack_bytes, read_file, write_file, Layout
 
 
-class MPLSHeader(InfoDict):
+class MPLSHeader(LazyInfoDict):
+    layout = Layout(
+        ("TypeIndicator", 4, str),
+        ("VersionNumber", 4, str),
+        ("PlayListStartAddress", 4),
+        ("PlayListMarkStartAddress", 4),
+        ("ExtensionDataStartAddress", 4),
+        ("reserved1", 20, bytes),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, strict=True, **kwargs):
+    @untracked_decoding
+    def from_bytes(cls, data, strict=True, lazy=False, **kwargs):
         self = cls()
-        self["TypeIndicator"] = data[0:4].decode("utf-8")
-        self["VersionNumber"] = data[4:8].decode("utf-8")
-        self["PlayListStartAddress"] = unpack_bytes(data, 8, 4)
-        self["PlayListMarkStartAddress"] = unpack_bytes(data, 12, 4)
-        self["ExtensionDataStartAddress"] = unpack_bytes(data, 16, 4)
-        self["reserved1"] = data[20:40]
+        cls.layout.read(self, data)
 
         appinfo_display_size = unpack_bytes(data, 40, 4)
         playlist_display_size = unpack_bytes(data, self["PlayListStartAddress"], 4)
@@ -38,30 +44,44 @@ class MPLSHeader(InfoDict):
             else:
                 assert self["PlayListMarkStartAddress"] + playlist_mark_display_size + 4 == len(data)
 
-        self["AppInfoPlayList"] = AppInfoPlayList.from_bytes(data[40: 40 + appinfo_display_size + 4])
-        self["PlayList"] = PlayList.from_bytes(
-            data[self["PlayListStartAddress"]: self["PlayListStartAddress"] + playlist_display_size + 4])
-        self["PlayListMark"] = PlayListMark.from_bytes(
-            data[self["PlayListMarkStartAddress"]: self["PlayListMarkStartAddress"] + playlist_mark_display_size + 4])
+        sections = [
+            ("AppInfoPlayList", AppInfoPlayList, 40, appinfo_display_size),
+            ("PlayList", PlayList, self["PlayListStartAddress"], playlist_display_size),
+            ("PlayListMark", PlayListMark, self["PlayListMarkStartAddress"], playlist_mark_display_size),
+        ]
         if self["ExtensionDataStartAddress"]:
-            self["ExtensionData"] = ExtensionData.from_bytes(
-                data[self["ExtensionDataStartAddress"]: self["ExtensionDataStartAddress"] + extension_display_size + 4])
+            sections.append(
+                ("ExtensionData", ExtensionData, self["ExtensionDataStartAddress"], extension_display_size))
+
+        for key, section_class, start_address, display_size in sections:
+            if lazy:
+                # a view shares the buffer of data instead of copying the section
+                section_data = memoryview(data)[start_address: start_address + display_size + 4]
+                self[key] = LazySection(section_class, section_data, strict=strict)
+            else:
+                self[key] = section_class.from_bytes(data, offset=start_address, strict=strict)
 
+        if strict and not lazy:
+            # every section checked its own constraints and rejected the bytes it would not write back, which leaves
+            # the addresses checked here for an exact round-trip
+            self.check_constraints()
         if strict:
-            assert data == self.to_bytes()
+            self.set_source(data, 0, len(data))
         return self
 
     def update_addresses(self, offset=0):
-        playlist_display_size = self["PlayList"].calculate_display_size()
-        playlist_mark_display_size = self["PlayListMark"].calculate_display_size()
+        if self._source is not None:
+            return
+        playlist_display_size = self.section("PlayList").calculate_display_size()
+        playlist_mark_display_size = self.section("PlayListMark").calculate_display_size()
         self["PlayListMarkStartAddress"] = self["PlayListStartAddress"] + playlist_display_size + 4
         if self["ExtensionDataStartAddress"]:
             self["ExtensionDataStartAddress"] = self["PlayListMarkStartAddress"] + playlist_mark_display_size + 4
 
     def check_constraints(self):
-        appinfo_display_size = self["AppInfoPlayList"].calculate_display_size()
-        playlist_display_size = self["PlayList"].calculate_display_size()
-        playlist_mark_display_size = self["PlayListMark"].calculate_display_size()
+        appinfo_display_size = self.section("AppInfoPlayList").calculate_display_size()
+        playlist_display_size = self.section("PlayList").calculate_display_size()
+        playlist_mark_display_size = self.section("PlayListMark").calculate_display_size()
 
         assert appinfo_display_size == 14
         assert self["PlayListStartAddress"] == 58
@@ -70,209 +90,158 @@ class MPLSHeader(InfoDict):
             assert (self["PlayListMarkStartAddress"] + playlist_mark_display_size + 4 == self[
                 "ExtensionDataStartAddress"])
 
-    def to_bytes(self):
+    def calculate_file_size(self):
+        if self["ExtensionDataStartAddress"]:
+            return self["ExtensionDataStartAddress"] + self.section("ExtensionData").calculate_display_size() + 4
+        else:
+            return self["PlayListMarkStartAddress"] + self.section("PlayListMark").calculate_display_size() + 4
+
+    def to_bytes(self, **kwargs):
+        return super().to_bytes(size=self.calculate_file_size())
+
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
-        data = b""
-        data += self["TypeIndicator"].encode("utf-8")
-        data += self["VersionNumber"].encode("utf-8")
-        data += pack_bytes(self["PlayListStartAddress"], 4)
-        data += pack_bytes(self["PlayListMarkStartAddress"], 4)
-        data += pack_bytes(self["ExtensionDataStartAddress"], 4)
-        data += self["reserved1"]
-
-        data += self["AppInfoPlayList"].to_bytes()
-        data += self["PlayList"].to_bytes()
-        data += self["PlayListMark"].to_bytes()
+        self.layout.write(writer, self)
+
+        self.section("AppInfoPlayList").write(writer)
+        self.section("PlayList").write(writer)
+        self.section("PlayListMark").write(writer)
         if self["ExtensionDataStartAddress"]:
-            data += self["ExtensionData"].to_bytes()
-        return data
+            self.section("ExtensionData").write(writer)
 
 
-class AppInfoPlayList(InfoDict):
+class UOMaskTable(InfoDict):
+    mask_fields = (
+        ("MenuCall", 1),
+        ("TitleSearch", 1),
+        ("ChapterSearch", 1),
+        ("TimeSearch", 1),
+        ("SkipToNextPoint", 1),
+        ("SkipToPrevPoint", 1),
+        ("reserved1", 1),
+        ("Stop", 1),
+        ("PauseOn", 1),
+        ("reserved2", 1),
+        ("StillOff", 1),
+        ("ForwardPlay", 1),
+        ("BackwardPlay", 1),
+        ("Resume", 1),
+        ("MoveUpSelectedButton", 1),
+        ("MoveDownSelectedButton", 1),
+        ("MoveLeftSelectedButton", 1),
+        ("MoveRightSelectedButton", 1),
+        ("SelectButton", 1),
+        ("ActivateButton", 1),
+        ("SelectAndActivateButton", 1),
+        ("PrimaryAudioStreamNumberChange", 1),
+        ("reserved3", 1),
+        ("AngleNumberChange", 1),
+        ("PopupOn", 1),
+        ("PopupOff", 1),
+        ("PrimaryPGEnableDisable", 1),
+        ("PrimaryPGStreamNumberChange", 1),
+        ("SecondaryVideoEnableDisable", 1),
+        ("SecondaryVideoStreamNumberChange", 1),
+        ("SecondaryAudioEnableDisable", 1),
+        ("SecondaryAudioStreamNumberChange", 1),
+        ("reserved4", 1),
+        ("SecondaryPGStreamNumberChange", 1),
+        ("reserved5", 30),
+    )
+    layout = Layout(
+        (mask_fields, 8),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
-        assert len(data) == 18
+    def from_bytes(cls, data, offset=0, **kwargs):
+        assert len(data) >= offset + 8
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["reserved1"] = unpack_bytes(data, 4, 1)
-        self["PlaybackType"] = unpack_bytes(data, 5, 1)
-        if self["PlaybackType"] in [2, 3]:
-            self["PlaybackCount"] = unpack_bytes(data, 6, 2)
-        else:
-            self["reserved2"] = unpack_bytes(data, 6, 2)
-
-        self["UOMaskTable"] = UOMaskTable.from_bytes(data[8:16])
-        flags = unpack_bytes(data, 16, 2)
-
-        self["RandomAccessFlag"] = flags >> 15 & 1
-        self["AudioMixFlag"] = flags >> 14 & 1
-        self["LosslessBypassFlag"] = flags >> 13 & 1
-        self["MVCBaseViewRFlag"] = flags >> 12 & 1
-        self["SDRConversionNotificationFlag"] = flags >> 11 & 1
-        self["reserved3"] = flags % 2 ** 11
-
+        cls.layout.read(self, data, offset)
         return self
 
-    def calculate_display_size(self):
-        return 14
-
-    def to_bytes(self):
-
+    def write(self, writer):
         self.check_constraints()
+        self.layout.write(writer, self)
 
-        flags = (
-                (self["RandomAccessFlag"] << 15)
-                + (self["AudioMixFlag"] << 14)
-                + (self["LosslessBypassFlag"] << 13)
-                + (self["MVCBaseViewRFlag"] << 12)
-                + (self["SDRConversionNotificationFlag"] << 11)
-                + self["reserved3"]
-        )
-
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["reserved1"], 1)
-        data += pack_bytes(self["PlaybackType"], 1)
-
-        if self["PlaybackType"] in [2, 3]:
-            data += pack_bytes(self["PlaybackCount"], 2)
-        else:
-            data += pack_bytes(self["reserved2"], 2)
-
-        data += self["UOMaskTable"].to_bytes()
-        data += pack_bytes(flags, 2)
-
-        return data
 
+class AppInfoPlayList(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("reserved1", 1),
+        ("PlaybackType", 1),
+        ("reserved2", 2),
+        ("UOMaskTable", UOMaskTable),
+        ((("RandomAccessFlag", 1), ("AudioMixFlag", 1), ("LosslessBypassFlag", 1), ("MVCBaseViewRFlag", 1),
+          ("SDRConversionNotificationFlag", 1), ("reserved3", 11)), 2),
+    )
+    playback_count_layout = Layout(*layout.fields[:3], ("PlaybackCount", 2), *layout.fields[4:])
 
-class UOMaskTable(InfoDict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
-        assert len(data) == 8
+    def from_bytes(cls, data, offset=0, **kwargs):
+        assert len(data) >= offset + 18
 
         self = cls()
-        uo_mask_table = unpack_bytes(data, 0, 8)
-        self["MenuCall"] = uo_mask_table >> 63 & 1
-        self["TitleSearch"] = uo_mask_table >> 62 & 1
-        self["ChapterSearch"] = uo_mask_table >> 61 & 1
-        self["TimeSearch"] = uo_mask_table >> 60 & 1
-        self["SkipToNextPoint"] = uo_mask_table >> 59 & 1
-        self["SkipToPrevPoint"] = uo_mask_table >> 58 & 1
-        self["reserved1"] = uo_mask_table >> 57 & 1
-        self["Stop"] = uo_mask_table >> 56 & 1
-        self["PauseOn"] = uo_mask_table >> 55 & 1
-        self["reserved2"] = uo_mask_table >> 54 & 1
-        self["StillOff"] = uo_mask_table >> 53 & 1
-        self["ForwardPlay"] = uo_mask_table >> 52 & 1
-        self["BackwardPlay"] = uo_mask_table >> 51 & 1
-        self["Resume"] = uo_mask_table >> 50 & 1
-        self["MoveUpSelectedButton"] = uo_mask_table >> 49 & 1
-        self["MoveDownSelectedButton"] = uo_mask_table >> 48 & 1
-        self["MoveLeftSelectedButton"] = uo_mask_table >> 47 & 1
-        self["MoveRightSelectedButton"] = uo_mask_table >> 46 & 1
-        self["SelectButton"] = uo_mask_table >> 45 & 1
-        self["ActivateButton"] = uo_mask_table >> 44 & 1
-        self["SelectAndActivateButton"] = uo_mask_table >> 43 & 1
-        self["PrimaryAudioStreamNumberChange"] = uo_mask_table >> 42 & 1
-        self["reserved3"] = uo_mask_table >> 41 & 1
-        self["AngleNumberChange"] = uo_mask_table >> 40 & 1
-        self["PopupOn"] = uo_mask_table >> 39 & 1
-        self["PopupOff"] = uo_mask_table >> 38 & 1
-        self["PrimaryPGEnableDisable"] = uo_mask_table >> 37 & 1
-        self["PrimaryPGStreamNumberChange"] = uo_mask_table >> 36 & 1
-        self["SecondaryVideoEnableDisable"] = uo_mask_table >> 35 & 1
-        self["SecondaryVideoStreamNumberChange"] = uo_mask_table >> 34 & 1
-        self["SecondaryAudioEnableDisable"] = uo_mask_table >> 33 & 1
-        self["SecondaryAudioStreamNumberChange"] = uo_mask_table >> 32 & 1
-        self["reserved4"] = uo_mask_table >> 31 & 1
-        self["SecondaryPGStreamNumberChange"] = uo_mask_table >> 30 & 1
-        self["reserved5"] = uo_mask_table % 2 ** 30
-
+        if unpack_bytes(data, offset + 5, 1) in [2, 3]:
+            cls.playback_count_layout.read(self, data, offset)
+        else:
+            cls.layout.read(self, data, offset)
         return self
 
-    def to_bytes(self):
-        self.check_constraints()
-
-        uo_mask_table = (
-                (self["MenuCall"] << 63)
-                + (self["TitleSearch"] << 62)
-                + (self["ChapterSearch"] << 61)
-                + (self["TimeSearch"] << 60)
-                + (self["SkipToNextPoint"] << 59)
-                + (self["SkipToPrevPoint"] << 58)
-                + (self["reserved1"] << 57)
-                + (self["Stop"] << 56)
-                + (self["PauseOn"] << 55)
-                + (self["reserved2"] << 54)
-                + (self["StillOff"] << 53)
-                + (self["ForwardPlay"] << 52)
-                + (self["BackwardPlay"] << 51)
-                + (self["Resume"] << 50)
-                + (self["MoveUpSelectedButton"] << 49)
-                + (self["MoveDownSelectedButton"] << 48)
-                + (self["MoveLeftSelectedButton"] << 47)
-                + (self["MoveRightSelectedButton"] << 46)
-                + (self["SelectButton"] << 45)
-                + (self["ActivateButton"] << 44)
-                + (self["SelectAndActivateButton"] << 43)
-                + (self["PrimaryAudioStreamNumberChange"] << 42)
-                + (self["reserved3"] << 41)
-                + (self["AngleNumberChange"] << 40)
-                + (self["PopupOn"] << 39)
-                + (self["PopupOff"] << 38)
-                + (self["PrimaryPGEnableDisable"] << 37)
-                + (self["PrimaryPGStreamNumberChange"] << 36)
-                + (self["SecondaryVideoEnableDisable"] << 35)
-                + (self["SecondaryVideoStreamNumberChange"] << 34)
-                + (self["SecondaryAudioEnableDisable"] << 33)
-                + (self["SecondaryAudioStreamNumberChange"] << 32)
-                + (self["reserved4"] << 31)
-                + (self["SecondaryPGStreamNumberChange"] << 30)
-                + self["reserved5"]
-        )
+    def calculate_display_size(self):
+        return 14
 
-        return pack_bytes(uo_mask_table, 8)
+    def write(self, writer):
+        self.check_constraints()
+        if self["PlaybackType"] in [2, 3]:
+            self.playback_count_layout.write(writer, self)
+        else:
+            self.layout.write(writer, self)
 
 
 class PlayList(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("reserved1", 2),
+        ("NumberOfPlayItems", 2),
+        ("NumberOfSubPaths", 2),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["reserved1"] = unpack_bytes(data, 4, 2)
-        self["NumberOfPlayItems"] = unpack_bytes(data, 6, 2)
-        self["NumberOfSubPaths"] = unpack_bytes(data, 8, 2)
+        read_index = cls.layout.read(self, data, offset)
         self["PlayItems"] = []
         self["SubPaths"] = []
 
-        read_index = 10
         for i in range(self["NumberOfPlayItems"]):
             item_length = unpack_bytes(data, read_index, 2)
-            self["PlayItems"].append(
-                PlayItem.from_bytes(data[read_index: read_index + item_length + 2])
-            )
+            self["PlayItems"].append(PlayItem.from_bytes(data, offset=read_index, strict=strict))
             read_index += item_length + 2
 
         for i in range(self["NumberOfSubPaths"]):
             item_length = unpack_bytes(data, read_index, 4)
-            self["SubPaths"].append(
-                SubPath.from_bytes(data[read_index: read_index + item_length + 4])
-            )
+            self["SubPaths"].append(SubPath.from_bytes(data, offset=read_index, strict=strict))
             read_index += item_length + 4
 
+        if strict:
+            self.check_constraints()
+            self.set_source(data, offset, self["Length"] + 4)
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         real_length = 10
         for i in self["PlayItems"]:
@@ -290,67 +259,64 @@ class PlayList(InfoDict):
         assert self["NumberOfPlayItems"] == len(self["PlayItems"])
         assert self["NumberOfSubPaths"] == len(self["SubPaths"])
 
-    def to_bytes(self):
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["reserved1"], 2)
-        data += pack_bytes(self["NumberOfPlayItems"], 2)
-        data += pack_bytes(self["NumberOfSubPaths"], 2)
+        self.layout.write(writer, self)
         for i in self["PlayItems"]:
-            data += i.to_bytes()
+            i.write(writer)
         for i in self["SubPaths"]:
-            data += i.to_bytes()
-        return data
+            i.write(writer)
 
 
 class PlayItem(InfoDict):
+    layout = Layout(
+        ("Length", 2),
+        ("ClipInformationFileName", 5, str),
+        ("ClipCodecIdentifier", 4, str),
+        ((("reserved1", 11), ("IsMultiAngle", 1), ("ConnectionCondition", 4)), 2),
+        ("RefToSTCID", 1),
+        ("INTime", 4),
+        ("OUTTime", 4),
+        ("UOMaskTable", UOMaskTable),
+        ((("PlayItemRandomAccessFlag", 1), ("reserved2", 7)), 1),
+        ("StillMode", 1),
+        ("reserved3", 2),
+    )
+    still_layout = Layout(*layout.fields[:-1], ("StillTime", 2))
+    multi_angle_layout = Layout(
+        ("NumberOfAngles", 1),
+        ((("reserved4", 6), ("IsDifferentAudios", 1), ("IsSeamlessAngleChange", 1)), 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 2)
-        self["ClipInformationFileName"] = data[2:7].decode("utf-8")
-        self["ClipCodecIdentifier"] = data[7:11].decode("utf-8")
-        flags = unpack_bytes(data, 11, 2)
-        self["reserved1"], flags = divmod(flags, 2 ** 5)
-        self["IsMultiAngle"], self["ConnectionCondition"] = divmod(flags, 2 ** 4)
-        self["RefToSTCID"] = unpack_bytes(data, 13, 1)
-        self["INTime"] = unpack_bytes(data, 14, 4)
-        self["OUTTime"] = unpack_bytes(data, 18, 4)
-        self["UOMaskTable"] = UOMaskTable.from_bytes(data[22:30])
-        flags = unpack_bytes(data, 30, 1)
-        self["PlayItemRandomAccessFlag"], self["reserved2"] = divmod(flags, 2 ** 7)
-        self["StillMode"] = unpack_bytes(data, 31, 1)
-        if self["StillMode"] == 1:
-            self["StillTime"] = unpack_bytes(data, 32, 2)
+        if unpack_bytes(data, offset + 31, 1) == 1:
+            read_index = cls.still_layout.read(self, data, offset)
         else:
-            self["reserved3"] = unpack_bytes(data, 32, 2)
-
-        read_index = 34
+            read_index = cls.layout.read(self, data, offset)
 
         if self["IsMultiAngle"]:
-            self["NumberOfAngles"] = unpack_bytes(data, 34, 1)
-            flags = unpack_bytes(data, 35, 1)
-            self["reserved4"] = flags // 2 ** 2
-            flags %= 2 ** 2
-            self["IsDifferentAudios"] = flags // 2
-            self["IsSeamlessAngleChange"] = flags % 2
+            read_index = cls.multi_angle_layout.read(self, data, read_index)
             self["Angles"] = []
-            read_index += 2
             for i in range(self["NumberOfAngles"] - 1):
-                self["Angles"].append(
-                    MultiClipEntry.from_bytes(data[read_index: read_index + 10])
-                )
+                self["Angles"].append(MultiClipEntry.from_bytes(data, offset=read_index))
                 read_index += 10
 
-        self["STNTable"] = STNTable.from_bytes(data[read_index:])
+        self["STNTable"] = STNTable.from_bytes(data, offset=read_index, strict=strict)
 
+        if strict:
+            self.check_constraints()
+            self.set_source(data, offset, self["Length"] + 2)
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         real_length = 34
         if self["IsMultiAngle"]:
@@ -368,45 +334,21 @@ class PlayItem(InfoDict):
         if self["IsMultiAngle"]:
             assert self["NumberOfAngles"] - 1 == len(self["Angles"])
 
-    def to_bytes(self):
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 2)
-        data += self["ClipInformationFileName"].encode("utf-8")
-        data += self["ClipCodecIdentifier"].encode("utf-8")
-        flags = (
-                (self["reserved1"] << 5)
-                + (self["IsMultiAngle"] << 4)
-                + self["ConnectionCondition"]
-        )
-        data += pack_bytes(flags, 2)
-        data += pack_bytes(self["RefToSTCID"], 1)
-        data += pack_bytes(self["INTime"], 4)
-        data += pack_bytes(self["OUTTime"], 4)
-        data += self["UOMaskTable"].to_bytes()
-        data += pack_bytes(
-            (self["PlayItemRandomAccessFlag"] << 7) + self["reserved2"], 1
-        )
-        data += pack_bytes(self["StillMode"], 1)
         if self["StillMode"] == 1:
-            data += pack_bytes(self["StillTime"], 2)
+            self.still_layout.write(writer, self)
         else:
-            data += pack_bytes(self["reserved3"], 2)
+            self.layout.write(writer, self)
 
         if self["IsMultiAngle"]:
-            data += pack_bytes(self["NumberOfAngles"], 1)
-            data += pack_bytes(
-                (self["reserved4"] << 2)
-                + (self["IsDifferentAudios"] << 1)
-                + self["IsSeamlessAngleChange"],
-                1
-            )
+            self.multi_angle_layout.write(writer, self)
             for i in self["Angles"]:
-                data += i.to_bytes()
+                i.write(writer)
 
-        data += self["STNTable"].to_bytes()
-
-        return data
+        self["STNTable"].write(writer)
 
 
 class STNTable(InfoDict):
@@ -420,25 +362,23 @@ class STNTable(InfoDict):
         "SecondaryPGStreamEntries",
         "DVStreamEntries",
     ]
+    # fields following a non-zero Length
+    layout = Layout(
+        ("reserved1", 2),
+        *[(f"NumberOf{name}", 1) for name in stream_names],
+        ("reserved2", 4),
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 2)
+        self["Length"] = unpack_bytes(data, offset, 2)
         if self["Length"] != 0:
-            self["reserved1"] = unpack_bytes(data, 2, 2)
-
-            read_index = 4
-            for name in self.stream_names:
-                self[f"NumberOf{name}"] = unpack_bytes(data, read_index, 1)
-                read_index += 1
-
-            self["reserved2"] = unpack_bytes(data, 12, 4)
-            read_index = 16
+            read_index = cls.layout.read(self, data, offset + 2)
 
             for name in self.stream_names:
                 self[name] = []
@@ -446,21 +386,21 @@ class STNTable(InfoDict):
                     info_pair = InfoDict()
 
                     stream_entry_length = unpack_bytes(data, read_index, 1)
-                    info_pair["StreamEntry"] = StreamEntry.from_bytes(
-                        data[read_index: read_index + stream_entry_length + 1]
-                    )
+                    info_pair["StreamEntry"] = StreamEntry.from_bytes(data, offset=read_index, strict=strict)
                     read_index += stream_entry_length + 1
 
                     stream_attr_length = unpack_bytes(data, read_index, 1)
-                    info_pair["StreamAttributes"] = StreamAttributes.from_bytes(
-                        data[read_index: read_index + stream_attr_length + 1]
-                    )
+                    info_pair["StreamAttributes"] = StreamAttributes.from_bytes(data, offset=read_index, strict=strict)
                     read_index += stream_attr_length + 1
 
                     self[name].append(info_pair)
 
+        if strict:
+            self.check_constraints()
+            self.set_source(data, offset, self["Length"] + 2)
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         if self["Length"] != 0:
             real_length = 16
@@ -485,44 +425,47 @@ class STNTable(InfoDict):
             for name in self.stream_names:
                 assert self[f"NumberOf{name}"] == len(self[name])
 
-    def to_bytes(self):
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 2)
+        writer.write_int(self["Length"], 2)
         if self["Length"] != 0:
-            data += pack_bytes(self["reserved1"], 2)
-            for name in self.stream_names:
-                data += pack_bytes(self[f"NumberOf{name}"], 1)
-            data += pack_bytes(self["reserved2"], 4)
+            self.layout.write(writer, self)
             for name in self.stream_names:
                 for i in self[name]:
-                    data += i["StreamEntry"].to_bytes()
-                    data += i["StreamAttributes"].to_bytes()
-        return data
+                    i["StreamEntry"].write(writer)
+                    i["StreamAttributes"].write(writer)
 
 
-class StreamEntry(InfoDict):
+class StreamEntry(Record):
+    # layouts of the fields following StreamType, by StreamType
+    layouts = {
+        1: Layout(("RefToStreamPID", 2), (None, 6)),
+        2: Layout(("RefToSubPathID", 1), ("RefToSubClipID", 1), ("RefToStreamPID", 2), (None, 4)),
+        3: Layout(("RefToSubPathID", 1), ("RefToStreamPID", 2), (None, 5)),
+    }
+    layouts[4] = layouts[3]
+
+    __slots__ = ("Length", "StreamType", "RefToSubPathID", "RefToSubClipID", "RefToStreamPID")
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 1)
+        self["Length"] = unpack_bytes(data, offset, 1)
         if self["Length"] != 0:
-            self["StreamType"] = unpack_bytes(data, 1, 1)
-            if self["StreamType"] == 1:
-                self["RefToStreamPID"] = unpack_bytes(data, 2, 2)
-            elif self["StreamType"] == 2:
-                self["RefToSubPathID"] = unpack_bytes(data, 2, 1)
-                self["RefToSubClipID"] = unpack_bytes(data, 3, 1)
-                self["RefToStreamPID"] = unpack_bytes(data, 4, 2)
-            elif self["StreamType"] in [3, 4]:
-                self["RefToSubPathID"] = unpack_bytes(data, 2, 1)
-                self["RefToStreamPID"] = unpack_bytes(data, 3, 2)
-            else:
-                assert False
+            self["StreamType"] = unpack_bytes(data, offset + 1, 1)
+            assert self["StreamType"] in cls.layouts
+            cls.layouts[self["StreamType"]].read(self, data, offset + 2)
+            if strict:
+                # padding is written as zeros
+                assert cls.layouts[self["StreamType"]].is_canonical(data, offset + 2)
 
+        if strict:
+            self.check_constraints()
         return self
 
     def calculate_display_size(self):
@@ -544,69 +487,61 @@ class StreamEntry(InfoDict):
     #         else:
     #             assert False
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 1)
+        writer.write_int(self["Length"], 1)
         if self["Length"] != 0:
-            data += pack_bytes(self["StreamType"], 1)
-            if self["StreamType"] == 1:
-                data += pack_bytes(self["RefToStreamPID"], 2)
-                data += b"\x00\x00\x00\x00\x00\x00"
-            elif self["StreamType"] == 2:
-                data += pack_bytes(self["RefToSubPathID"], 1)
-                data += pack_bytes(self["RefToSubClipID"], 1)
-                data += pack_bytes(self["RefToStreamPID"], 2)
-                data += b"\x00\x00\x00\x00"
-            elif self["StreamType"] in [3, 4]:
-                data += pack_bytes(self["RefToSubPathID"], 1)
-                data += pack_bytes(self["RefToStreamPID"], 2)
-                data += b"\x00\x00\x00\x00\x00"
-            return data
-
-
-class StreamAttributes(InfoDict):
+            writer.write_int(self["StreamType"], 1)
+            if self["StreamType"] in self.layouts:
+                self.layouts[self["StreamType"]].write(writer, self)
+
+
+class StreamAttributes(Record):
     video_format_lookup = {1: '480i', 2: '576i', 3: '480p', 4: '1080i', 5: '720p', 6: '1080p', 7: '576p', 8: '2160p'}
     frame_rate_lookup = {1: 24000 / 1001, 2: 24, 3: 25, 4: 30000 / 1001, 6: 50, 7: 60000 / 1001}
 
+    video_layout = Layout(((("VideoFormat", 4), ("FrameRate", 4)), 1), (None, 3))
+    hdr_video_layout = Layout(
+        ((("VideoFormat", 4), ("FrameRate", 4)), 1),
+        ((("DynamicRangeType", 4), ("ColorSpace", 4)), 1),
+        ((("CRFlag", 1), ("HDRPlusFlag", 1), (None, 6)), 1),
+        (None, 1),
+    )
+    audio_layout = Layout(((("AudioFormat", 4), ("SampleRate", 4)), 1), ("LanguageCode", 3, str))
+    graphics_layout = Layout(("LanguageCode", 3, str), (None, 1))
+    text_layout = Layout(("CharacterCode", 1), ("LanguageCode", 3, str))
+    # layouts of the fields following StreamCodingType, by StreamCodingType
+    layouts = {
+        **dict.fromkeys([0x01, 0x02, 0x1B, 0xEA], video_layout),
+        0x24: hdr_video_layout,
+        **dict.fromkeys([0x03, 0x04, 0x80, 0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0xA1, 0xA2], audio_layout),
+        **dict.fromkeys([0x90, 0x91], graphics_layout),
+        0x92: text_layout,
+    }
+
+    __slots__ = (
+        "Length", "StreamCodingType", "VideoFormat", "FrameRate", "DynamicRangeType", "ColorSpace", "CRFlag",
+        "HDRPlusFlag", "AudioFormat", "SampleRate", "CharacterCode", "LanguageCode",
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 1)
+        self["Length"] = unpack_bytes(data, offset, 1)
         if self["Length"] != 0:
-            self["StreamCodingType"] = unpack_bytes(data, 1, 1)
-            if self["StreamCodingType"] in [0x01, 0x02, 0x1B, 0xEA]:
-                tmp = unpack_bytes(data, 2, 1)
-                self["VideoFormat"], self["FrameRate"] = divmod(tmp, 2 ** 4)
-
-            elif self["StreamCodingType"] == 0x24:
-                tmp = unpack_bytes(data, 2, 1)
-                self["VideoFormat"], self["FrameRate"] = divmod(tmp, 2 ** 4)
-                tmp = unpack_bytes(data, 3, 1)
-                self["DynamicRangeType"], self["ColorSpace"] = divmod(tmp, 2 ** 4)
-                tmp = unpack_bytes(data, 4, 1)
-                self["CRFlag"] = tmp >> 7 & 1
-                self["HDRPlusFlag"] = tmp >> 6 & 1
-
-            elif self["StreamCodingType"] in [0x03, 0x04, 0x80, 0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0xA1, 0xA2]:
-                tmp = unpack_bytes(data, 2, 1)
-                self["AudioFormat"], self["SampleRate"] = divmod(tmp, 2 ** 4)
-                self["LanguageCode"] = data[3:6].decode("utf-8")
-
-            elif self["StreamCodingType"] in [0x90, 0x91]:
-                self["LanguageCode"] = data[2:5].decode("utf-8")
-
-            elif self["StreamCodingType"] in [0x92]:
-                self["CharacterCode"] = unpack_bytes(data, 2, 1)
-                self["LanguageCode"] = data[3:6].decode("utf-8")
-
-            else:
-                assert False
+            self["StreamCodingType"] = unpack_bytes(data, offset + 1, 1)
+            assert self["StreamCodingType"] in cls.layouts
+            cls.layouts[self["StreamCodingType"]].read(self, data, offset + 2)
+            if strict:
+                # padding is written as zeros
+                assert cls.layouts[self["StreamCodingType"]].is_canonical(data, offset + 2)
 
+        if strict:
+            self.check_constraints()
         return self
 
     def calculate_display_size(self):
@@ -649,72 +584,45 @@ class StreamAttributes(InfoDict):
     #             else:
     #                 assert False
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 1)
+        writer.write_int(self["Length"], 1)
         if self["Length"] != 0:
-            data += pack_bytes(self["StreamCodingType"], 1)
-            if self["StreamCodingType"] in [0x01, 0x02, 0x1B, 0xEA]:
-                data += pack_bytes(
-                    (self["VideoFormat"] << 4) + self["FrameRate"], 1
-                )
-                data += b"\x00\x00\x00"
-
-            elif self["StreamCodingType"] == 0x24:
-                data += pack_bytes(
-                    (self["VideoFormat"] << 4) + self["FrameRate"], 1
-                )
-                data += pack_bytes(
-                    (self["DynamicRangeType"] << 4) + self["ColorSpace"], 1
-                )
-                data += pack_bytes(
-                    (self["CRFlag"] << 7) + (self["HDRPlusFlag"] << 6), 1
-                )
-                data += b"\x00"
-
-            elif self["StreamCodingType"] in [0x03, 0x04, 0x80, 0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0xA1, 0xA2]:
-                data += pack_bytes(
-                    (self["AudioFormat"] << 4) + self["SampleRate"], 1
-                )
-                data += self["LanguageCode"].encode("utf-8")
-
-            elif self["StreamCodingType"] in [0x90, 0x91]:
-                data += self["LanguageCode"].encode("utf-8")
-                data += b"\x00"
-
-            elif self["StreamCodingType"] in [0x92]:
-                data += pack_bytes(self["CharacterCode"], 1)
-                data += self["LanguageCode"].encode("utf-8")
-
-        return data
+            writer.write_int(self["StreamCodingType"], 1)
+            if self["StreamCodingType"] in self.layouts:
+                self.layouts[self["StreamCodingType"]].write(writer, self)
 
 
 class SubPath(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("reserved1", 1),
+        ("SubPathType", 1),
+        ((("reserved2", 15), ("IsRepeatSubPath", 1)), 2),
+        ("reserved3", 1),
+        ("NumberOfSubPlayItems", 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
 
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["reserved1"] = unpack_bytes(data, 4, 1)
-        self["SubPathType"] = unpack_bytes(data, 5, 1)
-        flags = unpack_bytes(data, 6, 2)
-        self["reserved2"] = flags // 2
-        self["IsRepeatSubPath"] = flags % 2
-        self["reserved3"] = unpack_bytes(data, 8, 1)
-        self["NumberOfSubPlayItems"] = unpack_bytes(data, 9, 1)
+        read_index = cls.layout.read(self, data, offset)
         self["SubPlayItems"] = []
-        read_index = 10
         for i in range(self["NumberOfSubPlayItems"]):
             item_length = unpack_bytes(data, read_index, 2)
-            self["SubPlayItems"].append(SubPlayItem.from_bytes(data[read_index: read_index + item_length + 2]))
+            self["SubPlayItems"].append(SubPlayItem.from_bytes(data, offset=read_index, strict=strict))
             read_index += item_length + 2
 
+        if strict:
+            self.check_constraints()
+            self.set_source(data, offset, self["Length"] + 4)
         return self
 
+    @cached_display_size
     def calculate_display_size(self):
         real_length = 10
         for i in self["SubPlayItems"]:
@@ -728,46 +636,49 @@ class SubPath(InfoDict):
         super().check_constraints()
         assert self["NumberOfSubPlayItems"] == len(self["SubPlayItems"])
 
-    def to_bytes(self):
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["reserved1"], 1)
-        data += pack_bytes(self["SubPathType"], 1)
-        data += pack_bytes(self["reserved2"] * 2 + self["IsRepeatSubPath"], 2)
-        data += pack_bytes(self["reserved3"], 1)
-        data += pack_bytes(self["NumberOfSubPlayItems"], 1)
+        self.layout.write(writer, self)
         for i in self["SubPlayItems"]:
-            data += i.to_bytes()
-        return data
+            i.write(writer)
 
 
 class SubPlayItem(InfoDict):
+    layout = Layout(
+        ("Length", 2),
+        ("ClipInformationFileName", 5, str),
+        ("ClipCodecIdentifier", 4, str),
+        ((("reserved1", 27), ("ConnectionCondition", 4), ("IsMultiClipEntries", 1)), 4),
+        ("RefToSTCID", 1),
+        ("INTime", 4),
+        ("OUTTime", 4),
+        ("SyncPlayItemID", 2),
+        ("SyncStartPTS", 4),
+    )
+    multi_clip_layout = Layout(
+        ("NumberOfMultiClipEntries", 1),
+        ("reserved2", 1),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 2)
-        self["ClipInformationFileName"] = data[2:7].decode("utf-8")
-        self["ClipCodecIdentifier"] = data[7:11].decode("utf-8")
-        flags = unpack_bytes(data, 11, 4)
-        self["reserved1"], flags = divmod(flags, 2 ** 5)
-        self["ConnectionCondition"], self["IsMultiClipEntries"] = divmod(flags, 2)
-        self["RefToSTCID"] = unpack_bytes(data, 15, 1)
-        self["INTime"] = unpack_bytes(data, 16, 4)
-        self["OUTTime"] = unpack_bytes(data, 20, 4)
-        self["SyncPlayItemID"] = unpack_bytes(data, 24, 2)
-        self["SyncStartPTS"] = unpack_bytes(data, 26, 4)
+        read_index = cls.layout.read(self, data, offset)
 
         if self["IsMultiClipEntries"]:
-            self["NumberOfMultiClipEntries"] = unpack_bytes(data, 30, 1)
-            self["reserved2"] = unpack_bytes(data, 31, 1)
+            read_index = cls.multi_clip_layout.read(self, data, read_index)
             self["MultiClipEntries"] = []
             for i in range(self["NumberOfMultiClipEntries"]):
-                self["MultiClipEntries"].append(MultiClipEntry.from_bytes(data[32 + 10 * i: 32 + 10 * (i + 1)]))
+                self["MultiClipEntries"].append(MultiClipEntry.from_bytes(data, offset=read_index + 10 * i))
 
+        if strict:
+            self.check_constraints()
+            self.set_source(data, offset, self["Length"] + 2)
         return self
 
     def calculate_display_size(self):
@@ -785,69 +696,62 @@ class SubPlayItem(InfoDict):
         if self["IsMultiClipEntries"]:
             assert self["NumberOfMultiClipEntries"] == len(self["MultiClipEntries"])
 
-    def to_bytes(self):
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
 
-        data = b""
-        data += pack_bytes(self["Length"], 2)
-        data += self["ClipInformationFileName"].encode("utf-8")
-        data += self["ClipCodecIdentifier"].encode("utf-8")
-        flags = (
-                (self["reserved1"] << 5)
-                + (self["ConnectionCondition"] << 1)
-                + self["IsMultiClipEntries"]
-        )
-        data += pack_bytes(flags, 4)
-        data += pack_bytes(self["RefToSTCID"], 1)
-        data += pack_bytes(self["INTime"], 4)
-        data += pack_bytes(self["OUTTime"], 4)
-        data += pack_bytes(self["SyncPlayItemID"], 2)
-        data += pack_bytes(self["SyncStartPTS"], 4)
+        self.layout.write(writer, self)
 
         if self["IsMultiClipEntries"]:
-            data += pack_bytes(self["NumberOfMultiClipEntries"], 1)
-            data += pack_bytes(self["reserved2"], 1)
+            self.multi_clip_layout.write(writer, self)
             for i in self["MultiClipEntries"]:
-                data += i.to_bytes()
-        return data
+                i.write(writer)
+
 
+class MultiClipEntry(Record):
+    layout = Layout(
+        ("ClipInformationFileName", 5, str),
+        ("ClipCodecIdentifier", 4, str),
+        ("RefToSTCID", 1),
+    )
+
+    __slots__ = layout.keys
 
-class MultiClipEntry(InfoDict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
-        assert len(data) == 10
+    def from_bytes(cls, data, offset=0, **kwargs):
+        assert len(data) >= offset + 10
         self = cls()
-        self["ClipInformationFileName"] = data[0:5].decode("utf-8")
-        self["ClipCodecIdentifier"] = data[5:9].decode("utf-8")
-        self["RefToSTCID"] = unpack_bytes(data, 9, 1)
+        cls.layout.read(self, data, offset)
         return self
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-
-        data = b""
-        data += self["ClipInformationFileName"].encode("utf-8")
-        data += self["ClipCodecIdentifier"].encode("utf-8")
-        data += pack_bytes(self["RefToSTCID"], 1)
-
-        return data
+        self.layout.write(writer, self)
 
 
 class PlayListMark(InfoDict):
+    layout = Layout(
+        ("Length", 4),
+        ("NumberOfPlayListMarks", 2),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
+    def from_bytes(cls, data, offset=0, strict=False, **kwargs):
         self = cls()
-        self["Length"] = unpack_bytes(data, 0, 4)
-        self["NumberOfPlayListMarks"] = unpack_bytes(data, 4, 2)
+        read_index = cls.layout.read(self, data, offset)
         self["PlayListMarks"] = []
         for i in range(self["NumberOfPlayListMarks"]):
-            self["PlayListMarks"].append(PlayListMarkItem.from_bytes(data[6 + 14 * i: 6 + 14 * (i + 1)]))
+            self["PlayListMarks"].append(PlayListMarkItem.from_bytes(data, offset=read_index + 14 * i))
+        if strict:
+            self.check_constraints()
+            self.set_source(data, offset, self["Length"] + 4)
         return self
 
     def calculate_display_size(self):
@@ -860,63 +764,107 @@ class PlayListMark(InfoDict):
         super().check_constraints()
         assert self["NumberOfPlayListMarks"] == len(self["PlayListMarks"])
 
-    def to_bytes(self):
+    def write(self, writer):
+        if self.write_source(writer):
+            return
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["Length"], 4)
-        data += pack_bytes(self["NumberOfPlayListMarks"], 2)
+        self.layout.write(writer, self)
         for i in self["PlayListMarks"]:
-            data += i.to_bytes()
-        return data
+            i.write(writer)
 
 
-class PlayListMarkItem(InfoDict):
+class PlayListMarkItem(Record):
+    layout = Layout(
+        ("reserved1", 1),
+        ("MarkType", 1),
+        ("RefToPlayItemID", 2),
+        ("MarkTimeStamp", 4),
+        ("EntryESPID", 2),
+        ("Duration", 4),
+    )
+
+    __slots__ = layout.keys
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def from_bytes(cls, data, **kwargs):
-        assert len(data) == 14
+    def from_bytes(cls, data, offset=0, **kwargs):
+        assert len(data) >= offset + 14
         self = cls()
-        self["reserved1"] = unpack_bytes(data, 0, 1)
-        self["MarkType"] = unpack_bytes(data, 1, 1)
-        self["RefToPlayItemID"] = unpack_bytes(data, 2, 2)
-        self["MarkTimeStamp"] = unpack_bytes(data, 4, 4)
-        self["EntryESPID"] = unpack_bytes(data, 8, 2)
-        self["Duration"] = unpack_bytes(data, 10, 4)
-
+        cls.layout.read(self, data, offset)
         return self
 
-    def to_bytes(self):
+    def write(self, writer):
         self.check_constraints()
-        data = b""
-        data += pack_bytes(self["reserved1"], 1)
-        data += pack_bytes(self["MarkType"], 1)
-        data += pack_bytes(self["RefToPlayItemID"], 2)
-        data += pack_bytes(self["MarkTimeStamp"], 4)
-        data += pack_bytes(self["EntryESPID"], 2)
-        data += pack_bytes(self["Duration"], 4)
-        return data
+        self.layout.write(writer, self)
+
+
+# summary of a playlist returned by MoviePlaylistFile.probe(), times are in 45 kHz ticks
+PlaylistSummary = namedtuple("PlaylistSummary",
+                             ["type_indicator", "version_number", "play_items", "clip_names", "duration"])
+PlayItemSummary = namedtuple("PlayItemSummary", ["clip_name", "in_time", "out_time"])
 
 
 class MoviePlaylistFile:
-    def __init__(self, filename=None, strict=True):
+    def __init__(self, filename=None, strict=True, lazy=False, cache=None, use_mmap=False):
         self.strict = strict
+        self.lazy = lazy
+        self.cache = cache
+        self.use_mmap = use_mmap
         if not filename:
             self.data = MPLSHeader()
         else:
-            self.load(filename, self.strict)
-
-    def load(self, filename, strict):
+            self.load(filename, self.strict, self.lazy, self.cache, self.use_mmap)
+
+    def load(self, filename, strict, lazy=False, cache=None, use_mmap=False):
+        # lazy sections are views of the file contents, they are not worth caching
+        if cache is not None and not lazy:
+            self.data = cache.load(filename, MPLSHeader, strict=strict)
+            return
+        self.data = MPLSHeader.from_bytes(read_file(filename, use_mmap), strict=strict, lazy=lazy)
+
+    @staticmethod
+    def probe(filename):
+        """ Returns a PlaylistSummary, reading only the header and the play list section and decoding only the fixed
+        start of each play item, which is much faster than loading the playlist
+        """
         with open(filename, "rb") as f:
-            data = f.read()
-        self.data = MPLSHeader.from_bytes(data, strict=strict)
+            header = f.read(40)
+            f.seek(unpack_bytes(header, 8, 4))
+            playlist = f.read(4)
+            playlist += f.read(unpack_bytes(playlist, 0, 4))
+        play_items = []
+        read_index = 10
+        for _ in range(unpack_bytes(playlist, 6, 2)):
+            play_items.append(PlayItemSummary(
+                playlist[read_index + 2:read_index + 7].decode("utf-8"),
+                unpack_bytes(playlist, read_index + 14, 4),
+                unpack_bytes(playlist, read_index + 18, 4),
+            ))
+            read_index += unpack_bytes(playlist, read_index, 2) + 2
+        return PlaylistSummary(
+            header[0:4].decode("utf-8"),
+            header[4:8].decode("utf-8"),
+            play_items,
+            list(dict.fromkeys(play_item.clip_name for play_item in play_items)),
+            sum(play_item.out_time - play_item.in_time for play_item in play_items),
+        )
 
-    def save(self, destination, overwrite=False):
+    @classmethod
+    async def aload(cls, filename, strict=True, lazy=False, cache=None, use_mmap=False, executor=None):
+        """ Reads and parses the file in executor, the default one of shinya.common.aio if None
+        """
+        return await run_in_executor(executor, cls, filename, strict, lazy, cache, use_mmap)
+
+    def save(self, destination, overwrite=False, fsync=False, batch=None):
+        """ Writes the file atomically, as part of batch, a WriteBatch, if given
+        """
         self.data.update_constants()
         self.data.update_addresses()
-        if os.path.exists(destination) and not overwrite:
-            raise FileExistsError()
-        os.makedirs(os.path.dirname(destination), exist_ok=True)
-        with open(destination, "wb") as f:
-            f.write(self.data.to_bytes())
+        write_file(destination, self.data.to_bytes(), overwrite, fsync, batch)
+
+    async def asave(self, destination, overwrite=False, fsync=False, batch=None, executor=None):
+        """ Serializes and writes the file in executor, the default one of shinya.common.aio if None
+        """
+        await run_in_executor(executor, self.save, destination, overwrite, fsync, batch)
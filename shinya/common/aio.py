@@ -0,0 +1,32 @@
+import os
+
+# asyncio and concurrent.futures are imported where they are used, they take longer to import than the whole package
+_executor = None
+
+
+def get_executor():
+    """ Returns the executor running the blocking parts of the async API, a thread pool of at most 4 workers by default
+    """
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        _executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="shinya")
+    return _executor
+
+
+def set_executor(executor):
+    """ Replaces the default executor, e.g. with a ProcessPoolExecutor so that parsing runs outside the event loop
+    process, in which case the parsed files are pickled back and cannot be lazy
+    """
+    global _executor
+    _executor = executor
+
+
+async def run_in_executor(executor, function, *args):
+    """ Runs function(*args) in executor, or in the default executor if None, without blocking the event loop
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or get_executor(), function, *args)
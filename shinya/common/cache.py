@@ -0,0 +1,132 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# bump when parsed trees change shape, so entries pickled by older versions are not loaded
+CACHE_VERSION = 5
+
+
+class ParseCache:
+    """ On-disk cache of parsed file headers, stored as pickles and evicted least recently used first
+
+    Entries are keyed by the header class, the parsing options and either a hash of the file contents ("hash") or the
+    path, size and modification time of the file ("stat"), which does not need to read unchanged files. The total size
+    of the directory is kept under max_size bytes.
+    """
+    SUFFIX = ".pickle"
+
+    def __init__(self, directory, max_size=256 * 2 ** 20, key="hash"):
+        assert key in ("hash", "stat")
+        self.directory = directory
+        self.max_size = max_size
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, filename, header_class, **kwargs):
+        """ Returns header_class.from_bytes(contents of filename, **kwargs), from the cache when possible
+        """
+        data = None
+        key_hash = hashlib.blake2b(digest_size=16)
+        key_hash.update(f"{CACHE_VERSION}:{header_class.__module__}.{header_class.__qualname__}".encode("utf-8"))
+        key_hash.update(repr(sorted(kwargs.items())).encode("utf-8"))
+        if self.key == "hash":
+            with open(filename, "rb") as f:
+                data = f.read()
+            key_hash.update(data)
+        else:
+            stat = os.stat(filename)
+            key_hash.update(f"{os.path.abspath(filename)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        key = key_hash.hexdigest()
+
+        header = self.get(key)
+        if header is None:
+            if data is None:
+                with open(filename, "rb") as f:
+                    data = f.read()
+            header = header_class.from_bytes(data, **kwargs)
+            self.put(key, header)
+        return header
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # missing, evicted by another process in the meantime, or partially written by an older version
+            self.misses += 1
+            return None
+        # the modification time orders entries for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Stores value under key, unless its pickle alone is larger than max_size
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size:
+            return False
+        # written under a temporary name first, concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        path = self.path(key)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+        return True
+
+    def entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, keep=None):
+        """ Removes the least recently used entries until the directory fits in max_size, except the entry at keep
+        """
+        entries = sorted(self.entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+        }
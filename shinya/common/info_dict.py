@@ -1,10 +1,97 @@
+import copyreg
+import threading
 from abc import abstractmethod
 from collections import OrderedDict
+from collections.abc import MutableMapping
+from functools import wraps
 
+from shinya.common.io import BytesWriter
 
-class InfoDict(OrderedDict):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+
+class _TrackingState(threading.local):
+    # number of nested decodings running in the thread, tracking is suspended while it is not 0
+    depth = 0
+
+
+_tracking = _TrackingState()
+
+
+def decode_untracked(from_bytes, *args, **kwargs):
+    """ Returns from_bytes(*args, **kwargs), decoding the whole tree without tracking modifications
+
+    Parsers store fields and lists as they go, which costs nothing more than a dict assignment while decoding. The
+    parent links of the tree are set once decoding is over, by link().
+    """
+    if _tracking.depth:
+        return from_bytes(*args, **kwargs)
+    _tracking.depth += 1
+    try:
+        node = from_bytes(*args, **kwargs)
+    finally:
+        _tracking.depth -= 1
+    node.link()
+    return node
+
+
+def untracked_decoding(from_bytes):
+    """ Decorates the from_bytes classmethod of a root node with decode_untracked()
+    """
+
+    @wraps(from_bytes)
+    def decode(cls, *args, **kwargs):
+        return decode_untracked(from_bytes, cls, *args, **kwargs)
+
+    return decode
+
+
+class InfoNode:
+    """ Parsing, checking and serialization interface shared by InfoDict and Record
+
+    Nodes track modifications: parsers may record the span of the original data a node was decoded from with
+    set_source(), which write_source() writes back as is, until the node or one of its descendants is modified by item
+    assignment or deletion, or by a change to one of its lists. Modifications are propagated to the ancestors through
+    the parent of each node, set when the node is stored in another node or in a list of it. The same propagation
+    invalidates display sizes cached with cached_display_size, and the values derived from the subtree kept in the
+    _derived dict of a node, such as lookup indexes.
+
+    Copies and pickles of a node hold its subtree only, without the parent, the original bytes and the cached values.
+    """
+    __slots__ = ()
+    # (data, start, end) of the original bytes, None once modified
+    _source = None
+    _parent = None
+    _display_size = None
+    _derived = None
+
+    def set_source(self, data, offset, length):
+        self._source = (data, offset, offset + length)
+
+    def write_source(self, writer):
+        """ Writes the original bytes of an unmodified node, returns whether it did
+        """
+        if self._source is None:
+            return False
+        data, start, end = self._source
+        writer.write(memoryview(data)[start:end])
+        return True
+
+    def link_children(self):
+        return ()
+
+    def link(self):
+        """ Sets the parent links of the subtree, which untracked_decoding() decodes without them
+        """
+        nodes = [self]
+        while nodes:
+            nodes.extend(nodes.pop().link_children())
+
+    def mark_modified(self):
+        node = self
+        while node is not None:
+            node._source = None
+            node._display_size = None
+            node._derived = None
+            node = node._parent
 
     @classmethod
     @abstractmethod
@@ -28,17 +115,378 @@ class InfoDict(OrderedDict):
         pass
 
     def update_constants(self):
-        for key in self.keys():
-            if isinstance(self[key], InfoDict):
-                self[key].update_constants()
-            elif isinstance(self[key], list):
-                for item in self[key]:
-                    if isinstance(item, InfoDict):
+        # counts and lengths of an unmodified node are those that were parsed
+        if self._source is not None:
+            return
+        for value in self.values():
+            if isinstance(value, InfoNode):
+                value.update_constants()
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, InfoNode):
                         item.update_constants()
         self.update_counts()
         if "Length" in self:
-            self["Length"] = self.calculate_display_size()
+            display_size = self.calculate_display_size()
+            # an unchanged length is not a modification, which would also drop the cached size
+            if self["Length"] != display_size:
+                self["Length"] = display_size
 
     @abstractmethod
-    def to_bytes(self, **kwargs):
+    def write(self, writer):
         raise NotImplementedError()
+
+    def to_bytes(self, size=0, **kwargs):
+        writer = BytesWriter(size)
+        self.write(writer)
+        return writer.getvalue()
+
+
+_dict_getitem = OrderedDict.__getitem__
+_dict_setitem = OrderedDict.__setitem__
+_tracking_attributes = ("_source", "_parent", "_display_size", "_derived")
+
+
+class InfoDict(InfoNode, OrderedDict):
+    """ InfoNode stored as an ordered dict
+
+    A plain list is stored as is and becomes a NodeList, tracking its modifications, when it is read back from the
+    node. Keep using the list read back from then on, changes to the plain list are not seen by the node anymore.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        value = _dict_getitem(self, key)
+        if type(value) is list and not _tracking.depth:
+            value = NodeList(value)
+            value.adopt(self)
+            _dict_setitem(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        if _tracking.depth:
+            _dict_setitem(self, key, value)
+            return
+        if isinstance(value, (InfoNode, TrackedValue)):
+            value.adopt(self)
+        _dict_setitem(self, key, value)
+        self.mark_modified()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.mark_modified()
+
+    def pop(self, *args):
+        self.mark_modified()
+        return super().pop(*args)
+
+    def popitem(self, *args):
+        self.mark_modified()
+        return super().popitem(*args)
+
+    def clear(self):
+        self.mark_modified()
+        super().clear()
+
+    def adopt(self, parent):
+        self._parent = parent
+
+    # stores a freshly decoded field, without tracking it as a modification
+    set_decoded = OrderedDict.__setitem__
+
+    def link_children(self):
+        """ Sets the parent of the values of the node, converting plain lists, returns the child nodes to link
+
+        Nodes that already have a parent are linked, e.g. the records decoded by a layout, and are not returned.
+        A shallow copy shares the children of the original, which keep their parent.
+        """
+        children = []
+        for key, value in dict.items(self):
+            value_type = type(value)
+            if value_type is int or value_type is str:
+                continue
+            if value_type is list:
+                value = NodeList(value)
+                _dict_setitem(self, key, value)
+            if isinstance(value, InfoNode):
+                if value._parent is None:
+                    value._parent = self
+                    children.append(value)
+            elif isinstance(value, TrackedValue) and value._parent is None:
+                value._parent = self
+                if isinstance(value, NodeList):
+                    for item in value:
+                        if isinstance(item, InfoNode) and item._parent is None:
+                            item._parent = self
+                            children.append(item)
+        return children
+
+    def __reduce__(self):
+        # copies and pickles hold the fields and attributes, not the tracking state
+        fields = {key: list(value) if type(value) is NodeList else value for key, value in dict.items(self)}
+        attributes = {key: value for key, value in self.__dict__.items() if key not in _tracking_attributes}
+        return copyreg.__newobj__, (type(self),), (fields, attributes)
+
+    def __setstate__(self, state):
+        # the children are restored first, each linked its own children already
+        fields, attributes = state
+        for key, value in fields.items():
+            value_type = type(value)
+            if value_type is not int and value_type is not str:
+                if value_type is list:
+                    value = NodeList(value)
+                    for item in value:
+                        if isinstance(item, InfoNode):
+                            item._parent = self
+                if isinstance(value, (InfoNode, TrackedValue)):
+                    value._parent = self
+            _dict_setitem(self, key, value)
+        self.__dict__.update(attributes)
+
+
+def cached_display_size(method):
+    """ Decorates calculate_display_size to compute it once until the node or one of its descendants is modified
+    """
+
+    @wraps(method)
+    def calculate_display_size(self):
+        display_size = self._display_size
+        if display_size is None:
+            display_size = self._display_size = method(self)
+        return display_size
+
+    return calculate_display_size
+
+
+class TrackedValue:
+    """ Mutable value other than a node, reporting its modifications to the node holding it
+    """
+    _parent = None
+
+    def adopt(self, parent):
+        self._parent = parent
+
+    def modified(self):
+        if self._parent is not None:
+            self._parent.mark_modified()
+
+    def __getstate__(self):
+        # copies and pickles do not hold the node the value is stored in
+        state = self.__dict__.copy()
+        state.pop("_parent", None)
+        return state
+
+
+class NodeList(TrackedValue, list):
+    """ List of nodes, reporting its modifications to the node holding it
+
+    Plain lists stored in an InfoDict are converted to NodeList.
+    """
+
+    def adopt(self, parent):
+        self._parent = parent
+        for item in self:
+            if isinstance(item, InfoNode):
+                item.adopt(parent)
+
+    def modified(self, items=()):
+        if self._parent is not None:
+            for item in items:
+                if isinstance(item, InfoNode):
+                    item.adopt(self._parent)
+            self._parent.mark_modified()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self.modified(value if isinstance(index, slice) else (value,))
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self.modified()
+
+    def __iadd__(self, other):
+        other = list(other)
+        result = super().__iadd__(other)
+        self.modified(other)
+        return result
+
+    def __imul__(self, other):
+        result = super().__imul__(other)
+        self.modified()
+        return result
+
+    def append(self, value):
+        super().append(value)
+        self.modified((value,))
+
+    def extend(self, values):
+        values = list(values)
+        super().extend(values)
+        self.modified(values)
+
+    def insert(self, index, value):
+        super().insert(index, value)
+        self.modified((value,))
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self.modified()
+        return value
+
+    def remove(self, value):
+        super().remove(value)
+        self.modified()
+
+    def clear(self):
+        super().clear()
+        self.modified()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self.modified()
+
+    def reverse(self):
+        super().reverse()
+        self.modified()
+
+
+class Record(InfoNode, MutableMapping):
+    """ Compact InfoNode for small fixed-layout records, storing the fields in __slots__ instead of a hash table
+
+    Subclasses list every key they may hold in __slots__, in file order, which is also the iteration order. Keys that
+    are not set are absent, as in an InfoDict.
+    """
+    __slots__ = ("_parent",)
+
+    def __init__(self, *args, **kwargs):
+        self._parent = None
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+        # mark_modified() inlined, records are assigned many times while decoding
+        if self._parent is not None:
+            self._parent.mark_modified()
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        delattr(self, key)
+        self.mark_modified()
+
+    def adopt(self, parent):
+        self._parent = parent
+
+    # stores a freshly decoded field, without tracking it as a modification
+    set_decoded = object.__setattr__
+
+    def mark_modified(self):
+        # records are always encoded, only their ancestors need to know
+        if self._parent is not None:
+            self._parent.mark_modified()
+
+    def link_children(self):
+        # nested records are linked as they are decoded by their layout
+        return ()
+
+    def __reduce__(self):
+        # the parent is set again by the node holding the record
+        fields = {}
+        for key in self.__slots__:
+            try:
+                fields[key] = getattr(self, key)
+            except AttributeError:
+                pass
+        return copyreg.__newobj__, (type(self),), fields
+
+    def __setstate__(self, fields):
+        self._parent = None
+        for key, value in fields.items():
+            setattr(self, key, value)
+            if isinstance(value, InfoNode):
+                value._parent = self
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def __iter__(self):
+        return (key for key in self.__slots__ if hasattr(self, key))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self.items())})"
+
+
+class LazySection:
+    """ A section kept as its original bytes, decoded with section_class only when it is accessed
+
+    Sections start with a 4-byte length field, the display size is therefore the size of the data minus 4. Until it
+    is decoded, the section is written back verbatim. data may be a memoryview into the buffer of the whole file.
+    """
+
+    def __init__(self, section_class, data, strict=True):
+        self.section_class = section_class
+        self.data = data
+        self.strict = strict
+
+    def decode(self):
+        # in strict mode the section checks its constraints and rejects bytes it would not write back while parsing
+        return decode_untracked(self.section_class.from_bytes, self.data, strict=self.strict)
+
+    def check_constraints(self):
+        pass
+
+    def calculate_display_size(self):
+        return len(self.data) - 4
+
+    def update_constants(self):
+        pass
+
+    def write(self, writer):
+        writer.write(self.data)
+
+    def to_bytes(self, **kwargs):
+        return bytes(self.data)
+
+    def __repr__(self):
+        return f"LazySection({self.section_class.__name__}, {len(self.data)} bytes)"
+
+
+class LazyInfoDict(InfoDict):
+    """ InfoDict whose values may be LazySection objects, which are decoded and replaced on first item access
+
+    Use section() to get a value without decoding it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, LazySection):
+            value = value.decode()
+            # decoding is not a modification
+            value.adopt(self)
+            OrderedDict.__setitem__(self, key, value)
+        return value
+
+    def section(self, key):
+        return super().__getitem__(key)
@@ -1,12 +1,302 @@
+import mmap
+import os
 import struct
+import sys
+from array import array
 
 FORMAT_CHAR = {1: ">B", 2: ">H", 4: ">I", 8: ">Q"}
+FORMAT_STRUCT = {length: struct.Struct(format_char) for length, format_char in FORMAT_CHAR.items()}
+
+# array typecode holding exactly 4 bytes, "I" on all common platforms
+WORD_TYPECODE = "I" if array("I").itemsize == 4 else "L"
 
 
 def unpack_bytes(data, offset, length):
-    result, = struct.unpack(FORMAT_CHAR[length], data[offset:offset + length])
+    result, = FORMAT_STRUCT[length].unpack_from(data, offset)
     return result
 
 
 def pack_bytes(data, length):
     return struct.pack(FORMAT_CHAR[length], data)
+
+
+def unpack_words(data, offset, count):
+    words = array(WORD_TYPECODE)
+    words.frombytes(data[offset:offset + 4 * count])
+    if sys.byteorder == "little":
+        words.byteswap()
+    return words
+
+
+def pack_words(words):
+    words = array(WORD_TYPECODE, words)
+    if sys.byteorder == "little":
+        words.byteswap()
+    return words.tobytes()
+
+
+class MappedFile(mmap.mmap):
+    """ Read-only memory map of a file, pickled and copied as the bytes of the file
+    """
+
+    def __reduce__(self):
+        return bytes, (self[:],)
+
+
+def read_file(filename, use_mmap=False):
+    """ Returns the contents of a file, as bytes or as a MappedFile if use_mmap
+
+    A mapped file is not copied into the Python heap, its pages are shared through the page cache by every process
+    reading it. It stays mapped until the objects referencing it are released. Empty files cannot be mapped and are
+    always read.
+    """
+    with open(filename, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            return MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+
+def sync_directory(directory):
+    # makes renames in the directory durable, directories cannot be opened on some platforms, e.g. Windows
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class WriteBatch:
+    """ Writes files atomically: each file is written to a temporary file next to it, renamed over it on commit
+
+    A destination is therefore never left truncated. Used as a context manager, the batch commits all its files when
+    the block exits, and removes the temporary files if it raises instead. If fsync, the contents of each file are
+    synced before the rename, and each directory is synced once after all renames.
+    """
+
+    def __init__(self, fsync=False):
+        self.fsync = fsync
+        self.pending = []
+        self.directories = set()
+
+    def write(self, destination, data, overwrite=False):
+        if not overwrite and os.path.exists(destination):
+            raise FileExistsError(destination)
+        directory = os.path.dirname(destination) or os.curdir
+        if directory not in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            self.directories.add(directory)
+        temp_path = os.path.join(directory, f".{os.path.basename(destination)}.{os.urandom(4).hex()}.tmp")
+        # unlike tempfile.mkstemp, os.open creates the file with the permissions of a regular open
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.pending.append((temp_path, destination))
+
+    def commit(self):
+        for temp_path, destination in self.pending:
+            os.replace(temp_path, destination)
+        if self.fsync:
+            for directory in set(os.path.dirname(destination) or os.curdir for _, destination in self.pending):
+                sync_directory(directory)
+        self.pending = []
+
+    def abort(self):
+        for temp_path, _ in self.pending:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def write_file(destination, data, overwrite=False, fsync=False, batch=None):
+    """ Writes data to destination atomically, or adds it to batch, which then decides whether to fsync
+    """
+    if batch is not None:
+        batch.write(destination, data, overwrite)
+    else:
+        with WriteBatch(fsync) as batch:
+            batch.write(destination, data, overwrite)
+
+
+class BytesWriter:
+    """ Serializes into one shared bytearray, packing values in place at the current offset
+
+    Pass the expected total size to preallocate the buffer, it grows geometrically otherwise.
+    """
+
+    def __init__(self, size=0):
+        self.buffer = bytearray(size)
+        self.offset = 0
+
+    def reserve(self, length):
+        end = self.offset + length
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end - len(self.buffer), len(self.buffer))))
+        return end
+
+    def write_int(self, value, length):
+        end = self.reserve(length)
+        FORMAT_STRUCT[length].pack_into(self.buffer, self.offset, value)
+        self.offset = end
+
+    def write_struct(self, compiled_struct, values):
+        end = self.reserve(compiled_struct.size)
+        compiled_struct.pack_into(self.buffer, self.offset, *values)
+        self.offset = end
+
+    def write(self, data):
+        end = self.reserve(len(data))
+        self.buffer[self.offset:end] = data
+        self.offset = end
+
+    def getvalue(self):
+        return bytes(memoryview(self.buffer)[:self.offset])
+
+
+class Layout:
+    """ Fixed-width record layout, decoded and encoded with one precompiled struct.Struct
+
+    Each field is one of:
+        (key, length)           big-endian unsigned integer of 1, 2, 4 or 8 bytes
+        (key, length, str)      utf-8 text of a fixed length
+        (key, length, bytes)    raw bytes of a fixed length
+        (bit_fields, length)    unsigned integer split into (key, bits) pairs, from the most significant bit on
+        (key, record_class)     nested record, described by record_class.layout
+    Bytes or bits with a key of None are skipped when reading and written as zeros. Records are InfoNode objects,
+    decoded fields are stored with their set_decoded method.
+    """
+    INT = 0
+    TEXT = 1
+    BYTES = 2
+    BITS = 3
+    RECORD = 4
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.steps = []
+        # names of the decoded fields, in order
+        keys = []
+        format_chars = []
+        # number of format characters before the trailing padding, which is not required to be present when reading
+        read_format_length = 0
+        # bits of the layout that are skipped, from the first byte on
+        self.skipped_mask = 0
+        for field in fields:
+            key, length = field[:2]
+            field_type = field[2] if len(field) > 2 else int
+            if key is None:
+                format_chars.append(f"{length}x")
+                self.skipped_mask = (self.skipped_mask << 8 * length) + 2 ** (8 * length) - 1
+                continue
+            if isinstance(length, type):
+                format_chars.append(length.layout.format_chars)
+                self.steps.append((self.RECORD, key, length))
+                keys.append(key)
+                self.skipped_mask = (self.skipped_mask << 8 * length.layout.size) + length.layout.skipped_mask
+            elif field_type is not int:
+                format_chars.append(f"{length}s")
+                self.steps.append((self.TEXT if field_type is str else self.BYTES, key, length))
+                keys.append(key)
+                self.skipped_mask <<= 8 * length
+            elif isinstance(key, tuple):
+                format_chars.append(FORMAT_CHAR[length][1])
+                bit_fields = []
+                shift = 8 * length
+                for name, bits in key:
+                    shift -= bits
+                    bit_fields.append((name, shift, 2 ** bits - 1))
+                    if name is not None:
+                        keys.append(name)
+                    self.skipped_mask = (self.skipped_mask << bits) + (2 ** bits - 1 if name is None else 0)
+                assert shift == 0
+                self.steps.append((self.BITS, None, tuple(bit_fields)))
+            else:
+                format_chars.append(FORMAT_CHAR[length][1])
+                self.steps.append((self.INT, key, length))
+                keys.append(key)
+                self.skipped_mask <<= 8 * length
+            read_format_length = len(format_chars)
+        self.keys = tuple(keys)
+        self.format_chars = "".join(format_chars)
+        self.struct = struct.Struct(">" + self.format_chars)
+        self.read_struct = struct.Struct(">" + "".join(format_chars[:read_format_length]))
+        self.size = self.struct.size
+
+    def read(self, record, data, offset=0):
+        """ Decodes the fields at offset into record, returns the offset right after the layout
+        """
+        self.decode(self.read_struct.unpack_from(data, offset), 0, record)
+        return offset + self.size
+
+    def is_canonical(self, data, offset=0):
+        """ Whether writing the decoded fields reproduces the bytes at offset, i.e. every skipped bit is zero
+        """
+        if not self.skipped_mask:
+            return True
+        span = data[offset:offset + self.size]
+        return len(span) == self.size and int.from_bytes(span, "big") & self.skipped_mask == 0
+
+    def write(self, writer, record):
+        writer.write_struct(self.struct, self.encode(record, []))
+
+    def decode(self, values, index, record):
+        set_decoded = record.set_decoded
+        for kind, key, argument in self.steps:
+            if kind == self.INT or kind == self.BYTES:
+                set_decoded(key, values[index])
+            elif kind == self.TEXT:
+                set_decoded(key, values[index].decode("utf-8"))
+            elif kind == self.BITS:
+                value = values[index]
+                for name, shift, mask in argument:
+                    if name is not None:
+                        set_decoded(name, value >> shift & mask)
+            else:
+                nested_record = argument()
+                index = argument.layout.decode(values, index, nested_record)
+                nested_record.adopt(record)
+                set_decoded(key, nested_record)
+                continue
+            index += 1
+        return index
+
+    def encode(self, record, values):
+        for kind, key, argument in self.steps:
+            if kind == self.INT:
+                values.append(record[key])
+            elif kind == self.TEXT or kind == self.BYTES:
+                value = record[key].encode("utf-8") if kind == self.TEXT else record[key]
+                assert len(value) == argument
+                values.append(value)
+            elif kind == self.BITS:
+                value = 0
+                for name, shift, _ in argument:
+                    if name is not None:
+                        value += record[name] << shift
+                values.append(value)
+            else:
+                record[key].check_constraints()
+                argument.layout.encode(record[key], values)
+        return values
@@ -0,0 +1,302 @@
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from shinya.common.info_dict import InfoNode, Record
+
+# methods timed by default, allocations are counted separately through __init__
+METHODS = ("from_bytes", "to_bytes", "write", "calculate_display_size", "update_constants", "check_constraints")
+# report written at exit when set, "-" for stderr, and collapsed stacks written next to it with a .stacks suffix
+ENVIRONMENT_VARIABLE = "SHINYA_PROFILE"
+
+_active = None
+
+
+class Stat:
+    __slots__ = ("calls", "time", "own_time", "bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.own_time = 0.0
+        self.bytes = 0
+
+    def add(self, other):
+        self.calls += other.calls
+        self.time += other.time
+        self.own_time += other.own_time
+        self.bytes += other.bytes
+
+
+class _Frame:
+    __slots__ = ("target", "method", "path", "start", "child_time")
+
+    def __init__(self, target, method, path, start):
+        self.target = target
+        self.method = method
+        self.path = path
+        self.start = start
+        self.child_time = 0.0
+
+
+class _ThreadState:
+    def __init__(self):
+        self.stack = []
+        # (class label, method): Stat
+        self.stats = defaultdict(Stat)
+        # class label: number of nodes created
+        self.allocations = defaultdict(int)
+        # tuple of "class.method" labels from the outermost call: own time in seconds
+        self.stacks = defaultdict(float)
+
+
+def label(cls):
+    """ Name of a class in reports, prefixed with the last part of its module name, e.g. mpls.PlayItem
+    """
+    return f"{cls.__module__.rsplit('.', 1)[-1]}.{cls.__qualname__}"
+
+
+def decoded_size(node):
+    """ Size of the bytes a node was parsed from, when it is known without encoding the node
+    """
+    source = getattr(node, "_source", None)
+    if source is not None:
+        return source[2] - source[1]
+    layout = getattr(node, "layout", None)
+    if layout is None:
+        return 0
+    key, length = layout.fields[0][:2]
+    if key == "Length" and "Length" in node:
+        return node["Length"] + length
+    if isinstance(node, Record):
+        return layout.size
+    return 0
+
+
+def node_classes():
+    """ Every class derived from InfoNode that is defined so far, InfoNode included
+    """
+    classes = [InfoNode]
+    for cls in classes:
+        for subclass in cls.__subclasses__():
+            if subclass not in classes:
+                classes.append(subclass)
+    return classes
+
+
+class Profiler:
+    """ Records call counts, cumulative and own time and bytes decoded or encoded per node class and method, and the
+    number of nodes created per class
+
+    The methods of the node classes are wrapped while the profiler runs, from start() to stop() or within a with
+    block, and are left untouched otherwise, so that a disabled profiler costs nothing. Classes defined after start()
+    are not profiled. Only one profiler runs at a time. Calls from several threads are recorded separately and summed
+    in the results.
+
+    Bytes decoded by from_bytes are only counted when the parsed node knows its size, i.e. in strict mode or when it
+    starts with a Length field. A method calling the same method of a base class on the same node is counted once.
+    """
+
+    def __init__(self, methods=METHODS):
+        self.methods = methods
+        self._patched = []
+        self._local = threading.local()
+        self._states = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        global _active
+        assert _active is None, "another profiler is running"
+        _active = self
+        for cls in node_classes():
+            for name in self.methods:
+                if name in cls.__dict__:
+                    self._patch(cls, name, self._wrap_method(cls.__dict__[name], name))
+            if "__init__" in cls.__dict__:
+                self._patch(cls, "__init__", self._wrap_init(cls.__dict__["__init__"]))
+
+    def stop(self):
+        global _active
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched = []
+        if _active is self:
+            _active = None
+
+    def _patch(self, cls, name, replacement):
+        self._patched.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, replacement)
+
+    def _state(self):
+        try:
+            return self._local.state
+        except AttributeError:
+            state = self._local.state = _ThreadState()
+            with self._lock:
+                self._states.append(state)
+            return state
+
+    def _wrap_method(self, original, name):
+        is_classmethod = isinstance(original, classmethod)
+        function = original.__func__ if is_classmethod else original
+        profiler = self
+        labels = {}
+
+        @wraps(function)
+        def wrapper(target, *args, **kwargs):
+            state = profiler._state()
+            stack = state.stack
+            parent = stack[-1] if stack else None
+            # a call to the same method of a base class, already recorded by the outer call
+            if parent is not None and parent.target is target and parent.method == name:
+                return function(target, *args, **kwargs)
+            cls = target if is_classmethod else type(target)
+            key = labels.get(cls)
+            if key is None:
+                key = labels[cls] = (label(cls), name)
+            path = (parent.path if parent is not None else ()) + (f"{key[0]}.{name}",)
+            writer_offset = args[0].offset if name == "write" and args else None
+            frame = _Frame(target, name, path, time.perf_counter())
+            stack.append(frame)
+            try:
+                result = function(target, *args, **kwargs)
+            finally:
+                stack.pop()
+                elapsed = time.perf_counter() - frame.start
+                own_time = elapsed - frame.child_time
+                stat = state.stats[key]
+                stat.calls += 1
+                stat.time += elapsed
+                stat.own_time += own_time
+                state.stacks[path] += own_time
+                if parent is not None:
+                    parent.child_time += elapsed
+            if name == "from_bytes":
+                stat.bytes += decoded_size(result)
+            elif name == "to_bytes":
+                stat.bytes += len(result)
+            elif writer_offset is not None:
+                stat.bytes += args[0].offset - writer_offset
+            return result
+
+        return classmethod(wrapper) if is_classmethod else wrapper
+
+    def _wrap_init(self, original):
+        profiler = self
+
+        @wraps(original)
+        def wrapper(node, *args, **kwargs):
+            # only the __init__ of the most derived class counts, not the ones it calls through super()
+            if type(node).__init__ is wrapper:
+                profiler._state().allocations[label(type(node))] += 1
+            original(node, *args, **kwargs)
+
+        return wrapper
+
+    def stats(self):
+        """ Returns {(class label, method): Stat} summed over the threads
+        """
+        stats = defaultdict(Stat)
+        for state in list(self._states):
+            for key, stat in list(state.stats.items()):
+                stats[key].add(stat)
+        return dict(stats)
+
+    def allocations(self):
+        """ Returns {class label: number of nodes created} summed over the threads
+        """
+        allocations = defaultdict(int)
+        for state in list(self._states):
+            for key, count in list(state.allocations.items()):
+                allocations[key] += count
+        return dict(allocations)
+
+    def stacks(self):
+        """ Returns {call path: own time in seconds} summed over the threads
+        """
+        stacks = defaultdict(float)
+        for state in list(self._states):
+            for path, own_time in list(state.stacks.items()):
+                stacks[path] += own_time
+        return dict(stacks)
+
+    def reset(self):
+        with self._lock:
+            self._states = []
+        self._local = threading.local()
+
+    def to_dict(self):
+        """ Results as plain types, e.g. to save them as json
+        """
+        return {
+            "methods": [
+                {"class": cls, "method": method, "calls": stat.calls, "time": stat.time, "own_time": stat.own_time,
+                 "bytes": stat.bytes}
+                for (cls, method), stat in sorted(self.stats().items(), key=lambda item: -item[1].time)
+            ],
+            "allocations": self.allocations(),
+        }
+
+    def report(self, file=None, sort="time", limit=None):
+        """ Writes a table of the methods sorted by sort, one of calls, time, own_time or bytes, to file or stdout
+        """
+        file = file or sys.stdout
+        rows = sorted(self.stats().items(), key=lambda item: -getattr(item[1], sort))[:limit]
+        print(f"{'class':<32}{'method':<24}{'calls':>10}{'time':>12}{'own time':>12}{'bytes':>12}{'MB/s':>10}",
+              file=file)
+        for (cls, method), stat in rows:
+            throughput = f"{stat.bytes / stat.time / 1e6:.1f}" if stat.bytes and stat.time else ""
+            print(f"{cls:<32}{method:<24}{stat.calls:>10}{stat.time * 1000:>10.3f}ms{stat.own_time * 1000:>10.3f}ms"
+                  f"{stat.bytes:>12}{throughput:>10}", file=file)
+        allocations = sorted(self.allocations().items(), key=lambda item: -item[1])[:limit]
+        if allocations:
+            print(f"\n{'class':<32}{'nodes created':>14}", file=file)
+            for cls, count in allocations:
+                print(f"{cls:<32}{count:>14}", file=file)
+
+    def write_stacks(self, file):
+        """ Writes the own time of every call path in microseconds, one "a;b;c time" line per path, the collapsed
+        format read by flamegraph.pl, speedscope and similar tools
+        """
+        for path, own_time in sorted(self.stacks().items()):
+            print(f"{';'.join(path)} {round(own_time * 1e6)}", file=file)
+
+
+def active_profiler():
+    """ Returns the running profiler, None when profiling is disabled
+    """
+    return _active
+
+
+def profile_from_environment():
+    """ Starts a profiler if the SHINYA_PROFILE environment variable is set, and writes its report there at exit
+    """
+    destination = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not destination or _active is not None:
+        return None
+    profiler = Profiler()
+    profiler.start()
+
+    def write_results():
+        profiler.stop()
+        if destination == "-":
+            profiler.report(sys.stderr)
+            return
+        with open(destination, "w", encoding="utf-8") as f:
+            profiler.report(f)
+        with open(destination + ".stacks", "w", encoding="utf-8") as f:
+            profiler.write_stacks(f)
+
+    atexit.register(write_results)
+    return profiler
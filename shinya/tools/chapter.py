@@ -1,10 +1,20 @@
 import os
 from copy import deepcopy
 
-from lxml import etree
-
 from shinya.bd.mpls import MoviePlaylistFile, StreamAttributes
 
+# clock of the playlist time stamps, chapter times are stored as integer numbers of ticks
+TICKS_PER_SECOND = 45000
+
+
+def exact_frame_rate(fps):
+    """ Returns fps as a Fraction, e.g. 24000/1001 for the float values of StreamAttributes.frame_rate_lookup
+    """
+    # imported here as fractions loads decimal, which is slow to import
+    from fractions import Fraction
+
+    return Fraction(fps).limit_denominator(1001)
+
 
 class MatroskaXMLChapter:
     """
@@ -12,6 +22,9 @@ class MatroskaXMLChapter:
     """
 
     def __init__(self, chapters):
+        # lxml is only loaded when chapters are exported as xml
+        from lxml import etree
+
         assert isinstance(chapters, Chapter)
         self.chapters = chapters
         self.xml_chapter = etree.Element('Chapters')
@@ -38,6 +51,8 @@ class MatroskaXMLChapter:
             chapter_language.text = chapter_entry.language
 
     def export(self, destination, overwrite=False):
+        from lxml import etree
+
         if os.path.exists(destination) and not overwrite:
             raise FileExistsError()
         os.makedirs(os.path.dirname(destination), exist_ok=True)
@@ -50,10 +65,11 @@ class MatroskaXMLChapter:
 
 class QPFile:
     def __init__(self, chapters, fps):
+        assert isinstance(chapters, Chapter)
         self.iframes = []
-        for _, chapter_entry in enumerate(chapters):
-            time_sec = chapter_entry.time_sec
-            frame = time_sec * fps
+        frames_per_tick = exact_frame_rate(fps) / TICKS_PER_SECOND
+        for ticks in chapters.entry_ticks():
+            frame = ticks * frames_per_tick
             assert abs(frame - round(frame)) < 0.1
             self.iframes.append(round(frame))
 
@@ -66,33 +82,54 @@ class QPFile:
 
 
 class ChapterEntry:
-    def __init__(self, time_sec, language="eng", name=None):
-        assert time_sec >= 0.
+    """ Chapter starting time_sec seconds into the stream, stored as an integer number of 45 kHz ticks
+
+    Pass ticks instead of time_sec for an exact time, time_sec is rounded to the nearest tick.
+    """
+
+    def __init__(self, time_sec=None, language="eng", name=None, ticks=None):
+        if ticks is None:
+            ticks = round(time_sec * TICKS_PER_SECOND)
+        assert ticks >= 0
         assert len(language) == 3
-        self._time_sec = time_sec
+        self._ticks = ticks
+        self._time_str = None
         self.language = language
         self.name = name
 
+    @property
+    def ticks(self):
+        return self._ticks
+
+    @ticks.setter
+    def ticks(self, value):
+        if value < 0:
+            raise ValueError("Time stamp of a chapter cannot be negative.")
+        self._ticks = value
+        self._time_str = None
+
     @property
     def time_sec(self):
-        return self._time_sec
+        return self._ticks / TICKS_PER_SECOND
 
     @time_sec.setter
     def time_sec(self, value):
-        if value < 0.:
-            raise ValueError("Time stamp of a chapter cannot be negative.")
-        self._time_sec = value
+        self.ticks = round(value * TICKS_PER_SECOND)
+
+    def shifted(self, ticks):
+        """ Returns a copy of the entry ticks later
+        """
+        return ChapterEntry(language=self.language, name=self.name, ticks=self._ticks + ticks)
 
     @property
     def time_str(self):
-        seconds = self.time_sec
-        hour = int(seconds) // 3600
-        seconds %= 3600
-        minute = int(seconds) // 60
-        seconds %= 60
-        seconds_int = int(seconds)
-        seconds_decimals = int((seconds % 1) * 10 ** 6)
-        return f"{hour:02d}:{minute:02d}:{seconds_int:02d}.{seconds_decimals:06d}"
+        # formatted once, microseconds are truncated
+        if self._time_str is None:
+            seconds, microseconds = divmod(self._ticks * 10 ** 6 // TICKS_PER_SECOND, 10 ** 6)
+            minutes, seconds = divmod(seconds, 60)
+            hours, minutes = divmod(minutes, 60)
+            self._time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}.{microseconds:06d}"
+        return self._time_str
 
     def __str__(self):
         return f"{self.time_str}\t{self.language}" + (f"{self.name}" if self.name else "")
@@ -102,24 +139,107 @@ class ChapterEntry:
 
 
 class Chapter:
-    def __init__(self, data=None, end_time=None):
+    """ Chapter entries of a stream ending at end_time, in seconds, or end_ticks 45 kHz ticks
+
+    Shifting, slicing and joining work on the integer ticks of the entries. Slices are views: they keep a tuple of the
+    selected entries and the end of the stream on the time line of the chapter they were sliced from, and only copy
+    the entries, shifted to start at 0, when data is accessed, e.g. to modify or export them. Until then a view
+    reflects the changes made to the selected entries, its first entry included, but not the entries inserted in or
+    removed from the chapter it was sliced from.
+    """
+
+    def __init__(self, data=None, end_time=None, end_ticks=None):
         if not data:
-            self.data = []
+            self._data = []
         else:
-            self.data = data
-        self._end_time = end_time
+            self._data = data
+        if end_ticks is None and end_time is not None:
+            end_ticks = round(end_time * TICKS_PER_SECOND)
+        self._end_ticks = end_ticks
+        # (tuple of entries, end ticks on their time line) of a slice that is not materialized yet
+        self._view = None
         self.check_data()
 
+    @classmethod
+    def view(cls, entries, end_ticks):
+        self = cls.__new__(cls)
+        self._data = None
+        self._end_ticks = None
+        self._view = (entries, end_ticks)
+        return self
+
+    def _view_offset(self):
+        # read from the first entry on every use, it may be modified after slicing
+        entries = self._view[0]
+        return entries[0].ticks if entries else 0
+
+    @property
+    def data(self):
+        self.materialize()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._view = None
+
+    def materialize(self):
+        """ Copies the entries of a view, does nothing on other chapters
+        """
+        if self._view is not None:
+            end_ticks = self.end_ticks
+            offset = self._view_offset()
+            self._data = [c.shifted(-offset) for c in self._view[0]]
+            self._end_ticks = end_ticks
+            self._view = None
+
+    def entry_ticks(self):
+        """ Returns the ticks of the entries, without materializing a view
+        """
+        if self._view is None:
+            return [c.ticks for c in self._data]
+        offset = self._view_offset()
+        return [c.ticks - offset for c in self._view[0]]
+
+    def shifted_entries(self, offset):
+        """ Yields copies of the entries offset ticks later, without materializing a view
+        """
+        if self._view is None:
+            return (c.shifted(offset) for c in self._data)
+        offset -= self._view_offset()
+        return (c.shifted(offset) for c in self._view[0])
+
+    def __len__(self):
+        if self._view is not None:
+            return len(self._view[0])
+        return len(self._data)
+
+    @property
+    def end_ticks(self):
+        if self._view is None:
+            return self._end_ticks
+        end_ticks = self._view[1]
+        if end_ticks is None:
+            return None
+        return end_ticks - self._view_offset()
+
+    @end_ticks.setter
+    def end_ticks(self, value):
+        if any(value < ticks for ticks in self.entry_ticks()):
+            raise ValueError("End time of the stream must be larger than all chapters.")
+        self.materialize()
+        self._end_ticks = value
+
     @property
     def end_time(self):
-        return self._end_time
+        end_ticks = self.end_ticks
+        if end_ticks is None:
+            return None
+        return end_ticks / TICKS_PER_SECOND
 
     @end_time.setter
     def end_time(self, value):
-        for c in self.data:
-            if value < c.time_sec:
-                raise ValueError("End time of the stream must be larger than all chapters.")
-        self._end_time = value
+        self.end_ticks = round(value * TICKS_PER_SECOND)
 
     @classmethod
     def from_mpls(cls, filename):
@@ -149,16 +269,16 @@ class Chapter:
             if play_item_index not in playlist_marks_dict:
                 continue
             in_time = play_item["INTime"]
-            end_time = (play_item["OUTTime"] - in_time) / 45000
+            end_ticks = play_item["OUTTime"] - in_time
             chapter_data = []
             first_chapter_time = playlist_marks_dict[play_item_index][0] - in_time
             if first_chapter_time > 0:
-                chapter_data.append(ChapterEntry(0.))
+                chapter_data.append(ChapterEntry(ticks=0))
             if first_chapter_time < 0:
                 raise ValueError("First chapter time is earlier than play item in-time, this is considered an error.")
 
             for raw_time in playlist_marks_dict[play_item_index]:
-                chapter_data.append(ChapterEntry((raw_time - in_time) / 45000))
+                chapter_data.append(ChapterEntry(ticks=raw_time - in_time))
 
             clip_attr = {}
             stn_table = play_item["STNTable"]
@@ -168,7 +288,7 @@ class Chapter:
                     frame_rate = StreamAttributes.frame_rate_lookup[stream_attr["FrameRate"]]
                     clip_attr['FrameRate'] = frame_rate
 
-            result.append((play_item["ClipInformationFileName"], Chapter(chapter_data, end_time), clip_attr))
+            result.append((play_item["ClipInformationFileName"], Chapter(chapter_data, end_ticks=end_ticks), clip_attr))
 
         return result
 
@@ -176,7 +296,7 @@ class Chapter:
         assert isinstance(self.data, list)
         # the first chapter must always be at the beginning
         if self.data:
-            assert self.data[0].time_sec == 0.
+            assert self.data[0].ticks == 0
         for c in self.data:
             assert isinstance(c, ChapterEntry)
 
@@ -195,34 +315,45 @@ class Chapter:
 
     def __getitem__(self, item):
         if isinstance(item, slice):
-            indices = range(*item.indices(len(self.data)))
-            # preserves all other attributes
-            result = deepcopy(self)
-            if len(indices) == 0:
-                result.data = []
-                return result
-            new_data = []
-            init_offset = self.data[indices[0]].time_sec
-            for i in indices:
-                new_chapter_entry = deepcopy(self.data[i])
-                new_chapter_entry.time_sec -= init_offset
-                new_data.append(new_chapter_entry)
-            result.data = new_data
-            result.end_time -= init_offset
-            return result
+            if self._view is not None:
+                entries, end_ticks = self._view
+            else:
+                entries, end_ticks = self._data, self._end_ticks
+            # the selected entries are kept, not their indices, so that the view survives changes to the list
+            entries = tuple(entries[item])
+            if len(entries) == 0:
+                return self.copy_attributes(self.view(entries, self.end_ticks))
+            if len(entries) > 1 and item.step is not None and item.step < 0:
+                raise ValueError("Time stamp of a chapter cannot be negative.")
+            return self.copy_attributes(self.view(entries, end_ticks))
         return self.data[item]
 
+    def copy_attributes(self, result):
+        """ Copies the attributes of the chapter but its entries and end time to result, a chapter built from it, and
+        returns result
+        """
+        for key, value in self.__dict__.items():
+            if key not in result.__dict__:
+                setattr(result, key, deepcopy(value))
+        return result
+
+    @classmethod
+    def join(cls, chapters):
+        """ Concatenates chapters in one pass, each one starting at the sum of the end times of the previous ones
+
+        Every entry is copied once, joining n chapters takes linear time where repeated additions take quadratic time.
+        """
+        data = []
+        offset = 0
+        for chapter in chapters:
+            data.extend(chapter.shifted_entries(offset))
+            offset += chapter.end_ticks
+        return cls(data, end_ticks=offset)
+
     def __add__(self, other):
         if isinstance(other, Chapter):
             # attributes will follow the current object, except for data and end_time
-            result = deepcopy(self)
-            new_offset = self.end_time
-            for c in other.data:
-                new_chapter_entry = deepcopy(c)
-                new_chapter_entry.time_sec += new_offset
-                result.data.append(new_chapter_entry)
-            result.end_time += other.end_time
-            return result
+            return self.copy_attributes(type(self).join((self, other)))
         elif isinstance(other, int) or isinstance(other, float):
             if other == 0.:
                 return self
@@ -0,0 +1,263 @@
+import os
+import random
+from array import array
+
+from shinya.bd.clpi import ATCSequence, CLPIHeader, CPI, ClipInfo, ClipMark, EPCoarseTable, EPFineTable, Program, \
+    ProgramInfo, SequenceInfo, STCSequence, StreamCodingInfo
+from shinya.bd.indx import AppInfoBDMV, Indexes, INDXHeader, Title
+from shinya.bd.mobj import MOBJHeader, Mobj, MovieObjects, NavigationCommand
+from shinya.bd.mpls import AppInfoPlayList, MPLSHeader, MultiClipEntry, PlayItem, PlayList, PlayListMark, \
+    PlayListMarkItem, STNTable, StreamAttributes, StreamEntry, SubPath, SubPlayItem
+from shinya.common.info_dict import InfoDict
+from shinya.common.io import WORD_TYPECODE
+
+# playlist times are in 45 kHz ticks, playback usually starts 10 minutes in
+START_TIME = 27000000
+TICKS_PER_SECOND = 45000
+VIDEO_PID = 0x1011
+LANGUAGE_CODES = ("eng", "jpn", "fra", "deu", "spa", "ita", "zho", "kor")
+# streams are muxed at 40 Mbps
+BYTES_PER_SECOND = 40000000 // 8
+
+
+def blank(node_class, layout=None, **fields):
+    """ Returns a node_class node with every field of layout, node_class.layout by default, zeroed and then set from
+    fields
+    """
+    if layout is None:
+        layout = node_class.layout
+    node = node_class()
+    layout.read(node, bytes(layout.size))
+    node.update(fields)
+    return node
+
+
+def finish(header):
+    header.update_constants()
+    header.update_addresses()
+    return header.to_bytes()
+
+
+def stream_pair(stream_type, stream_pid, coding_type, **attributes):
+    pair = InfoDict()
+    pair["StreamEntry"] = StreamEntry(Length=9, StreamType=stream_type, RefToStreamPID=stream_pid)
+    pair["StreamAttributes"] = StreamAttributes(Length=5, StreamCodingType=coding_type, **attributes)
+    return pair
+
+
+def build_stn_table(audio_streams=2, pg_streams=2, rng=None):
+    stn_table = blank(STNTable, Length=1)
+    for name in STNTable.stream_names:
+        stn_table[name] = []
+    # H.264 1080p at 23.976 fps, Dolby TrueHD and presentation graphics streams
+    stn_table["PrimaryVideoStreamEntries"].append(stream_pair(1, VIDEO_PID, 0x1B, VideoFormat=6, FrameRate=1))
+    for i in range(audio_streams):
+        language_code = rng.choice(LANGUAGE_CODES) if rng else "eng"
+        stn_table["PrimaryAudioStreamEntries"].append(
+            stream_pair(1, 0x1100 + i, 0x83, AudioFormat=3, SampleRate=1, LanguageCode=language_code))
+    for i in range(pg_streams):
+        language_code = rng.choice(LANGUAGE_CODES) if rng else "eng"
+        stn_table["PrimaryPGStreamEntries"].append(stream_pair(1, 0x1200 + i, 0x90, LanguageCode=language_code))
+    return stn_table
+
+
+def multi_clip_entry(clip_name):
+    return MultiClipEntry(ClipInformationFileName=clip_name, ClipCodecIdentifier="M2TS", RefToSTCID=0)
+
+
+def build_sub_path(clip_names, sub_play_items, multi_clip_entries, item_duration):
+    sub_path = blank(SubPath, SubPathType=3, SubPlayItems=[])
+    for i in range(sub_play_items):
+        sub_play_item = blank(
+            SubPlayItem, ClipInformationFileName=clip_names[i % len(clip_names)], ClipCodecIdentifier="M2TS",
+            ConnectionCondition=1, IsMultiClipEntries=int(multi_clip_entries > 0), INTime=START_TIME,
+            OUTTime=START_TIME + item_duration * TICKS_PER_SECOND, SyncPlayItemID=i, SyncStartPTS=START_TIME)
+        if multi_clip_entries:
+            sub_play_item.update(NumberOfMultiClipEntries=multi_clip_entries, reserved2=0)
+            sub_play_item["MultiClipEntries"] = [
+                multi_clip_entry(clip_names[(i + j + 1) % len(clip_names)]) for j in range(multi_clip_entries)]
+        sub_path["SubPlayItems"].append(sub_play_item)
+    return sub_path
+
+
+def build_mpls(play_items=30, marks_per_play_item=4, item_duration=300, angles=1, sub_paths=0, sub_play_items=1,
+               multi_clip_entries=0, clip_names=None, rng=None):
+    """ Returns the bytes of a playlist of play_items play items of item_duration seconds each
+
+    The play items play clip_names in turn, clips 00000 on by default, multi-angle play items have angles angles
+    played from the next clips. Each of the sub_paths sub paths has sub_play_items sub play items of
+    multi_clip_entries clip entries each. With rng, a random.Random, durations are drawn between half item_duration
+    and item_duration seconds, and the number and languages of the audio and subtitle streams vary.
+    """
+    if clip_names is None:
+        clip_names = [f"{i:05d}" for i in range(play_items * angles)]
+    header = blank(MPLSHeader, TypeIndicator="MPLS", VersionNumber="0200", PlayListStartAddress=58)
+    header["AppInfoPlayList"] = blank(AppInfoPlayList, Length=14, PlaybackType=1)
+    playlist = blank(PlayList, PlayItems=[], SubPaths=[])
+    marks = blank(PlayListMark, PlayListMarks=[])
+    for i in range(play_items):
+        duration = rng.randint(max(1, item_duration // 2), item_duration) if rng else item_duration
+        stn_table = build_stn_table(rng.randint(1, 4), rng.randint(0, 8), rng) if rng else build_stn_table()
+        play_item = blank(
+            PlayItem, ClipInformationFileName=clip_names[i * angles % len(clip_names)], ClipCodecIdentifier="M2TS",
+            ConnectionCondition=1, INTime=START_TIME, OUTTime=START_TIME + duration * TICKS_PER_SECOND,
+            STNTable=stn_table)
+        if angles > 1:
+            play_item.update(IsMultiAngle=1, NumberOfAngles=angles, reserved4=0, IsDifferentAudios=0,
+                             IsSeamlessAngleChange=1)
+            play_item["Angles"] = [
+                multi_clip_entry(clip_names[(i * angles + j + 1) % len(clip_names)]) for j in range(angles - 1)]
+        playlist["PlayItems"].append(play_item)
+        for j in range(marks_per_play_item):
+            marks["PlayListMarks"].append(PlayListMarkItem(
+                reserved1=0, MarkType=1, RefToPlayItemID=i,
+                MarkTimeStamp=START_TIME + j * duration * TICKS_PER_SECOND // marks_per_play_item,
+                EntryESPID=0xFFFF, Duration=0))
+    for _ in range(sub_paths):
+        playlist["SubPaths"].append(build_sub_path(clip_names, sub_play_items, multi_clip_entries, item_duration))
+    header["PlayList"] = playlist
+    header["PlayListMark"] = marks
+    return finish(header)
+
+
+def build_ep_map(entries, duration, spn_offset=0):
+    """ Returns the coarse and fine EP map tables of entries entry points spread over duration seconds
+    """
+    coarse_entries = EPCoarseTable()
+    fine_entries = EPFineTable()
+    columns = {name: array(WORD_TYPECODE) for table in (coarse_entries, fine_entries) for name in table.columns}
+    # PTS are in 90 kHz ticks
+    pts_step = duration * 90000 // max(1, entries)
+    spn_step = BYTES_PER_SECOND * duration // max(1, entries) // 192
+    previous_coarse = None
+    for i in range(entries):
+        pts = (2 * START_TIME + i * pts_step) & ~0x1FF
+        spn = spn_offset + i * spn_step
+        # a coarse entry starts whenever the bits not held by the fine entries change
+        if (pts >> 19, spn >> 17) != previous_coarse:
+            previous_coarse = (pts >> 19, spn >> 17)
+            columns["RefToEPFineID"].append(i)
+            columns["PTSEPCoarse"].append(pts >> 19 & 0x3FFF)
+            columns["SPNEPCoarse"].append(spn)
+        columns["IsAngleChangePoint"].append(1)
+        columns["IEndPositionOffset"].append(1)
+        columns["PTSEPFine"].append(pts >> 9 & 0x7FF)
+        columns["SPNEPFine"].append(spn & 0x1FFFF)
+    for table in (coarse_entries, fine_entries):
+        for name in table.columns:
+            table.columns[name] = columns[name]
+    return coarse_entries, fine_entries
+
+
+def stream_coding_info(stream_coding_type, **fields):
+    # entries are 21 bytes long on discs, the rest of the entry is padding
+    stream_coding_info = blank(StreamCodingInfo, StreamCodingInfo.layouts[stream_coding_type], Length=21,
+                               StreamCodingType=stream_coding_type, **fields)
+    stream_coding_info["padding"] = bytes(21 - 1 - StreamCodingInfo.layouts[stream_coding_type].size)
+    return stream_coding_info
+
+
+def build_clpi(ep_map_entries=2000, duration=1800, stream_pids=1):
+    """ Returns the bytes of a clip of duration seconds, whose EP map has stream_pids video streams of ep_map_entries
+    entry points each
+    """
+    header = blank(CLPIHeader, TypeIndicator="HDMV", VersionNumber="0200")
+    clip_info = blank(ClipInfo, ClipStreamType=1, ApplicationType=1, TSRecordingRate=48000000,
+                      NumberOfSourcePackets=BYTES_PER_SECOND * duration // 192)
+    clip_info["TSTypeInfoBlock"].update(Length=30, ValidityFlags=0x80, FormatIdentifier="HDMV")
+    header["ClipInfo"] = clip_info
+
+    stc_sequence = STCSequence(PCRPID=VIDEO_PID, SPNSTCStart=0, PresentationStartTime=START_TIME,
+                               PresentationEndTime=START_TIME + duration * TICKS_PER_SECOND)
+    header["SequenceInfo"] = blank(SequenceInfo, ATCSequences=[blank(ATCSequence, STCSequences=[stc_sequence])])
+
+    streams = [(VIDEO_PID, stream_coding_info(0x1B, VideoFormat=6, FrameRate=1, VideoAspect=3))]
+    streams += [(0x1100 + i, stream_coding_info(0x83, AudioFormat=3, SampleRate=1, Language="eng")) for i in range(2)]
+    streams += [(0x1200 + i, stream_coding_info(0x90, Language="eng")) for i in range(2)]
+    streams_in_ps = []
+    for stream_pid, coding_info in streams:
+        stream = InfoDict()
+        stream["StreamPID"] = stream_pid
+        stream["StreamCodingInfo"] = coding_info
+        streams_in_ps.append(stream)
+    program = blank(Program, ProgramMapPID=0x100, StreamsInPS=streams_in_ps)
+    header["ProgramInfo"] = blank(ProgramInfo, Programs=[program])
+
+    stream_pid_entries = []
+    for i in range(stream_pids):
+        # the video streams are interleaved, their entry points are a few packets apart
+        coarse_entries, fine_entries = build_ep_map(ep_map_entries, duration, spn_offset=i)
+        stream_pid_entries.append(blank(
+            InfoDict, CPI.stream_pid_entry_layout, StreamPID=VIDEO_PID + i, EPStreamType=1, EPFineTableStartAddress=0,
+            EPCoarseEntries=coarse_entries, EPFineEntries=fine_entries))
+    header["CPI"] = blank(CPI, Length=1, CPIType=1, StreamPIDEntries=stream_pid_entries)
+    header["ClipMark"] = ClipMark(Length=0)
+    return finish(header)
+
+
+def title(movie_object_id):
+    return blank(Title, Title.movie_object_layout, ObjectType=1, RefToMovieObjectID=movie_object_id)
+
+
+def build_index(titles=20):
+    """ Returns the bytes of an index table of titles movie object titles, title i playing movie object i + 2
+    """
+    header = blank(INDXHeader, TypeIndicator="INDX", VersionNumber="0200", IndexesStartAddress=78)
+    header["AppInfoBDMV"] = blank(AppInfoBDMV, Length=34, VideoFormat=6, FrameRate=1)
+    indexes = Indexes()
+    indexes["Length"] = 0
+    indexes["FirstPlaybackTitle"] = title(0)
+    indexes["TopMenuTitle"] = title(1)
+    indexes["NumberOfTitles"] = titles
+    indexes["Titles"] = [title(i + 2) for i in range(titles)]
+    header["Indexes"] = indexes
+    return finish(header)
+
+
+def build_movie_object(movie_objects=22, commands_per_object=8):
+    """ Returns the bytes of a movie object file, movie object i + 2 playing playlist i, the first two playlist 0
+    """
+    header = blank(MOBJHeader, TypeIndicator="MOBJ", VersionNumber="0200")
+    mobjs = []
+    for i in range(movie_objects):
+        # set GPR 0 to the object number, then PlayPL
+        commands = [blank(NavigationCommand, OperandCount=2, CommandGroup=2, SourceImmediateValueFlag=1,
+                          Destination=0, Source=i) for _ in range(commands_per_object - 1)]
+        commands.append(blank(NavigationCommand, OperandCount=1, CommandGroup=0, CommandSubGroup=2,
+                              DestinationImmediateValueFlag=1, Destination=max(0, i - 2)))
+        mobjs.append(blank(Mobj, ResumeIntentionFlag=1, NavigationCommands=commands))
+    header["MovieObjects"] = blank(MovieObjects, Mobjs=mobjs)
+    return finish(header)
+
+
+def write_corpus(root, playlists=10, clips=20, seed=0, max_play_items=50, max_angles=1, max_sub_paths=0,
+                 ep_map_entries=2000, stream_pids=1, clip_duration=1800):
+    """ Writes a BDMV directory under root and returns its path
+
+    The directory holds playlists playlists, clips clip information files, an index table and a movie object file
+    playing every playlist. Stream files are not written. The numbers of play items, angles and sub paths of each
+    playlist are drawn up to their maximum from a random generator seeded with seed, so the same arguments always
+    write the same files. Every file is valid in strict mode.
+    """
+    rng = random.Random(seed)
+    bdmv = os.path.join(root, "BDMV")
+    for directory in ("PLAYLIST", "CLIPINF"):
+        os.makedirs(os.path.join(bdmv, directory), exist_ok=True)
+    clip_names = [f"{i:05d}" for i in range(clips)]
+    for clip_name in clip_names:
+        with open(os.path.join(bdmv, "CLIPINF", f"{clip_name}.clpi"), "wb") as f:
+            f.write(build_clpi(ep_map_entries, rng.randint(clip_duration // 2, clip_duration), stream_pids))
+    for i in range(playlists):
+        # play items are not longer than the shortest clip
+        data = build_mpls(
+            play_items=rng.randint(1, max_play_items), angles=rng.randint(1, max_angles),
+            sub_paths=rng.randint(0, max_sub_paths), sub_play_items=rng.randint(1, 4),
+            multi_clip_entries=rng.randint(0, 2), item_duration=clip_duration // 2,
+            clip_names=rng.sample(clip_names, len(clip_names)), rng=rng)
+        with open(os.path.join(bdmv, "PLAYLIST", f"{i:05d}.mpls"), "wb") as f:
+            f.write(data)
+    with open(os.path.join(bdmv, "index.bdmv"), "wb") as f:
+        f.write(build_index(titles=playlists))
+    with open(os.path.join(bdmv, "MovieObject.bdmv"), "wb") as f:
+        f.write(build_movie_object(movie_objects=playlists + 2))
+    return bdmv
@@ -0,0 +1,20 @@
+import asyncio
+
+from shinya.bd import IndexTableFile
+from shinya.tools.synthetic import build_index
+
+
+def test_aload_and_asave(tmp_path):
+    source = str(tmp_path / "index.bdmv")
+    with open(source, "wb") as f:
+        f.write(build_index(titles=2))
+
+    async def load_and_save():
+        index = await IndexTableFile.aload(source)
+        await index.asave(str(tmp_path / "out" / "index.bdmv"))
+        return index
+
+    index = asyncio.run(load_and_save())
+    assert index.data["Indexes"]["NumberOfTitles"] == 2
+    with open(str(tmp_path / "out" / "index.bdmv"), "rb") as f:
+        assert f.read() == build_index(titles=2)
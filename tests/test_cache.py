@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from shinya.bd.indx import INDXHeader
+from shinya.common.cache import ParseCache
+from shinya.tools.synthetic import build_index
+
+
+def write(path, titles):
+    with open(path, "wb") as f:
+        f.write(build_index(titles=titles))
+    return str(path)
+
+
+@pytest.mark.parametrize("key", ["hash", "stat"])
+def test_hit_and_miss(tmp_path, key):
+    cache = ParseCache(str(tmp_path / "cache"), key=key)
+    filename = write(tmp_path / "index.bdmv", 3)
+    first = cache.load(filename, INDXHeader)
+    second = cache.load(filename, INDXHeader)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second is not first
+    assert second.to_bytes() == first.to_bytes()
+    cache.load(filename, INDXHeader, strict=False)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_stale_hash(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), key="hash")
+    filename = write(tmp_path / "index.bdmv", 3)
+    cache.load(filename, INDXHeader)
+    stat = os.stat(filename)
+    write(tmp_path / "index.bdmv", 4)
+    # same modification time, the contents tell the entries apart
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    header = cache.load(filename, INDXHeader)
+    assert header["Indexes"]["NumberOfTitles"] == 4
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_stale_mtime(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), key="stat")
+    filename = write(tmp_path / "index.bdmv", 3)
+    cache.load(filename, INDXHeader)
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    cache.load(filename, INDXHeader)
+    assert (cache.hits, cache.misses) == (0, 2)
+    cache.load(filename, INDXHeader)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_eviction(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = ParseCache(directory)
+    filenames = [write(tmp_path / f"{i}.bdmv", i + 1) for i in range(3)]
+    for i, filename in enumerate(filenames):
+        cache.load(filename, INDXHeader)
+        # least recently used first, whatever the resolution of modification times
+        for _, _, path in cache.entries():
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+    sizes = sorted(size for _, size, _ in cache.entries())
+    cache.max_size = sizes[-1] + sizes[-2]
+    cache.evict()
+    assert cache.evictions == 1
+    assert cache.stats()["entries"] == 2
+    cache.load(filenames[0], INDXHeader)
+    assert cache.misses == 4
+    # the entry just stored is kept, the oldest ones are evicted
+    cache.load(filenames[2], INDXHeader)
+    assert cache.hits == 1
+
+
+def test_oversized_entry(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), max_size=10)
+    filename = write(tmp_path / "index.bdmv", 3)
+    cache.load(filename, INDXHeader)
+    assert cache.stats()["entries"] == 0
+    assert cache.evictions == 0
+    assert cache.put("key", "x" * 100) is False
@@ -0,0 +1,54 @@
+from shinya.tools.chapter import Chapter, ChapterEntry
+
+
+def chapter(*seconds, end_time=100):
+    return Chapter([ChapterEntry(s) for s in seconds], end_time=end_time)
+
+
+def test_slice_survives_list_changes():
+    c = chapter(0, 10, 20, 30)
+    view = c[1:3]
+    c.data.insert(0, ChapterEntry(0))
+    c.data[1].ticks = 450000
+    del c.data[2]
+    assert view.entry_ticks() == [0, 450000]
+    assert view.end_ticks == 90 * 45000
+    assert [e.time_sec for e in view[1:].data] == [0]
+    assert [e.time_sec for e in view.data] == [0, 10]
+
+
+def test_add_keeps_class_and_attributes():
+    class TitleChapter(Chapter):
+        pass
+
+    first = TitleChapter(chapter(0, 10).data, end_time=20)
+    first.title = "main"
+    joined = first + chapter(0, 5, end_time=10)
+    assert type(joined) is TitleChapter
+    assert joined.title == "main"
+    assert joined.entry_ticks() == [0, 10 * 45000, 20 * 45000, 25 * 45000]
+    assert joined.end_time == 30
+    assert sum([first, first]).end_time == 40
+
+
+def test_slice_keeps_attributes():
+    c = chapter(0, 10, 20)
+    c.title = "ep1"
+    assert c[1:].title == "ep1"
+    assert c[1:][1:].title == "ep1"
+    assert c[3:].title == "ep1"
+
+
+def test_slice_follows_its_first_entry():
+    c = chapter(0, 10, 20)
+    s = c[1:]
+    nested = s[1:]
+    c.data[1].time_sec = 12
+    assert s.entry_ticks() == [0, 8 * 45000]
+    assert s.end_time == 88
+    assert nested.end_time == 80
+    assert [e.time_sec for e in s.data] == [0, 8]
+    s.check_data()
+    assert s.end_time == 88
+    c.data[2].time_sec = 30
+    assert [e.time_sec for e in s.data] == [0, 8]
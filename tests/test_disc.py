@@ -0,0 +1,41 @@
+from shinya.bd import BDMVDisc
+from shinya.bd.disc import SOURCE_PACKET_SIZE
+from shinya.tools.synthetic import write_corpus
+
+
+def expected_range(disc, play_item):
+    """ SPNs of the last entry point at or before INTime and the first one after OUTTime, found by a linear search
+    """
+    clip = disc.get_clip(play_item["ClipInformationFileName"])
+    entry_points = list(clip.ep_map_index())
+    in_pts, out_pts = 2 * play_item["INTime"], 2 * play_item["OUTTime"]
+    start = max((spn for pts, spn in entry_points if pts <= in_pts), default=0)
+    end = min((spn for pts, spn in entry_points if pts > out_pts),
+              default=clip.data["ClipInfo"]["NumberOfSourcePackets"])
+    return disc.stream_filename(play_item["ClipInformationFileName"]), start, end
+
+
+def test_stream_ranges(tmp_path):
+    disc = BDMVDisc(write_corpus(str(tmp_path), playlists=2, clips=3, max_play_items=6, ep_map_entries=200,
+                                 clip_duration=60))
+    for name in disc.playlist_names():
+        play_items = disc.get_playlist(name).data["PlayList"]["PlayItems"]
+        ranges = disc.stream_ranges(name)
+        # the play items of the corpus play the clips in turn, no two consecutive ones share a file
+        assert len(ranges) == len(play_items)
+        for stream_range, play_item in zip(ranges, play_items):
+            filename, start, end = expected_range(disc, play_item)
+            assert stream_range == (filename, SOURCE_PACKET_SIZE * start, SOURCE_PACKET_SIZE * end)
+            assert 0 <= start < end
+
+
+def test_stream_ranges_merge(tmp_path):
+    disc = BDMVDisc(write_corpus(str(tmp_path), playlists=1, clips=1, max_play_items=6, ep_map_entries=200,
+                                 clip_duration=60, seed=1))
+    name = disc.playlist_names()[0]
+    play_items = disc.get_playlist(name).data["PlayList"]["PlayItems"]
+    assert len(play_items) > 1
+    expected = [expected_range(disc, play_item) for play_item in play_items]
+    # every play item starts at the same time of the only clip, their ranges overlap and are merged in one
+    assert disc.stream_ranges(name) == [
+        (expected[0][0], SOURCE_PACKET_SIZE * expected[0][1], SOURCE_PACKET_SIZE * max(end for _, _, end in expected))]
@@ -0,0 +1,204 @@
+import pytest
+
+from shinya.bd.clpi import (
+    CLPIHeader, ClipInformationFile, EPCoarseEntry, EPCoarseTable, EPFineEntry, EPFineTable, EPMapIndex,
+)
+from shinya.tools.synthetic import BYTES_PER_SECOND, START_TIME, VIDEO_PID, build_clpi, build_ep_map
+
+
+def fine_table(count=5):
+    return EPFineTable(
+        {"IsAngleChangePoint": 0, "IEndPositionOffset": 1, "PTSEPFine": i, "SPNEPFine": 10 * i} for i in range(count))
+
+
+def pts_values(table):
+    return list(table.columns["PTSEPFine"])
+
+
+def test_views_write_back():
+    table = fine_table()
+    table[2]["PTSEPFine"] = 7
+    for entry in table:
+        entry["SPNEPFine"] += 1
+    assert pts_values(table) == [0, 1, 7, 3, 4]
+    assert list(table.columns["SPNEPFine"]) == [1, 11, 21, 31, 41]
+    table[0] = table[4]
+    assert pts_values(table) == [4, 1, 7, 3, 4]
+
+
+def test_views_stop_when_rows_move():
+    table = fine_table()
+    view = table[2]
+    snapshot = view.detach()
+    table.append(table[4])
+    view["PTSEPFine"] = 8
+    for mutate in (lambda: table.insert(0, table[4]), lambda: table.__delitem__(1), table.reverse, table.pop):
+        view = table[2]
+        mutate()
+        with pytest.raises(RuntimeError):
+            view["PTSEPFine"]
+        with pytest.raises(RuntimeError):
+            view["PTSEPFine"] = 9
+    assert isinstance(snapshot, EPFineEntry)
+    assert snapshot["PTSEPFine"] == 2
+    assert 9 not in pts_values(table)
+
+
+def test_pop():
+    table = fine_table()
+    last = table.pop()
+    first = table.pop(0)
+    assert isinstance(first, EPFineEntry)
+    assert (first["PTSEPFine"], last["SPNEPFine"]) == (0, 40)
+    assert pts_values(table) == [1, 2, 3]
+    assert all(len(column) == 3 for column in table.columns.values())
+    with pytest.raises(IndexError):
+        EPFineTable().pop()
+
+
+def test_reverse_and_iteration():
+    table = fine_table()
+    table.reverse()
+    assert pts_values(table) == [4, 3, 2, 1, 0]
+    assert list(table.columns["SPNEPFine"]) == [40, 30, 20, 10, 0]
+    assert [entry["PTSEPFine"] for entry in table] == [4, 3, 2, 1, 0]
+    assert [entry["PTSEPFine"] for entry in reversed(table)] == [0, 1, 2, 3, 4]
+
+
+def test_remove_and_index():
+    table = fine_table()
+    entry = table[3].detach()
+    assert table.index(entry) == 3
+    assert entry in table
+    table.remove(entry)
+    assert pts_values(table) == [0, 1, 2, 4]
+    assert entry not in table
+    with pytest.raises(ValueError):
+        table.remove(entry)
+    assert table.index(table[-1], -2) == 3
+
+
+def test_mutations_are_tracked_and_written():
+    header = CLPIHeader.from_bytes(build_clpi(ep_map_entries=20, duration=60))
+    spid_entry = header["CPI"]["StreamPIDEntries"][0]
+    coarse = spid_entry["EPCoarseEntries"]
+    data = header.to_bytes()
+    spn = coarse[1]["SPNEPCoarse"]
+    coarse[1]["SPNEPCoarse"] = spn + 1
+    assert header._source is None
+    assert header.to_bytes() != data
+    coarse[1]["SPNEPCoarse"] = spn
+    coarse.reverse()
+    coarse.reverse()
+    assert header.to_bytes() == data
+    assert isinstance(coarse.pop(), EPCoarseEntry)
+    fine = spid_entry["EPFineEntries"]
+    fine_data = fine.to_bytes()
+    entry = fine.pop(0)
+    assert fine.to_bytes() == fine_data[4:]
+    fine.insert(0, entry)
+    assert fine.to_bytes() == fine_data
+
+
+def expected_entry_points(entries, duration, spn_offset=0):
+    """ (PTS, SPN) of the entry points written by build_ep_map, computed without the coarse and fine split
+    """
+    pts_step = duration * 90000 // entries
+    spn_step = BYTES_PER_SECOND * duration // entries // 192
+    return [((2 * START_TIME + i * pts_step) & ~0x1FF, spn_offset + i * spn_step) for i in range(entries)]
+
+
+def test_ep_map_index_recombines_coarse_and_fine_entries():
+    coarse, fine = build_ep_map(100, 60)
+    expected = expected_entry_points(100, 60)
+    index = EPMapIndex(coarse, fine)
+    assert list(zip(index.pts, index.spn)) == expected
+    # the synthetic map crosses coarse entries on both the PTS and the SPN bits
+    assert 1 < len(coarse) < len(fine)
+    assert len({spn & ~0x1FFFF for _, spn in expected}) > 1
+    assert len({pts >> 19 for pts, _ in expected}) > 1
+
+
+def test_ep_map_index_lookups():
+    index = EPMapIndex(*build_ep_map(100, 60))
+    expected = expected_entry_points(100, 60)
+    (first_pts, first_spn), (last_pts, last_spn) = expected[0], expected[-1]
+    # exact hit
+    assert index.index_of_pts(expected[10][0]) == 10
+    assert index.spn_at(expected[10][0]) == expected[10][1]
+    assert index.pts_at(expected[10][1]) == expected[10][0]
+    # between two entry points, the earlier one
+    assert index.spn_at(expected[10][0] + 1) == expected[10][1]
+    assert index.pts_at(expected[11][1] - 1) == expected[10][0]
+    # before the first entry point
+    assert index.index_of_pts(first_pts - 1) == -1
+    assert index.index_of_spn(first_spn - 1) == -1
+    assert index.spn_at(first_pts - 1) is None
+    assert index.pts_at(first_spn - 1) is None
+    # past the last entry point
+    assert index.index_of_pts(last_pts + 10 ** 6) == len(expected) - 1
+    assert index.spn_at(last_pts + 10 ** 6) == last_spn
+    assert index.pts_at(last_spn + 10 ** 6) == last_pts
+
+
+def test_ep_map_index_coarse_boundary():
+    index = EPMapIndex(*build_ep_map(100, 60))
+    expected = expected_entry_points(100, 60)
+    i = next(i for i in range(1, len(expected)) if expected[i][1] & ~0x1FFFF != expected[i - 1][1] & ~0x1FFFF)
+    (previous_pts, previous_spn), (pts, spn) = expected[i - 1], expected[i]
+    assert index.spn_at(pts) == spn
+    assert index.spn_at(pts - 1) == previous_spn
+    assert index.pts_at(spn) == pts
+    assert index.pts_at(spn - 1) == previous_pts
+
+
+def test_ep_map_index_batches():
+    index = EPMapIndex(*build_ep_map(100, 60))
+    pts_values = [0, *range(2 * START_TIME - 1000, 2 * START_TIME + 61 * 90000, 77777)]
+    spn_values = [*range(-1, 2 * 10 ** 6, 33333)]
+    assert index.spns_at(pts_values) == [index.spn_at(pts) for pts in pts_values]
+    assert index.pts_values_at(spn_values) == [index.pts_at(spn) for spn in spn_values]
+
+
+def test_clip_lookups_by_stream(tmp_path):
+    filename = str(tmp_path / "00000.clpi")
+    with open(filename, "wb") as f:
+        f.write(build_clpi(ep_map_entries=50, duration=60, stream_pids=2))
+    clip = ClipInformationFile(filename)
+    for pid, spn_offset in ((None, 0), (VIDEO_PID, 0), (VIDEO_PID + 1, 1)):
+        pts, spn = expected_entry_points(50, 60, spn_offset)[7]
+        assert clip.spn_at(pts, pid) == spn
+        assert clip.pts_at(spn, pid) == pts
+    with pytest.raises(KeyError):
+        clip.spn_at(0, pid=0x1FFF)
+
+
+def ep_map_index(entry_points):
+    """ EPMapIndex of a list of (PTS, SPN), PTS being multiples of 512
+    """
+    coarse, fine = EPCoarseTable(), EPFineTable()
+    previous_coarse = None
+    for i, (pts, spn) in enumerate(entry_points):
+        if (pts >> 19, spn >> 17) != previous_coarse:
+            previous_coarse = (pts >> 19, spn >> 17)
+            coarse.append({"RefToEPFineID": i, "PTSEPCoarse": pts >> 19 & 0x3FFF, "SPNEPCoarse": spn})
+        fine.append({"IsAngleChangePoint": 1, "IEndPositionOffset": 1, "PTSEPFine": pts >> 9 & 0x7FF,
+                     "SPNEPFine": spn & 0x1FFFF})
+    return EPMapIndex(coarse, fine)
+
+
+def test_ep_map_index_spn_range_by_stc_sequence():
+    step = 90000 // 512 * 512
+    # a first STC sequence, and a second one from SPN 100000 whose PTS restart near 2 ** 33 and wrap around
+    first = [(2 * START_TIME + i * step, i * 10000) for i in range(10)]
+    second_start = 2 ** 33 - 3 * step
+    second = [((second_start + i * step) % 2 ** 33, 100000 + i * 10000) for i in range(10)]
+    index = ep_map_index(first + second)
+    assert index.spn_range(first[2][0] + 1, first[5][0], 0, 100000, 2 * START_TIME) == (20000, 60000)
+    # past the last entry point of the sequence, the range ends where the sequence does
+    assert index.spn_range(first[8][0], first[9][0] + step, 0, 100000, 2 * START_TIME) == (80000, 100000)
+    # across the wrap around, PTS of the second sequence are compared from its start
+    assert index.spn_range(second[2][0], second[4][0] + 1, 100000, None, second_start) == (120000, 150000)
+    assert index.spn_range(second[8][0], second[9][0], 100000, None, second_start) == (180000, None)
+    # before the first entry point of a sequence
+    assert index.spn_range(second_start - 1, second[1][0], 100000, None, second_start - 1) == (100000, 120000)
@@ -0,0 +1,35 @@
+import struct
+
+import pytest
+
+from shinya.bd.mpls import MPLSHeader
+from shinya.tools.synthetic import build_mpls
+
+
+def with_extension_data(data_block_start_address=24, payload=b"\x01\x02\x03\x04"):
+    """ A synthetic playlist followed by an extension data block holding one entry
+    """
+    data = build_mpls(play_items=2)
+    extension_address = len(data)
+    entry_start_address = 12 + 12
+    extension = struct.pack(">IBBBB", data_block_start_address, 0, 0, 0, 1)
+    extension += struct.pack(">HHII", 1, 1, entry_start_address, len(payload)) + payload
+    extension = struct.pack(">I", len(extension)) + extension
+    return data[:16] + struct.pack(">I", extension_address) + data[20:] + extension
+
+
+def test_extension_data_round_trip():
+    data = with_extension_data()
+    header = MPLSHeader.from_bytes(data)
+    assert header["ExtensionData"]["ExtDataEntry"][0]["data"] == b"\x01\x02\x03\x04"
+    assert header.to_bytes() == data
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_strict_rejects_wrong_data_block_address(lazy):
+    data = with_extension_data(data_block_start_address=0)
+    with pytest.raises(AssertionError):
+        header = MPLSHeader.from_bytes(data, lazy=lazy)
+        header["ExtensionData"]
+    header = MPLSHeader.from_bytes(data, strict=False)
+    assert header["ExtensionData"]["DataBlockStartAddress"] == 0
@@ -0,0 +1,57 @@
+import copy
+import pickle
+
+from shinya.bd.mpls import MPLSHeader, PlayListMarkItem
+from shinya.common.info_dict import InfoDict, NodeList
+from shinya.tools.synthetic import build_mpls
+
+
+def parse(strict=True):
+    return MPLSHeader.from_bytes(build_mpls(play_items=3, marks_per_play_item=2), strict=strict)
+
+
+def test_stored_list_keeps_identity():
+    node = InfoDict()
+    items = []
+    node["Items"] = items
+    items.append(PlayListMarkItem(MarkType=1))
+    assert node["Items"] == items
+    assert isinstance(node["Items"], NodeList)
+    assert node["Items"][0]._parent is node
+
+
+def test_modifications_propagate_after_parsing():
+    header = parse()
+    play_item = header["PlayList"]["PlayItems"][0]
+    assert play_item._parent is header["PlayList"]
+    assert header["PlayList"]._parent is header
+    assert header._source is not None
+    play_item["STNTable"]["PrimaryAudioStreamEntries"][0]["StreamAttributes"]["LanguageCode"] = "fra"
+    assert header._source is None
+    assert header["PlayList"]._source is None
+
+
+def test_copies_hold_the_subtree_only():
+    header = parse()
+    play_list = header["PlayList"]
+    for copied in (copy.deepcopy(play_list), pickle.loads(pickle.dumps(play_list))):
+        assert type(copied) is type(play_list)
+        assert copied == play_list
+        assert copied._parent is None
+        assert copied._source is None
+        play_item = copied["PlayItems"][0]
+        assert isinstance(copied["PlayItems"], NodeList)
+        assert play_item._parent is copied
+        assert play_item["STNTable"]._parent is play_item
+    assert len(pickle.dumps(play_list)) < len(pickle.dumps(header))
+
+
+def test_pickle_round_trip():
+    header = parse()
+    data = header.to_bytes()
+    restored = pickle.loads(pickle.dumps(header))
+    assert restored.to_bytes() == data
+    marks = restored["PlayListMark"]["PlayListMarks"]
+    marks[0]["MarkType"] = 2
+    assert marks[0]._parent is restored["PlayListMark"]
+    assert restored.to_bytes() != data
@@ -0,0 +1,36 @@
+import pytest
+
+from shinya.bd import BDMVDisc, ClipInformationFile, IndexTableFile, MovieObjectFile, MoviePlaylistFile
+from shinya.common.io import MappedFile, read_file
+from shinya.tools.synthetic import build_clpi, build_index, build_movie_object, build_mpls, write_corpus
+
+FILES = [
+    (MoviePlaylistFile, lambda: build_mpls(play_items=5), "00000.mpls"),
+    (ClipInformationFile, lambda: build_clpi(ep_map_entries=100, duration=60), "00000.clpi"),
+    (IndexTableFile, lambda: build_index(titles=3), "index.bdmv"),
+    (MovieObjectFile, lambda: build_movie_object(movie_objects=5), "MovieObject.bdmv"),
+]
+
+
+@pytest.mark.parametrize("file_class, build, filename", FILES)
+def test_strict_mapped_load(tmp_path, file_class, build, filename):
+    data = build()
+    source = str(tmp_path / filename)
+    with open(source, "wb") as f:
+        f.write(data)
+    assert isinstance(read_file(source, use_mmap=True), MappedFile)
+
+    loaded = file_class(source, strict=True, use_mmap=True)
+    destination = str(tmp_path / "out" / filename)
+    loaded.save(destination)
+    with open(destination, "rb") as f:
+        assert f.read() == data
+
+
+def test_disc_mapped_load_all(tmp_path):
+    root = write_corpus(str(tmp_path), playlists=2, clips=3, ep_map_entries=50, clip_duration=60)
+    disc = BDMVDisc(root, strict=True, use_mmap=True, max_workers=1)
+    disc.load_all()
+    assert disc.index.data["Indexes"]["NumberOfTitles"] == 2
+    assert [len(disc.get_playlist(name).data["PlayList"]["PlayItems"]) > 0 for name in disc.playlist_names()] == [
+        True, True]